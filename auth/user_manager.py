@@ -2,13 +2,13 @@ import os, json
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import hashlib
-from config import DEFAULT_CURRENCY, USERS_FILE, BASE_DIR
+from config import DEFAULT_CURRENCY, USERS_FILE, DATA_DIR
 from typing import Dict, Any
-from persistence.load_save_json import load_json, save_json
+from persistence.load_save_json import load_json, save_json, update_json, remove_file
 from utils.errors import UserAlreadyExistsError, UserNotFoundError, AuthenticationError
 from utils.ids import generate_user_id
 
-CURRENT_USER_FILE = os.path.join(BASE_DIR, "data", "current_user.json")
+CURRENT_USER_FILE = os.path.join(DATA_DIR, "current_user.json")
 
 def hash_pin(pin) -> str:
     """Hash a PIN using SHA-256."""
@@ -17,20 +17,21 @@ def hash_pin(pin) -> str:
 
 
 def create_user(name, pin, currency = DEFAULT_CURRENCY) -> dict:
-    users = load_json(USERS_FILE)
-
-    if any(u["name"].lower() == name.lower() for u in users):
-        raise UserAlreadyExistsError(f"User '{name}' already exists.")
-    
-    user = {
-        "user_id": generate_user_id(),
-        "name": name.strip(),
-        "password": hash_pin(pin),
-        "currency": currency,
-    }
-
-    users.append(user)
-    save_json(users, USERS_FILE)
+    def add_user(users):
+        # Re-checked on fresh data if another process registered someone meanwhile
+        if any(u["name"].lower() == name.lower() for u in users):
+            raise UserAlreadyExistsError(f"User '{name}' already exists.")
+
+        user = {
+            "user_id": generate_user_id(),
+            "name": name.strip(),
+            "password": hash_pin(pin),
+            "currency": currency,
+        }
+        users.append(user)
+        return user
+
+    user = update_json(USERS_FILE, add_user)
 
     # Optionally auto-login after creation
     save_json({"user_id": user["user_id"], "name": user["name"]}, CURRENT_USER_FILE)
@@ -71,5 +72,4 @@ def login_user(name: str, pin: str) -> dict:
 
 def logout_user() -> None:
     """Clear current session."""
-    if os.path.exists(CURRENT_USER_FILE):
-        os.remove(CURRENT_USER_FILE)
\ No newline at end of file
+    remove_file(CURRENT_USER_FILE)
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""
+concurrent_writers.py
+Throughput of N processes writing the same data files at once.
+
+Every writer adds transactions through a file repository and increments a
+shared counter with update_json(), in a scratch directory. At the end the
+script checks that no write was lost: the file must hold writers x ops
+transactions and the counter must equal writers x ops.
+
+Usage (from the project root):
+    python -m benchmarks.concurrent_writers
+    python -m benchmarks.concurrent_writers --writers 1 4 16 --ops 500 --backend jsonl
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from multiprocessing import Process, Queue
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persistence import locking
+from persistence.load_save_json import load_json, save_json, update_json
+from persistence.repository import JsonRepository, JsonlRepository
+from utils.ids import generate_transaction_id
+
+
+def _repository(backend, directory):
+    snapshot = os.path.join(directory, "transactions.json")
+    if backend == "jsonl":
+        return JsonlRepository(snapshot, os.path.join(directory, "transactions.jsonl"))
+    return JsonRepository(snapshot)
+
+
+def _increment(counter):
+    counter["value"] += 1
+
+
+def _writer(backend, directory, ops, results):
+    repo = _repository(backend, directory)
+    counter_path = os.path.join(directory, "counter.json")
+    for i in range(ops):
+        repo.add({
+            "transaction_id": generate_transaction_id(),
+            "user_id": f"USR-{os.getpid()}",
+            "type": "expense",
+            "amount": 1.0,
+            "category": "Bench",
+            "date": "2025-01-01",
+            "description": f"write {i}",
+            "payment_method": "cash",
+        })
+        update_json(counter_path, _increment)
+    results.put(locking.stats["conflicts"])
+
+
+def run(backend, writers, ops):
+    """Run one round. Returns (seconds, conflicts, lost writes)."""
+    with tempfile.TemporaryDirectory() as directory:
+        save_json([], os.path.join(directory, "transactions.json"))
+        save_json({"value": 0}, os.path.join(directory, "counter.json"))
+
+        results = Queue()
+        processes = [Process(target=_writer, args=(backend, directory, ops, results))
+                     for _ in range(writers)]
+        start = time.perf_counter()
+        for p in processes:
+            p.start()
+        conflicts = sum(results.get() for _ in processes)
+        for p in processes:
+            p.join()
+        elapsed = time.perf_counter() - start
+
+        stored = len(_repository(backend, directory).all())
+        counter = load_json(os.path.join(directory, "counter.json"))["value"]
+        lost = (writers * ops - stored) + (writers * ops - counter)
+        return elapsed, conflicts, lost
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--ops", type=int, default=200, help="writes per process")
+    parser.add_argument("--backend", choices=["json", "jsonl"], default="json")
+    args = parser.parse_args()
+
+    print(f"backend={args.backend}, {args.ops} adds + {args.ops} counter updates per writer")
+    print(f"{'writers':>7} {'seconds':>8} {'writes/s':>9} {'conflicts':>9} {'lost':>5}")
+    for writers in args.writers:
+        elapsed, conflicts, lost = run(args.backend, writers, args.ops)
+        writes = 2 * writers * args.ops
+        print(f"{writers:>7} {elapsed:>8.2f} {writes / elapsed:>9.0f} {conflicts:>9} {lost:>5}")
+
+
+if __name__ == "__main__":
+    main()
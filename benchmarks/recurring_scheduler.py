@@ -0,0 +1,121 @@
+"""
+recurring_scheduler.py
+Time to post the due recurring transactions of thousands of users in one run.
+
+Every user gets a few rules of mixed kinds (interval_days, weekly, monthly,
+month_end) whose next_date lies up to --backlog days in the past, so each
+run has to catch up several missed periods per rule. In a scratch
+directory, the script then measures:
+
+  - batch:    one update of recurring.json for every user through the
+              next_date heap, plus a single add_many of all postings
+  - per-user: the same work as one read-modify-write per user (what the
+              menu option does), on a copy of the same rules; skipped
+              above --per-user-max users, as it grows quadratically
+
+and checks that both post the same occurrences. The whole run, write-ahead
+log included, stays in the scratch directory (FINANCE_DATA_DIR), which is
+removed at the end.
+
+Usage (from the project root):
+    python -m benchmarks.recurring_scheduler
+    python -m benchmarks.recurring_scheduler --users 1000 20000 --rules 3 --backlog 90 --per-user-max 0
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set before the project modules read config, so no WAL unit lands in data/
+SCRATCH = tempfile.mkdtemp(prefix="finance-bench-")
+os.environ["FINANCE_DATA_DIR"] = SCRATCH
+
+from features.recurring_processor import post_due
+from persistence.load_save_json import save_json, update_json, atomic
+from persistence.repository import JsonRepository
+
+TODAY = "2025-06-30"
+KINDS = [{"interval_days": 10}, {"frequency": "weekly"}, {"frequency": "monthly"},
+         {"frequency": "month_end"}]
+
+
+def _rules(users, rules, backlog):
+    random.seed(0)
+    today = date.fromisoformat(TODAY)
+    data = {}
+    for u in range(users):
+        data[f"USR-{u:06d}"] = [dict(
+            random.choice(KINDS),
+            type="expense", amount=float(random.randint(5, 500)), category="Bills",
+            description=f"rule {r}", payment_method="bank",
+            next_date=(today - timedelta(days=random.randint(0, backlog))).isoformat(),
+        ) for r in range(rules)]
+    return data
+
+
+def _occurrences(transactions):
+    return sorted((t["user_id"], t["description"], t["date"]) for t in transactions)
+
+
+def run(users, rules, backlog, per_user_max):
+    """Run one round. Returns (batch seconds, per-user seconds or None, postings)."""
+    data = _rules(users, rules, backlog)
+    with tempfile.TemporaryDirectory(dir=SCRATCH) as directory:
+        recurring = os.path.join(directory, "recurring.json")
+        repo = JsonRepository(os.path.join(directory, "transactions.json"))
+
+        save_json(data, recurring)
+        save_json([], repo.path)
+        start = time.perf_counter()
+        with atomic():
+            batch = update_json(recurring, lambda rules_: post_due(rules_, TODAY))
+            repo.add_many(batch)
+        batch_seconds = time.perf_counter() - start
+        if users > per_user_max:
+            return batch_seconds, None, len(batch)
+
+        save_json(data, recurring)
+        save_json([], repo.path)
+        per_user = []
+        start = time.perf_counter()
+        for user_id in data:
+            posted = update_json(recurring, lambda rules_: post_due(rules_, TODAY, {user_id}))
+            repo.add_many(posted)
+            per_user += posted
+        per_user_seconds = time.perf_counter() - start
+
+        if _occurrences(batch) != _occurrences(per_user):
+            raise AssertionError("batch and per-user runs posted different occurrences")
+        return batch_seconds, per_user_seconds, len(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--rules", type=int, default=3, help="rules per user")
+    parser.add_argument("--backlog", type=int, default=60,
+                        help="days the oldest next_date may lie in the past")
+    parser.add_argument("--per-user-max", type=int, default=1000,
+                        help="largest user count to also time per-user runs for")
+    args = parser.parse_args()
+
+    print(f"{args.rules} rules per user, next_date up to {args.backlog} days overdue")
+    print(f"{'users':>7} {'postings':>9} {'batch s':>8} {'per-user s':>10} {'postings/s':>10}")
+    try:
+        for users in args.users:
+            batch, per_user, postings = run(users, args.rules, args.backlog, args.per_user_max)
+            per_user = "-" if per_user is None else f"{per_user:.2f}"
+            print(f"{users:>7} {postings:>9} {batch:>8.2f} {per_user:>10} {postings / batch:>10.0f}")
+    finally:
+        shutil.rmtree(SCRATCH, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,7 @@ import os
 
 # Root directory (auto-detect project root)
 BASE_DIR = Path(__file__).resolve().parent
-DATA_DIR = BASE_DIR / 'data'
+DATA_DIR = Path(os.environ.get('FINANCE_DATA_DIR') or BASE_DIR / 'data')  # overridable, e.g. by the tests
 BACKUP_DIR = DATA_DIR / 'backups'
 
 #File Names
@@ -22,6 +22,13 @@ TRANSACTIONS_FILE = DATA_DIR / 'transactions.json'
 BUDGET_FILE = DATA_DIR / 'budgets.json'
 GOALS_FILE = DATA_DIR / 'goals.json'
 RECURRING_FILE = DATA_DIR / 'recurring.json'
+TRANSACTIONS_LOG_FILE = DATA_DIR / 'transactions.jsonl'
+SQLITE_FILE = DATA_DIR / 'finance.db'
+AGGREGATES_FILE = DATA_DIR / 'aggregates.json'
+WAL_FILE = DATA_DIR / 'wal.log'
+DAEMON_STATUS_FILE = DATA_DIR / 'daemon_status.json'
+TEXT_INDEX_DIR = DATA_DIR / 'text_index'
+USERS_DIR = DATA_DIR / 'users'
 
 #Ensure data directories exist
 os.makedirs(DATA_DIR, exist_ok=True) # Create data directory if it doesn't exist
@@ -35,3 +42,60 @@ APP_VERSION = "1.0"
 DEFAULT_CURRENCY = "EGP"
 DATE_FORMAT = "%Y-%m-%d"  # ISO standard
 AUTO_BACKUP_LIMIT = 5     # keep last 5 backups
+BACKUP_MAX_AGE_DAYS = 30  # and drop backups older than this (the newest one is always kept)
+BACKUP_COMPRESSION = "gzip"  # backup chunks stored as "gzip", "lzma" or None (uncompressed)
+AUTO_BACKUP_INTERVAL = 300   # seconds between scheduled background backups (0 = only after writes)
+DAEMON_POLL_INTERVAL = 60    # seconds between --daemon checks for edited rules and status heartbeats
+PAGE_SIZE = 20            # transactions per page when viewing
+
+# -------------------------------
+# Storage settings
+# -------------------------------
+# "json"   -> transactions.json is rewritten on every change
+# "jsonl"  -> changes are appended to transactions.jsonl and folded back
+#             into transactions.json by compaction
+# "sqlite" -> indexed sqlite database (run `python -m persistence.migrate` first)
+TRANSACTION_STORAGE = "json"
+LOG_COMPACT_BYTES = 1_000_000  # compact the log once it grows past ~1 MB
+GROUP_COMMIT_WINDOW = 0.5      # seconds a group_commit() block may defer writes
+WRITE_RETRIES = 5              # attempts for a write that lost a race with another process
+WAL_CHECKPOINT_BYTES = 8_000_000  # fsync the data files and empty the write-ahead log past ~8 MB
+
+# -------------------------------
+# Data layout
+# -------------------------------
+# "global"  -> one shared file per kind of data (transactions.json, budgets.json, ...)
+# "sharded" -> one folder per user: data/users/<user_id>/transactions.json, ...
+#              (run `python -m persistence.migrate --shard` first). Applies to
+#              the json/jsonl transaction storage; sqlite keeps one database.
+DATA_LAYOUT = "global"
+
+# Per-user data kinds and their file in the global layout
+USER_FILES = {
+    "transactions": TRANSACTIONS_FILE,
+    "transactions_log": TRANSACTIONS_LOG_FILE,
+    "budgets": BUDGET_FILE,
+    "goals": GOALS_FILE,
+    "recurring": RECURRING_FILE,
+    "aggregates": AGGREGATES_FILE,
+    "text_index": TEXT_INDEX_DIR / 'text_index.json',
+}
+
+
+def user_shard_file(user_id, kind):
+    """Return data/users/<user_id>/<file> for one kind of user data (see USER_FILES)."""
+    return USERS_DIR / str(user_id) / USER_FILES[kind].name
+
+
+def user_data_file(user_id, kind):
+    """
+    Return the file holding one kind of a user's data ("transactions",
+    "budgets", "goals", ...) in the configured DATA_LAYOUT.
+    """
+    if DATA_LAYOUT == "sharded":
+        path = user_shard_file(user_id, kind)
+        os.makedirs(path.parent, exist_ok=True)
+        return path
+    if kind == "text_index":
+        return TEXT_INDEX_DIR / f"{user_id}.json"  # already one file per user
+    return USER_FILES[kind]
@@ -1,6 +1,7 @@
 # budgets.py
 import os
-from persistence.load_save_json import load_json, save_json
+from persistence.load_save_json import save_json, update_json
+from config import DATA_DIR, user_data_file
 
 def check_budget_limits(user_id, transactions, budgets, verbose=True):
     """
@@ -62,22 +63,22 @@ def set_budget_limit(user_id, category, limit):
             raise ValueError("Budget limit must be a positive number.")
 
         # --- 2. Ensure data directory exists ---
-        os.makedirs("data", exist_ok=True)
+        os.makedirs(DATA_DIR, exist_ok=True)
 
-        # --- 3. Load existing budgets safely ---
-        budgets = {}
+        # --- 3. Update user’s budget data ---
+        def set_limit(budgets):
+            budgets.setdefault(user_id, {})
+            budgets[user_id][category] = round(float(limit), 2)
+
+        # --- 4. Save updated budgets (re-read and retried if another process saved first) ---
+        budget_file = user_data_file(user_id, "budgets")
         try:
-            budgets = load_json("data/budgets.json")
-        except (FileNotFoundError, ValueError):
-            print("budgets.json missing or invalid — creating a new one.")
+            update_json(budget_file, set_limit, default={})
+        except ValueError:
+            print("budgets.json invalid — creating a new one.")
             budgets = {}
-
-        # --- 4. Update user’s budget data ---
-        budgets.setdefault(user_id, {})
-        budgets[user_id][category] = round(float(limit), 2)
-
-        # --- 5. Save updated budgets ---
-        save_json(budgets, "data/budgets.json")
+            set_limit(budgets)
+            save_json(budgets, budget_file)
         print(f"Budget for '{category}' set to {limit} for user {user_id}.")
 
     except ValueError as e:
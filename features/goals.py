@@ -1,5 +1,6 @@
 import os
-from persistence.load_save_json import load_json, save_json
+from persistence.load_save_json import save_json, update_json
+from config import DATA_DIR, user_data_file
 
 def check_goals_progress(user_id, transactions, goals):
     """
@@ -46,22 +47,22 @@ def set_goal(user_id, goal_name, target_amount):
             raise ValueError("Goal amount must be a positive number.")
 
         # --- 2. Ensure data directory exists ---
-        os.makedirs("data", exist_ok=True)
+        os.makedirs(DATA_DIR, exist_ok=True)
 
-        # --- 3. Load existing goals safely ---
-        goals = {}
+        # --- 3. Update user’s goals ---
+        def set_target(goals):
+            goals.setdefault(user_id, {})
+            goals[user_id][goal_name] = round(float(target_amount), 2)
+
+        # --- 4. Save updated goals (re-read and retried if another process saved first) ---
+        goals_file = user_data_file(user_id, "goals")
         try:
-            goals = load_json("data/goals.json")
-        except (FileNotFoundError, ValueError):
-            print("Goals.json missing or invalid — creating a new one.")
+            update_json(goals_file, set_target, default={})
+        except ValueError:
+            print("Goals.json invalid — creating a new one.")
             goals = {}
-
-        # --- 4. Update goal ---
-        goals.setdefault(user_id, {})
-        goals[user_id][goal_name] = round(float(target_amount), 2)
-
-        # --- 5. Save updated goals ---
-        save_json(goals, "data/goals.json")
+            set_target(goals)
+            save_json(goals, goals_file)
         print(f"Goal '{goal_name}' set with target {target_amount} for user {user_id}.")
 
     except ValueError as e:
@@ -0,0 +1,163 @@
+"""
+recurring_daemon.py
+Long-running recurring processing for every user (main.py --daemon).
+
+An asyncio loop sleeps until the earliest next_date found in the recurring
+files, then posts everything due for all users in one batch
+(process_due_recurring: one update per recurring file, one transactions
+write, one WAL unit). It wakes up at least every DAEMON_POLL_INTERVAL
+seconds to notice edited rules and to refresh the status file
+(DAEMON_STATUS_FILE), which monitors can read:
+
+    {"state": "running", "pid": 4242, "started": "...", "heartbeat": "...",
+     "next_due": "2025-02-01", "runs": 3, "posted": 57, "last_run": "...",
+     "last_posted": 12, "last_latency": 0.08, "last_error": null,
+     "skipped": {"USR-7": "2 invalid rule(s)"}}
+
+"skipped" lists the users whose rules are left out (invalid rules, or a
+recurring file that cannot be read or updated in the sharded layout)
+while everyone else's are still posted. Users whose file a batch could
+not update are left out of next_due and retried every poll interval, so
+they never keep the daemon busy. A stale heartbeat means the daemon is
+stuck or gone. SIGINT/SIGTERM stop it after the batch in progress.
+"""
+
+import asyncio
+import os
+import signal
+import time
+from datetime import date, datetime
+from features.recurring_processor import next_due_date, process_due_recurring
+from persistence.load_save_json import save_json
+from utils.date_utils import get_today_str
+from config import DAEMON_POLL_INTERVAL, DAEMON_STATUS_FILE
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def seconds_until(day):
+    """Return the seconds from now until local midnight starting `day` ('YYYY-MM-DD')."""
+    start = datetime.combine(date.fromisoformat(day), datetime.min.time())
+    return (start - datetime.now()).total_seconds()
+
+
+class RecurringDaemon:
+    """Posts due recurring transactions of all users as they fall due."""
+
+    def __init__(self, poll_interval=DAEMON_POLL_INTERVAL, status_file=DAEMON_STATUS_FILE):
+        self.poll_interval = poll_interval
+        self.status_file = status_file
+        self.started = None
+        self.next_due = None
+        self.runs = 0               # batches posted
+        self.posted = 0             # transactions posted since start
+        self.last_run = None
+        self.last_posted = 0
+        self.last_latency = None    # seconds taken by the last batch
+        self.last_error = None
+        self.skipped = {}           # user_id -> why their rules are left out
+        self.stalled = {}           # the skipped users the last batch could not update
+        self._last_batch = float("-inf")
+        self._stop = None
+
+    def status(self, state="running"):
+        return {
+            "state": state,
+            "pid": os.getpid(),
+            "started": self.started,
+            "heartbeat": _now(),
+            "next_due": self.next_due,
+            "runs": self.runs,
+            "posted": self.posted,
+            "last_run": self.last_run,
+            "last_posted": self.last_posted,
+            "last_latency": self.last_latency,
+            "last_error": self.last_error,
+            "skipped": self.skipped,
+        }
+
+    def _write_status(self, state="running"):
+        try:
+            save_json(self.status(state), self.status_file)
+        except Exception as e:  # a full disk must not stop the postings
+            print(f"[{_now()}] Could not write the status file: {e}")
+
+    def stop(self):
+        """Ask the loop to exit after the batch in progress."""
+        if self._stop is not None:
+            self._stop.set()
+
+    async def _post_due(self):
+        """Post one batch. Returns {user_id: reason} for the users it left out."""
+        start = time.perf_counter()
+        self._last_batch = time.monotonic()
+        # File I/O runs off the loop so signals are still handled meanwhile
+        skipped = {}
+        posted = await asyncio.to_thread(process_due_recurring, skipped=skipped)
+        self.last_latency = time.perf_counter() - start
+        self.last_run = _now()
+        self.last_posted = len(posted)
+        self.runs += 1
+        self.posted += len(posted)
+        self.last_error = None
+        print(f"[{self.last_run}] Posted {len(posted)} recurring transaction(s) "
+              f"in {self.last_latency:.2f}s.")
+        if skipped:
+            print(f"[{self.last_run}] Skipped the rules of {', '.join(sorted(skipped))}; "
+                  f"see {self.status_file}.")
+        return skipped
+
+    async def run(self):
+        """Run until stop() or SIGINT/SIGTERM."""
+        self._stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass  # not supported here (e.g. Windows): Ctrl+C still ends asyncio.run()
+
+        self.started = _now()
+        print(f"[{self.started}] Recurring daemon started (pid {os.getpid()}).")
+        try:
+            while not self._stop.is_set():
+                delay = self.poll_interval
+                try:
+                    skipped = {}
+                    self.next_due = next_due_date(skipped, exclude=self.stalled)
+                    self.skipped = {**skipped, **self.stalled}
+                    today = get_today_str()
+                    retry = self.stalled and time.monotonic() - self._last_batch >= self.poll_interval
+                    if (self.next_due is not None and self.next_due <= today) or retry:
+                        due = self.next_due
+                        batch = await self._post_due()
+                        # Users the scan could read but the batch could not update
+                        # stay overdue: leave them out of next_due until a retry works
+                        self.stalled = {user_id: reason for user_id, reason in batch.items()
+                                        if skipped.get(user_id) != reason}
+                        self.skipped = {**skipped, **self.stalled}
+                        self.next_due = next_due_date({}, exclude=self.stalled)
+                        if (self.last_posted or self.next_due is None
+                                or (due is not None and self.next_due > due)):
+                            continue  # progress: pick up the rescheduled next_dates
+                    if self.next_due is not None and self.next_due > today:
+                        delay = min(delay, max(seconds_until(self.next_due), 0))
+                except Exception as e:
+                    self.last_error = f"{type(e).__name__}: {e}"
+                    print(f"[{_now()}] Recurring processing failed: {self.last_error}")
+                self._write_status()
+
+                try:
+                    await asyncio.wait_for(self._stop.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._write_status("stopped")
+            print(f"[{_now()}] Recurring daemon stopped.")
+
+
+def run(poll_interval=DAEMON_POLL_INTERVAL):
+    """Run the daemon in the foreground until it is stopped."""
+    asyncio.run(RecurringDaemon(poll_interval).run())
@@ -1,11 +1,292 @@
-from datetime import datetime, timedelta
-from uuid import uuid4
-from persistence.load_save_json import load_json, save_json
+"""
+recurring_processor.py
+Posting of recurring transactions.
+
+A recurring rule in recurring.json ({user_id: [rule, ...]}) looks like
+
+    {"type": "expense", "amount": 950.0, "category": "Rent", "description": "Rent",
+     "payment_method": "bank", "next_date": "2025-01-31", "frequency": "month_end"}
+
+and repeats either every "interval_days" days (the original format) or by
+calendar "frequency":
+
+    "daily" / "weekly"  every "interval" days / weeks (default 1)
+    "monthly"           every "interval" months on day "day" (default: the
+                        day of next_date), clamped to shorter months
+    "month_end"         the last day of every "interval" months
+
+Rules wait in a min-heap keyed by next_date (RecurringSchedule). Posting
+pops every rule that is due, posts the occurrence with its own date,
+advances next_date from that occurrence (not from today, so schedules
+never drift) and pushes it back, until nothing is due: every missed
+period is caught up in one batch, and only due rules are touched.
+"""
+
+import calendar
+import heapq
+import math
+from datetime import date, timedelta
+from persistence import cache
+from persistence.load_save_json import load_json_cached, save_json, update_json, atomic
+from persistence.locking import watched
+from persistence.repository import sharded_user_ids
+from utils.date_utils import date_ordinal, get_today_str
+from utils.ids import generate_transaction_id
+from config import DATA_DIR, user_data_file
+import config
 import os
 
+FREQUENCIES = ("daily", "weekly", "monthly", "month_end")
+
+
+def _add_months(day, months, day_of_month):
+    """Return `day` moved by `months`, on `day_of_month` clamped to that month's length."""
+    year, month = divmod(day.year * 12 + day.month - 1 + months, 12)
+    last = calendar.monthrange(year, month + 1)[1]
+    return date(year, month + 1, min(day_of_month, last))
+
+
+def next_occurrence(rule, current):
+    """
+    Return the occurrence of `rule` following `current`.
+
+    Args:
+        rule (dict): A recurring rule (see the module docstring).
+        current (date): An occurrence of the rule.
+
+    Raises:
+        ValueError: If the rule has no valid frequency or interval.
+    """
+    frequency = rule.get("frequency")
+    if frequency is None:
+        days = int(rule["interval_days"])
+        if days < 1:
+            raise ValueError("interval_days must be at least 1.")
+        return current + timedelta(days=days)
+
+    every = int(rule.get("interval", 1))
+    if every < 1:
+        raise ValueError("interval must be at least 1.")
+    if frequency == "daily":
+        return current + timedelta(days=every)
+    if frequency == "weekly":
+        return current + timedelta(weeks=every)
+    if frequency == "monthly":
+        return _add_months(current, every, int(rule.get("day") or current.day))
+    if frequency == "month_end":
+        return _add_months(current, every, 31)
+    raise ValueError(f"Unknown frequency '{frequency}'. Use one of {', '.join(FREQUENCIES)}.")
+
+
+def check_posting(rule):
+    """
+    Check the fields a rule's postings are built from.
+
+    Raises:
+        KeyError: If a field is missing.
+        ValueError: If the type, amount or a text field is invalid.
+    """
+    if rule["type"] not in ("income", "expense"):
+        raise ValueError("type must be 'income' or 'expense'.")
+    amount = rule["amount"]
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)) \
+            or not math.isfinite(amount) or amount <= 0:
+        raise ValueError(f"amount must be a positive number, got {amount!r}.")
+    for field in ("category", "description", "payment_method"):
+        if not isinstance(rule[field], str):
+            raise ValueError(f"{field} must be text.")
+    if not rule["category"].strip():
+        raise ValueError("category cannot be empty.")
+
+
+class RecurringSchedule:
+    """Min-heap of recurring rules keyed by their next_date."""
+
+    def __init__(self, recurring_data=None, user_ids=None):
+        self._heap = []
+        self._sequence = 0  # ties keep insertion order; rules are never compared
+        self.invalid = 0    # rules skipped because of a bad date, frequency or field
+        self.invalid_by_user = {}
+        for user_id, rules in (recurring_data or {}).items():
+            if user_ids is None or user_id in user_ids:
+                if not isinstance(rules, list):
+                    self._skip(user_id)
+                    continue
+                for rule in rules:
+                    self.add(user_id, rule)
+
+    def __len__(self):
+        return len(self._heap)
+
+    def add(self, user_id, rule):
+        """
+        Schedule a rule (dict, updated in place when it is posted). Rules
+        that could not be posted are counted in `invalid` and left out.
+        """
+        try:
+            check_posting(rule)
+            next_occurrence(rule, date.today())  # validate the frequency once
+            day = date_ordinal(rule["next_date"])
+        except (KeyError, TypeError, ValueError):
+            self._skip(user_id)
+            return
+        self._sequence += 1
+        heapq.heappush(self._heap, (day, self._sequence, user_id, rule))
+
+    def _skip(self, user_id):
+        self.invalid += 1
+        self.invalid_by_user[user_id] = self.invalid_by_user.get(user_id, 0) + 1
+
+    def skipped(self):
+        """Return {user_id: reason} for the users with invalid rules."""
+        return {user_id: f"{count} invalid rule(s)"
+                for user_id, count in self.invalid_by_user.items()}
+
+    def next_date(self):
+        """Return the earliest next_date of any rule ('YYYY-MM-DD'), or None."""
+        return date.fromordinal(self._heap[0][0]).isoformat() if self._heap else None
+
+    def pop_due(self, today):
+        """
+        Yield (user_id, rule, occurrence date) for every occurrence up to
+        `today` ('YYYY-MM-DD'), oldest first, advancing each rule's
+        next_date as it goes.
+        """
+        limit = date_ordinal(today)
+        while self._heap and self._heap[0][0] <= limit:
+            day, _, user_id, rule = heapq.heappop(self._heap)
+            occurrence = date.fromordinal(day)
+            if rule.get("frequency") == "monthly" and not rule.get("day"):
+                # Keep the day of month, so a clamp to a short month doesn't stick
+                rule["day"] = occurrence.day
+            following = next_occurrence(rule, occurrence)
+            rule["next_date"] = following.isoformat()
+            self._sequence += 1
+            heapq.heappush(self._heap, (following.toordinal(), self._sequence, user_id, rule))
+            yield user_id, rule, occurrence.isoformat()
+
+
+def _posting(user_id, rule, occurrence):
+    return {
+        "transaction_id": generate_transaction_id(),
+        "user_id": user_id,
+        "type": rule["type"],
+        "amount": rule["amount"],
+        "category": rule["category"],
+        "date": occurrence,
+        "description": f"Recurring: {rule['description']}",
+        "payment_method": rule["payment_method"],
+    }
+
+
+def post_due(recurring_data, today, user_ids=None, skipped=None):
+    """
+    Advance every due rule of `recurring_data` ({user_id: [rules]}) in place
+    and return one transaction per occurrence up to `today`, oldest first.
+    `user_ids` limits the run to some users; invalid rules are left out and
+    listed in `skipped` ({user_id: reason}) when given.
+    """
+    schedule = RecurringSchedule(recurring_data, user_ids)
+    if skipped is not None:
+        skipped.update(schedule.skipped())
+    return [_posting(user_id, rule, occurrence)
+            for user_id, rule, occurrence in schedule.pop_due(today)]
+
+
+def recurring_files(user_ids=None):
+    """Return the recurring files holding the rules of `user_ids` (None for every user)."""
+    if config.DATA_LAYOUT != "sharded":
+        return [str(config.RECURRING_FILE)]
+    users = sharded_user_ids() if user_ids is None else user_ids
+    return [str(user_data_file(user_id, "recurring")) for user_id in users]
+
+
+def _file_owner(path):
+    """Return the user whose rules `path` holds (sharded layout), or None for the shared file."""
+    if config.DATA_LAYOUT != "sharded":
+        return None
+    return os.path.basename(os.path.dirname(path))
+
+
+def _skip_file(path, error, skipped):
+    """Record an unreadable user file in `skipped`; re-raise when it cannot be isolated."""
+    owner = _file_owner(path)
+    if owner is None or skipped is None:
+        raise error  # the shared file holds every user's rules
+    skipped[owner] = f"{type(error).__name__}: {error}"
+
+
+def _scan(path):
+    schedule = RecurringSchedule(load_json_cached(path))
+    return schedule.next_date(), schedule.skipped()
+
+
+def next_due_date(skipped=None, exclude=()):
+    """
+    Return the earliest next_date of any user's rules ('YYYY-MM-DD'), or
+    None when there are none. Each file is only re-read after it changes.
+
+    Args:
+        skipped (dict): If given, filled with {user_id: reason} for the users
+            whose rules are left out: invalid rules, or (sharded layout) a
+            recurring file that cannot be read. Otherwise such a file raises.
+        exclude (iterable): Users to leave out (sharded layout), e.g. those
+            whose file a batch could not update.
+    """
+    earliest = None
+    for path in recurring_files():
+        if not os.path.exists(path) or _file_owner(path) in exclude:
+            continue
+        try:
+            day, invalid = cache.get(f"recurring-next:{path}", watched([path]),
+                                     lambda: _scan(path))
+        except Exception as e:
+            _skip_file(path, e, skipped)
+            continue
+        if skipped is not None:
+            skipped.update(invalid)
+        if day is not None and (earliest is None or day < earliest):
+            earliest = day
+    return earliest
+
+
+def process_due_recurring(today=None, user_ids=None, skipped=None):
+    """
+    Post every due occurrence of every user's recurring rules in one batch:
+    each recurring file is updated once, the transactions are stored with a
+    single write, and all of it commits as one WAL unit.
+
+    Args:
+        today (str): 'YYYY-MM-DD' to process up to (default: today).
+        user_ids (iterable): Limit the run to these users (default: everyone).
+        skipped (dict): If given, filled with {user_id: reason} for the users
+            whose rules were left out (see next_due_date); everyone else's
+            are still posted.
+
+    Returns:
+        list: The posted transactions.
+    """
+    from transactions.transaction_manager import insert_transactions  # it imports features
+
+    today = today or get_today_str()
+    user_ids = None if user_ids is None else set(user_ids)
+    posted = []
+    with atomic():
+        for path in recurring_files(user_ids):
+            if not os.path.exists(path):
+                continue
+            try:
+                posted += update_json(path, lambda data: post_due(data, today, user_ids, skipped))
+            except Exception as e:
+                _skip_file(path, e, skipped)
+        insert_transactions(posted)
+    return posted
+
+
 def process_recurring_transactions(user_id, transactions):
     """
-    Process due recurring transactions for a user.
+    Process due recurring transactions for a user: every occurrence missed
+    since a rule's next_date is posted, each dated on its own day.
     If 'recurring.json' doesn't exist, create it automatically.
 
     Args:
@@ -17,9 +298,9 @@ def process_recurring_transactions(user_id, transactions):
     """
     try:
         # --- 1. Ensure data directory exists ---
-        os.makedirs("data", exist_ok=True)
+        os.makedirs(DATA_DIR, exist_ok=True)
 
-        recurring_path = "data/recurring.json"
+        recurring_path = user_data_file(user_id, "recurring")
 
         # --- 2. If recurring.json doesn't exist, create it empty ---
         if not os.path.exists(recurring_path):
@@ -27,7 +308,7 @@ def process_recurring_transactions(user_id, transactions):
             save_json({}, recurring_path)  # start with empty dict
 
         # --- 3. Load recurring data safely ---
-        recurring_data = load_json(recurring_path)
+        recurring_data = load_json_cached(recurring_path)
         if not isinstance(recurring_data, dict):
             print("Recurring.json corrupted — resetting file.")
             recurring_data = {}
@@ -39,35 +320,14 @@ def process_recurring_transactions(user_id, transactions):
             print(f"No recurring transactions found for user {user_id}.")
             return transactions
 
-        # --- 5. Process due recurring transactions ---
-        today = datetime.now().strftime("%Y-%m-%d")
-        new_transactions = []
-
-        for r in recurring_list:
-            if r["next_date"] <= today:
-                # Schedule next trigger
-                next_date = (
-                    datetime.strptime(today, "%Y-%m-%d")
-                    + timedelta(days=r["interval_days"])
-                ).strftime("%Y-%m-%d")
-                r["next_date"] = next_date
-
-                # Create new transaction
-                txn = {
-                    "transaction_id": f"RC-{uuid4().hex[:6]}",
-                    "user_id": user_id,
-                    "type": r["type"],
-                    "amount": r["amount"],
-                    "category": r["category"],
-                    "date": today,
-                    "description": f"Recurring: {r['description']}",
-                    "payment_method": r["payment_method"],
-                }
-                new_transactions.append(txn)
+        # --- 5. Post every due occurrence, dated on its own day ---
+        today = get_today_str()
 
         # --- 6. Update recurring.json with new next_date values ---
-        recurring_data[user_id] = recurring_list
-        save_json(recurring_data, recurring_path)
+        # Re-run on fresh data if another process advanced the same entries
+        # meanwhile, so each due date produces exactly one transaction
+        new_transactions = update_json(recurring_path,
+                                       lambda data: post_due(data, today, {user_id}))
 
         # --- 7. Append new transactions ---
         if new_transactions:
@@ -1,7 +1,17 @@
 import sys
+import atexit
+import argparse
+from config import APP_NAME
 from auth.user_manager import get_current_user
 from ui.prompts import prompt_login, prompt_register, prompt_logout
 from ui.menus import transactions_menu, reports_menu, help_menu,advanced_features_menu, pause
+from reports.aggregates import verify_aggregates, repair_aggregates
+from transactions.importer import import_statement
+from ui.prompts import print_import_result
+from persistence.backup import create_backup, list_backups, find_backup, restore_backup
+from persistence import backup_worker, wal
+from features import recurring_daemon
+from utils.errors import DataPersistenceError
 
 
 
@@ -55,5 +65,132 @@ def main_menu():
             pause()
 
 
+# ========== Command Line ==========
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=APP_NAME)
+    parser.add_argument("--import", dest="import_file", metavar="FILE",
+                        help="import a CSV/OFX bank statement for the logged-in user "
+                             "(or --user) and exit")
+    parser.add_argument("--user", metavar="USER_ID",
+                        help="owner of the imported rows (default: logged-in user)")
+    parser.add_argument("--verify-aggregates", action="store_true",
+                        help="rebuild the report aggregates from scratch and diff them "
+                             "against the stored copy")
+    parser.add_argument("--repair", action="store_true",
+                        help="with --verify-aggregates, overwrite the stored aggregates "
+                             "when they differ")
+    parser.add_argument("--backup", action="store_true",
+                        help="back up the data files (incremental) and apply retention")
+    parser.add_argument("--list-backups", action="store_true", help="list the stored backups")
+    parser.add_argument("--restore", metavar="ID_OR_TIME",
+                        help="restore a backup by ID, or the latest one taken at or before "
+                             "a YYYY-MM-DD[THH:MM:SS] time")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running and post every user's recurring transactions "
+                             "as they fall due (status in data/daemon_status.json)")
+    return parser.parse_args(argv)
+
+
+def import_command(path, user_id=None) -> int:
+    """Import a statement from the command line. Returns the process exit code."""
+    try:
+        result = import_statement(path, user_id=user_id)
+    except Exception as e:
+        print(f"Error importing statement: {e}")
+        return 1
+
+    print_import_result(result)
+    return 0 if result["added"] or not result["errors"] else 1
+
+
+def verify_aggregates_command(repair=False) -> int:
+    """Print aggregate mismatches. Returns the process exit code."""
+    differences = verify_aggregates()
+    if not differences:
+        print("Aggregates are consistent with the transactions.")
+        return 0
+
+    for line in differences:
+        print(line)
+    print(f"{len(differences)} month(s) differ.")
+    if repair:
+        repair_aggregates()
+        print("Aggregates rebuilt.")
+        return 0
+    return 1
+
+
+def backup_command() -> int:
+    """Create a backup from the command line. Returns the process exit code."""
+    try:
+        manifest = create_backup()
+    except DataPersistenceError as e:
+        print(f"Backup failed: {e}")
+        return 1
+    print(f"Backup {manifest['id']}: {len(manifest['files'])} file(s), "
+          f"{manifest['new_chunks']} new chunk(s), {manifest['new_bytes']} new byte(s).")
+    return 0
+
+
+def list_backups_command() -> int:
+    """Print the stored backups. Returns the process exit code."""
+    manifests = list_backups()
+    if not manifests:
+        print("No backups found.")
+    for m in manifests:
+        size = sum(entry["size"] for entry in m["files"].values())
+        print(f"{m['id']}  {m['created']}  {len(m['files'])} file(s), {size} bytes")
+    return 0
+
+
+def restore_command(point) -> int:
+    """Restore a backup by ID or point in time. Returns the process exit code."""
+    try:
+        if find_backup(backup_id=point):
+            manifest = restore_backup(backup_id=point)
+        else:
+            manifest = restore_backup(at=point)
+    except DataPersistenceError as e:
+        print(f"Restore failed: {e}")
+        return 1
+    print(f"Restored backup {manifest['id']} from {manifest['created']} "
+          f"({len(manifest['files'])} file(s)).")
+    return 0
+
+
+def daemon_command() -> int:
+    """Run the recurring daemon until it is stopped. Returns the process exit code."""
+    backup_worker.start()
+    try:
+        recurring_daemon.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        backup_worker.stop()
+    return 0
+
+
 if __name__ == "__main__":
+    args = parse_args()
+    # Finish whatever a crash left half-written before anything reads the data
+    replayed = wal.recover()
+    if replayed:
+        print(f"Recovered {replayed} interrupted write(s) from the write-ahead log.")
+    if args.backup:
+        sys.exit(backup_command())
+    if args.list_backups:
+        sys.exit(list_backups_command())
+    if args.restore:
+        sys.exit(restore_command(args.restore))
+    if args.import_file:
+        sys.exit(import_command(args.import_file, args.user))
+    if args.verify_aggregates:
+        sys.exit(verify_aggregates_command(args.repair))
+    if args.daemon:
+        sys.exit(daemon_command())
+
+    # Back up in the background while the menu runs; finish pending backups on exit
+    backup_worker.start()
+    atexit.register(backup_worker.stop)
     main_menu()
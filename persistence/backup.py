@@ -1,58 +1,339 @@
-import os, sys
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
-import shutil
-from datetime import datetime
+"""
+backup.py
+Incremental, deduplicated backups of the data files.
+
+Files are split into content-defined chunks: a chunk ends after a JSON
+separator (',' or newline) whose preceding bytes hash to a chosen pattern,
+so an edit only changes the chunks around it and the boundaries after it
+fall in the same places again. Every chunk is stored once under its
+SHA-256 in data/backups/chunks/ (compressed with BACKUP_COMPRESSION; the
+suffix of the chunk file tells how), and each backup is a manifest in
+data/backups/manifests/ listing the chunks of every file:
+
+    {"id": "20250101T120000000000", "created": "2025-01-01T12:00:00",
+     "files": {"transactions.json": {"size": ..., "sha256": ...,
+                                     "chunks": ["9f86d0...", ...]}, ...}}
+
+Files that did not change since the previous backup reuse its entry
+without being read, so a backup costs time and space in proportion to
+what changed. Only the JSON/JSONL files are covered (not the sqlite
+database). Retention keeps the newest AUTO_BACKUP_LIMIT backups no
+older than BACKUP_MAX_AGE_DAYS, then deletes the chunks no manifest uses.
+"""
+
+import gzip
+import hashlib
+import json
+import lzma
+import os
+import re
+import tempfile
+import zlib
+from datetime import datetime, timedelta
+from persistence import wal
+from persistence.load_save_json import _atomic_write
+from persistence.locking import file_lock, file_locks, read_version
 from utils.errors import DataPersistenceError
-from config import BACKUP_DIR, DATA_DIR
+from config import BACKUP_DIR, DATA_DIR, AUTO_BACKUP_LIMIT, BACKUP_MAX_AGE_DAYS, BACKUP_COMPRESSION
+
+CHUNK_MIN = 2 * 1024
+CHUNK_MAX = 64 * 1024
+CUT_MASK = 0x1FF  # cut at about 1 separator in 512: ~16 KB chunks of transaction JSON
+WINDOW = 32       # bytes hashed before each candidate cut
+_SEPARATOR = re.compile(rb"[,\n]")
+
+# compression -> (chunk file suffix, compress, decompress)
+_CODECS = {
+    None: ("", bytes, bytes),
+    "gzip": (".gz", gzip.compress, gzip.decompress),
+    "lzma": (".xz", lzma.compress, lzma.decompress),
+}
+
+# Session state, not data: restoring it would switch the logged-in user
+_SKIPPED_FILES = {"current_user.json", "daemon_status.json"}
+
+
+def chunk_boundaries(data):
+    """Yield the end offset of every content-defined chunk of `data` (bytes)."""
+    start, size = 0, len(data)
+    while size - start > CHUNK_MIN:
+        limit = min(start + CHUNK_MAX, size)
+        end = limit  # forced cut when no separator qualifies
+        pos = start + CHUNK_MIN
+        while True:
+            match = _SEPARATOR.search(data, pos, limit)
+            if match is None:
+                break
+            pos = match.end()
+            if zlib.crc32(data[pos - WINDOW:pos]) & CUT_MASK == 0:
+                end = pos
+                break
+        if end == size:
+            break
+        yield end
+        start = end
+    if start < size:
+        yield size
+
+
+def _store_dirs(backup_dir):
+    return os.path.join(backup_dir, "chunks"), os.path.join(backup_dir, "manifests")
+
+
+def _write_bytes(data, path):
+    """Atomically write `data` to `path` (temp file + rename)."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _chunk_path(chunks_dir, digest, compression=None):
+    return os.path.join(chunks_dir, digest[:2], digest + _CODECS[compression][0])
+
 
-def backup_file(file_path, backup_dir=BACKUP_DIR):
+def _find_chunk(chunks_dir, digest):
+    """Return (path, compression) of a stored chunk, or (None, None)."""
+    for compression in _CODECS:
+        path = _chunk_path(chunks_dir, digest, compression)
+        if os.path.exists(path):
+            return path, compression
+    return None, None
+
+
+def _read_chunk(chunks_dir, digest):
+    path, compression = _find_chunk(chunks_dir, digest)
+    if path is None:
+        raise FileNotFoundError(f"Chunk {digest} is missing.")
+    with open(path, "rb") as f:
+        return _CODECS[compression][2](f.read())
+
+
+def data_files(data_dir=DATA_DIR, backup_dir=BACKUP_DIR):
+    """Return the data files to back up, relative to `data_dir`."""
+    skip = os.path.abspath(backup_dir)
+    found = []
+    for root, dirs, files in os.walk(data_dir):
+        dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != skip]
+        for name in files:
+            if name.endswith((".json", ".jsonl")) and name not in _SKIPPED_FILES \
+                    and not name.startswith(".tmp-"):
+                found.append(os.path.relpath(os.path.join(root, name), data_dir))
+    return sorted(found)
+
+
+def list_backups(backup_dir=BACKUP_DIR):
+    """Return every backup manifest, oldest first."""
+    _, manifests_dir = _store_dirs(backup_dir)
+    if not os.path.isdir(manifests_dir):
+        return []
+    manifests = []
+    for name in sorted(os.listdir(manifests_dir)):
+        if name.endswith(".json"):
+            with open(os.path.join(manifests_dir, name), "r") as f:
+                manifests.append(json.load(f))
+    return manifests
+
+
+def create_backup(paths=None, data_dir=DATA_DIR, backup_dir=BACKUP_DIR, prune=True,
+                  compression=BACKUP_COMPRESSION, only_if_changed=False):
     """
-    Create a timestamped backup copy of a JSON file before overwrite.
+    Back up data files and apply the retention policy.
+
+    Args:
+        paths (list): Files to back up (default: every data file, see
+            data_files()). The other files keep their entries from the
+            latest backup, so every manifest describes all the data.
+        data_dir (str): Directory the stored file names are relative to.
+        backup_dir (str): Backup store directory.
+        prune (bool): Apply prune_backups() afterwards.
+        compression (str): "gzip", "lzma" or None for the new chunks.
+        only_if_changed (bool): Return None instead of writing a manifest
+            when every file is unchanged since the latest backup.
 
     Returns:
-        str: Path to the created backup file.
+        dict: The new manifest, with the counts "new_chunks", "new_bytes"
+        (raw size of the new chunks) and "stored_bytes" (their size on disk).
+
     Raises:
-        DataPersistenceError: If the file does not exist or copying fails.
+        DataPersistenceError: If a file is missing or the store cannot be written.
     """
-    try:
-        # Check that source file exists
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"Source file '{file_path}' does not exist.")
-
-        # Ensure backup directory exists
-        os.makedirs(backup_dir, exist_ok=True)
-
-        # Construct backup file name
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_path = os.path.join(
-            backup_dir,
-            f"{os.path.basename(file_path)}_{timestamp}.bak"
-        )
-
-        # Copy file safely
-        shutil.copy2(file_path, backup_path)
-        return backup_path
-
-    except FileNotFoundError as e:
-        # Expected: file missing — raise meaningful persistence error
-        raise DataPersistenceError(str(e))
-    except OSError as e:
-        # File system or permission errors
-        raise DataPersistenceError(f"Failed to back up '{file_path}': {e}")
-
-
-# if __name__ == "__main__":
-#     # Create dummy data dir
-#     os.makedirs(BACKUP_DIR, exist_ok=True)
-
-#     # Create a sample file to back up
-#     file_path = DATA_DIR / "test.json"
-#     with open(file_path, "w") as f:
-#         f.write('{"user_id": "001", "name": "Test User"}')
-
-#     # Try making a backup
-#     try:
-#         result = backup_file(file_path, BACKUP_DIR)
-#         print("Backup successful:", result)
-#     except DataPersistenceError as e:
-#         print("Backup failed:", e)
+    chunks_dir, manifests_dir = _store_dirs(backup_dir)
+    if paths is None:
+        names = data_files(data_dir, backup_dir)
+    else:
+        names = [os.path.relpath(os.path.abspath(p), os.path.abspath(data_dir)) for p in paths]
+
+    # Held so a concurrent prune never deletes chunks before our manifest references them
+    with file_lock(os.path.join(backup_dir, "store")):
+        history = list_backups(backup_dir)
+        previous = {}  # latest known entry of every file
+        for m in history:
+            previous.update(m["files"])
+        files, new_chunks, new_bytes, stored_bytes = {}, 0, 0, 0
+        if paths is not None and history:
+            files.update(history[-1]["files"])  # refreshed below for `paths`
+        compress = _CODECS[compression][1]
+
+        try:
+            for name in names:
+                path = os.path.join(data_dir, name)
+                if not os.path.exists(path):
+                    raise FileNotFoundError(f"Source file '{path}' does not exist.")
+
+                with file_lock(path, shared=True):
+                    st = os.stat(path)
+                    stamp = {"size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                             "version": read_version(path)}
+                    entry = previous.get(name)
+                    if entry and all(entry.get(k) == v for k, v in stamp.items()):
+                        files[name] = entry  # unchanged: nothing to read
+                        continue
+                    with open(path, "rb") as f:
+                        data = f.read()
+
+                chunks, start = [], 0
+                for end in chunk_boundaries(data):
+                    piece = data[start:end]
+                    digest = hashlib.sha256(piece).hexdigest()
+                    if _find_chunk(chunks_dir, digest)[0] is None:
+                        stored = compress(piece)
+                        _write_bytes(stored, _chunk_path(chunks_dir, digest, compression))
+                        new_chunks += 1
+                        new_bytes += len(piece)
+                        stored_bytes += len(stored)
+                    chunks.append(digest)
+                    start = end
+                files[name] = dict(stamp, sha256=hashlib.sha256(data).hexdigest(), chunks=chunks)
+
+            if only_if_changed and history and files == history[-1]["files"]:
+                return None
+
+            now = datetime.now()
+            backup_id = now.strftime("%Y%m%dT%H%M%S%f")
+            while os.path.exists(os.path.join(manifests_dir, f"{backup_id}.json")):
+                backup_id += "_"
+            manifest = {"id": backup_id, "created": now.isoformat(timespec="seconds"),
+                        "files": files}
+            os.makedirs(manifests_dir, exist_ok=True)
+            _atomic_write(manifest, os.path.join(manifests_dir, f"{backup_id}.json"))
+        except OSError as e:
+            raise DataPersistenceError(f"Failed to create backup: {e}")
+
+        if prune:
+            prune_backups(backup_dir=backup_dir)
+
+    return dict(manifest, new_chunks=new_chunks, new_bytes=new_bytes, stored_bytes=stored_bytes)
+
+
+def prune_backups(keep=AUTO_BACKUP_LIMIT, max_age_days=BACKUP_MAX_AGE_DAYS, backup_dir=BACKUP_DIR):
+    """
+    Delete the backups beyond the newest `keep` and those older than
+    `max_age_days` (the newest backup is always kept), then every chunk
+    no remaining manifest references.
+
+    Returns:
+        tuple: (backups deleted, chunks deleted)
+    """
+    chunks_dir, manifests_dir = _store_dirs(backup_dir)
+    with file_lock(os.path.join(backup_dir, "store")):
+        manifests = list_backups(backup_dir)
+        cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat(timespec="seconds")
+        kept = [m for i, m in enumerate(manifests)
+                if i >= len(manifests) - keep and (m["created"] >= cutoff or i == len(manifests) - 1)]
+
+        kept_ids = {m["id"] for m in kept}
+        for m in manifests:
+            if m["id"] not in kept_ids:
+                os.remove(os.path.join(manifests_dir, f"{m['id']}.json"))
+
+        referenced = {digest for m in kept for entry in m["files"].values()
+                      for digest in entry["chunks"]}
+        deleted_chunks = 0
+        if os.path.isdir(chunks_dir):
+            for root, _, names in os.walk(chunks_dir):
+                for name in names:
+                    if name.split(".")[0] not in referenced:
+                        os.remove(os.path.join(root, name))
+                        deleted_chunks += 1
+
+    return len(manifests) - len(kept), deleted_chunks
+
+
+def find_backup(backup_id=None, at=None, backup_dir=BACKUP_DIR):
+    """
+    Return the manifest with `backup_id`, or the latest one taken at or
+    before `at` ('YYYY-MM-DD' or ISO datetime), or the latest of all.
+    Returns None if there is no match.
+    """
+    manifests = list_backups(backup_dir)
+    if backup_id is not None:
+        return next((m for m in manifests if m["id"] == backup_id), None)
+    if at is not None:
+        if len(at) == 10:
+            at += "T23:59:59"  # a date means the end of that day
+        manifests = [m for m in manifests if m["created"] <= at]
+    return manifests[-1] if manifests else None
+
+
+def restore_backup(backup_id=None, at=None, data_dir=DATA_DIR, backup_dir=BACKUP_DIR):
+    """
+    Bring `data_dir` back to one backup (see find_backup() for the choice):
+    its files are rebuilt and the data files it does not list (created
+    after it, such as the JSONL change logs next to the snapshots) are
+    removed, so derived data never keeps changes the backup predates.
+
+    Returns:
+        dict: The manifest that was restored.
+
+    Raises:
+        DataPersistenceError: If no backup matches or a chunk is missing or corrupt.
+    """
+    chunks_dir, _ = _store_dirs(backup_dir)
+    with file_lock(os.path.join(backup_dir, "store"), shared=True):
+        manifest = find_backup(backup_id, at, backup_dir)
+        if manifest is None:
+            raise DataPersistenceError("No backup matches the requested point in time.")
+
+        restored = []
+        for name, entry in manifest["files"].items():
+            try:
+                data = b"".join(_read_chunk(chunks_dir, d) for d in entry["chunks"])
+            except OSError as e:
+                raise DataPersistenceError(f"Backup {manifest['id']} is incomplete: {e}")
+            if hashlib.sha256(data).hexdigest() != entry["sha256"]:
+                raise DataPersistenceError(f"Backup {manifest['id']} is corrupt for {name}.")
+            restored.append((os.path.join(data_dir, name), "write", data))
+        restored += [(os.path.join(data_dir, name), "remove", None)
+                     for name in data_files(data_dir, backup_dir)
+                     if name not in manifest["files"]]
+
+        # One WAL unit: every file is restored or removed, or none is.
+        # Running processes see the new version stamps and reload.
+        with file_locks([path for path, _, _ in restored]):
+            wal.commit(restored)
+
+    return manifest
+
+
+def backup_file(file_path, data_dir=DATA_DIR, backup_dir=BACKUP_DIR):
+    """
+    Create an incremental backup of one data file before overwrite. The
+    other files keep their entries from the latest backup.
+
+    Returns:
+        str: Path to the manifest of the backup.
+    Raises:
+        DataPersistenceError: If the file does not exist or the backup fails.
+    """
+    manifest = create_backup([file_path], data_dir=data_dir, backup_dir=backup_dir)
+    return os.path.join(_store_dirs(backup_dir)[1], f"{manifest['id']}.json")
@@ -0,0 +1,139 @@
+"""
+backup_worker.py
+Background backups.
+
+A daemon thread takes incremental, compressed backups (see backup.py)
+whenever a write is reported with notify_write() and every
+AUTO_BACKUP_INTERVAL seconds, so the menu loop never waits for one.
+Requests that pile up while a backup runs are all served by the next one,
+and a backup that would be identical to the latest one is skipped.
+
+    backup_worker.start()
+    ...
+    backup_worker.notify_write()   # cheap: only queues a request
+    backup_worker.status()         # queue depth, last latency, bytes saved
+"""
+
+import queue
+import threading
+import time
+from persistence.backup import create_backup
+from config import AUTO_BACKUP_INTERVAL
+
+_STOP = object()
+
+
+class BackupWorker:
+    """Runs create_backup() on a background thread on request or on a schedule."""
+
+    def __init__(self, interval=AUTO_BACKUP_INTERVAL, backup=create_backup):
+        self.interval = interval
+        self._backup = backup
+        self._queue = queue.Queue()
+        self._thread = None
+        self.backups = 0            # backups written
+        self.skipped = 0            # runs where nothing had changed
+        self.last_backup_id = None
+        self.last_latency = None    # seconds taken by the last run
+        self.bytes_saved = 0        # data bytes backed up minus bytes added to the store
+        self.errors = 0             # runs that failed
+        self.last_error = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="backup-worker", daemon=True)
+            self._thread.start()
+
+    def request(self, reason="write"):
+        """Ask for a backup soon (non-blocking)."""
+        self._queue.put(reason)
+
+    def stop(self, timeout=None):
+        """Serve the pending requests, then stop the thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def status(self):
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize(),
+            "backups": self.backups,
+            "skipped": self.skipped,
+            "last_backup_id": self.last_backup_id,
+            "last_latency": self.last_latency,
+            "bytes_saved": self.bytes_saved,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+
+    def _run(self):
+        while True:
+            try:
+                reasons = [self._queue.get(timeout=self.interval or None)]
+            except queue.Empty:
+                reasons = ["schedule"]
+            # One backup covers everything requested meanwhile
+            while True:
+                try:
+                    reasons.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if any(r is not _STOP for r in reasons):
+                self._run_backup()
+            if _STOP in reasons:
+                return
+
+    def _run_backup(self):
+        start = time.perf_counter()
+        try:
+            manifest = self._backup(only_if_changed=True)
+        except Exception as e:  # any failure: record it and keep serving requests
+            self.errors += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            return
+        finally:
+            self.last_latency = time.perf_counter() - start
+
+        self.last_error = None
+        if manifest is None:
+            self.skipped += 1
+            return
+        self.backups += 1
+        self.last_backup_id = manifest["id"]
+        total = sum(entry["size"] for entry in manifest["files"].values())
+        self.bytes_saved += total - manifest["stored_bytes"]
+
+
+_worker = None
+
+
+def start(interval=AUTO_BACKUP_INTERVAL):
+    """Start the process-wide backup worker (idempotent)."""
+    global _worker
+    if _worker is None:
+        _worker = BackupWorker(interval)
+    _worker.start()
+    return _worker
+
+
+def notify_write():
+    """Report that data changed; queues a backup if the worker is running."""
+    if _worker is not None and _worker.running:
+        _worker.request()
+
+
+def stop(timeout=10):
+    """Finish pending backups and stop the worker."""
+    if _worker is not None:
+        _worker.stop(timeout)
+
+
+def status():
+    """Return the worker metrics, or None if it was never started."""
+    return _worker.status() if _worker is not None else None
@@ -0,0 +1,70 @@
+"""
+cache.py
+Process-wide cache for parsed data files.
+
+Each entry is stored together with a signature of the files it was built
+from: their mtime and size on disk plus an in-process write version that
+is bumped on every save. An entry is reused only while that signature is
+unchanged, so edits made by this process or by anyone else on disk are
+always picked up.
+"""
+
+import os
+from collections import defaultdict
+
+_entries = {}                      # key -> (signature, value)
+_write_versions = defaultdict(int)  # path -> number of writes by this process
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+def signature(paths):
+    """Return the current signature of a group of files."""
+    return tuple((str(p), _stat(p), _write_versions[str(p)]) for p in paths)
+
+
+def note_write(path):
+    """Record that this process has written (or removed) `path`."""
+    _write_versions[str(path)] += 1
+
+
+def get(key, paths, loader):
+    """
+    Return the cached value for `key`, rebuilding it with `loader()` when
+    any of `paths` changed since it was cached.
+    """
+    sig = signature(paths)
+    entry = _entries.get(key)
+    if entry is not None and entry[0] == sig:
+        return entry[1]
+
+    value = loader()
+    _entries[key] = (sig, value)
+    return value
+
+
+def peek(key, paths):
+    """Return the cached value for `key` if it is still fresh, else None."""
+    entry = _entries.get(key)
+    if entry is not None and entry[0] == signature(paths):
+        return entry[1]
+    return None
+
+
+def put(key, paths, value):
+    """Store `value` as the fresh cached value for `key` (write-through)."""
+    _entries[key] = (signature(paths), value)
+
+
+def invalidate(key=None):
+    """Drop one cached entry, or every entry when `key` is None."""
+    if key is None:
+        _entries.clear()
+    else:
+        _entries.pop(key, None)
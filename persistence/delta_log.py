@@ -0,0 +1,80 @@
+"""
+delta_log.py
+Append-only change logs for derived data files (report aggregates, text
+indexes).
+
+A derived file such as aggregates.json is kept as a snapshot plus a JSONL
+log next to it (aggregates.jsonl) holding one JSON record per line for
+every change made since the snapshot was written. Recording a change
+appends a line instead of rewriting the whole snapshot; readers fold the
+records over the snapshot, and the log is folded back into the snapshot
+once it grows past LOG_COMPACT_BYTES (see compact()). What a record holds
+and how it is folded is up to the module that owns the file.
+"""
+
+import json
+import os
+from persistence.load_save_json import append_text, remove_file, save_json, pending_ops, atomic
+from persistence.locking import file_locks
+from config import LOG_COMPACT_BYTES
+
+
+def log_path(path):
+    """Return the log of a snapshot file (aggregates.json -> aggregates.jsonl)."""
+    return os.path.splitext(str(path))[0] + ".jsonl"
+
+
+def paths(path):
+    """Return [snapshot, log]: the files to lock and watch together."""
+    return [str(path), log_path(path)]
+
+
+def append(path, records):
+    """Append `records` (JSON-serializable values) to the log of `path`."""
+    if records:
+        append_text("".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records),
+                    log_path(path))
+
+
+def read(path):
+    """
+    Return the records logged for `path`, including appends still deferred
+    by group_commit()/atomic(). A truncated last line (crash during
+    append) is skipped.
+    """
+    log = log_path(path)
+    pending = pending_ops(log)
+    lines = []
+    if pending[:1] != [("remove", None)] and os.path.exists(log):
+        try:
+            with open(log, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except OSError as e:
+            raise ValueError(f"Error reading log {log}: {e}")
+    for kind, text in pending:
+        if kind == "append":
+            lines += text.splitlines()
+
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue  # partial write, skip it
+    return records
+
+
+def due(path, max_bytes=LOG_COMPACT_BYTES):
+    """Return True once the log of `path` has grown past `max_bytes`."""
+    log = log_path(path)
+    return os.path.exists(log) and os.path.getsize(log) > max_bytes
+
+
+def compact(path, data):
+    """
+    Replace the snapshot with `data` (every logged change folded in) and
+    drop the log, in one WAL unit.
+    """
+    with file_locks(paths(path)), atomic():
+        save_json(data, path)
+        remove_file(log_path(path))
@@ -1,9 +1,44 @@
+import copy
 import json
 import os
-from utils.errors import DataPersistenceError
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, ExitStack
+from persistence import cache, wal
+from persistence.locking import (file_lock, file_locks, watched, read_version,
+                                 check_versions, retry_on_conflict)
+from utils.errors import DataPersistenceError, ConcurrentModificationError
+from config import GROUP_COMMIT_WINDOW
+
+
+class _Unit(threading.local):
+    """
+    The changes deferred by the group_commit()/atomic() blocks of one
+    thread. Every thread (the backup worker, asyncio.to_thread calls) has
+    its own, so one thread's blocks never commit or discard another's.
+    """
+
+    def __init__(self):
+        self.pending = {}         # path -> latest unsaved data
+        self.ops = {}             # path -> appends/removals in order
+        self.since = None
+        self.group_depth = 0
+        self.atomic_depth = 0
+        self.locks = ExitStack()  # file locks held until the atomic() block commits
+        self.paths = set()
+
+
+_unit = _Unit()
+
+_NUMBER_END = re.compile(r"[,\]\s]")
 
 def load_json(file_path):
-    if not os.path.exists(file_path):
+    if str(file_path) in _unit.pending:
+        return _unit.pending[str(file_path)]
+    removed = _unit.ops.get(str(file_path), [(None,)])[0][0] == "remove"
+    if removed or not os.path.exists(file_path):
         raise FileNotFoundError(f"The file {file_path} does not exist.")
     try:
         with open(file_path, 'r') as file:
@@ -12,10 +47,375 @@ def load_json(file_path):
     except (json.JSONDecodeError, OSError) as e:
         raise ValueError(f"Error reading JSON from file {file_path}: {e}")
 
-def save_json(data, file_path):
+def iter_json_array(file_path, chunk_size=1 << 16):
+    """
+    Yield the elements of a file holding one top-level JSON array, one at a
+    time, reading `chunk_size` characters at a time. Memory use depends on
+    the largest element, not on the file size.
+    """
+    pending = _unit.pending.get(str(file_path))
+    removed = _unit.ops.get(str(file_path), [(None,)])[0][0] == "remove"
+    if pending is not None:
+        yield from pending
+        return
+    if removed or not os.path.exists(file_path):
+        raise FileNotFoundError(f"The file {file_path} does not exist.")
+
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r') as file:
+        buffer, pos, eof = "", 0, False
+
+        def fill():
+            # Drop what was consumed and append the next chunk
+            nonlocal buffer, pos, eof
+            chunk = file.read(chunk_size)
+            buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+
+        def next_char():
+            # Skip whitespace and return the next character ("" at end of file)
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    return buffer[pos:pos + 1]
+                fill()
+
+        def error(message):
+            return ValueError(f"Error reading JSON from file {file_path}: {message}")
+
+        try:
+            if next_char() != "[":
+                raise error("expected a top-level array")
+            pos += 1
+            if next_char() == "]":
+                return
+
+            while True:
+                first = next_char()
+                if not first:
+                    raise error("unexpected end of file")
+                if first in "-0123456789" and not eof and not _NUMBER_END.search(buffer, pos):
+                    fill()  # the number may continue in the next chunk
+                    continue
+                try:
+                    element, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    fill()
+                    continue
+                pos = end
+                yield element
+
+                separator = next_char()
+                pos += 1
+                if separator == "]":
+                    return
+                if separator != ",":
+                    raise error(f"expected ',' or ']' at offset {pos - 1}")
+        except json.JSONDecodeError as e:
+            raise error(e)
+
+def load_json_cached(file_path):
+    """
+    Same as load_json, but reuses the parsed data until the file changes.
+    The returned object is shared by every caller and must not be mutated:
+    change files with update_json, or save_json a deep copy.
+    """
+    return cache.get(str(file_path), watched([file_path]), lambda: load_json(file_path))
+
+def load_json_versioned(file_path):
+    """
+    Same as load_json_cached, but also return the version stamp of the
+    data (see locking.py), to pass to save_json(expected_version=...).
+
+    Returns:
+        tuple: (data, version)
+    """
+    paths = watched([file_path])
+    data = cache.peek(str(file_path), paths)
+    version = cache.peek(f"version:{file_path}", paths)
+    if data is None or version is None:
+        with file_lock(file_path, shared=True):
+            version = read_version(file_path)
+            data = load_json(file_path)
+        cache.put(str(file_path), paths, data)
+        cache.put(f"version:{file_path}", paths, version)
+    return data, version
+
+def _to_json(obj):
+    """json.dump fallback for record objects such as transactions.models.Transaction."""
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _atomic_write(data, file_path):
+    """
+    Write JSON to a temp file in the same directory, fsync it and rename it
+    over the target, so readers only ever see the old or the new file.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, 'w') as file:
+            json.dump(data, file, default=_to_json)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    # Persist the rename itself (not supported on every platform)
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass
+
+def save_json(data, file_path, expected_version=None):
+    """
+    Atomically replace `file_path` with `data` under its exclusive lock.
+    Inside atomic() the write joins the block's write-ahead log unit (see
+    wal.py).
+
+    With `expected_version` (from load_json_versioned) the write only
+    happens if nobody else wrote the file since it was read; otherwise
+    ConcurrentModificationError is raised and nothing is written.
+
+    `data` becomes the cached copy of the file: do not mutate it afterwards.
+    """
+    file_path = str(file_path)
+    with file_lock(file_path):
+        if expected_version is not None:
+            try:
+                check_versions([file_path], [expected_version])
+            except ConcurrentModificationError:
+                cache.invalidate(file_path)
+                raise
+
+        if _defer(file_path, data=data):
+            cache.put(file_path, watched([file_path]), data)
+        else:
+            _commit({file_path: data}, {})
+            return
+
+    _flush_if_due()
+
+def append_text(text, file_path):
+    """
+    Append `text` (whole lines) to a file such as a JSONL log. A torn last
+    line left by a crash is cut off first, so it never swallows `text`.
+    """
+    file_path = str(file_path)
+    with file_lock(file_path):
+        if not _defer(file_path, op=("append", text)):
+            _commit({}, {file_path: [("append", text)]})
+            return
+    _flush_if_due()
+
+def remove_file(file_path):
+    """Delete a data file (no-op if it does not exist)."""
+    file_path = str(file_path)
+    with file_lock(file_path):
+        if not _defer(file_path, op=("remove", None)):
+            if os.path.exists(file_path):
+                _commit({}, {file_path: [("remove", None)]})
+            return
+    _flush_if_due()
+
+def pending_ops(file_path):
+    """Return the appends/removals of `file_path` deferred by group_commit() or atomic()."""
+    return list(_unit.ops.get(str(file_path), ()))
+
+def _defer(file_path, data=None, op=None):
+    """
+    Queue a write (`data`) or an append/remove (`op`) when inside
+    group_commit() or atomic(). Call with the file's exclusive lock held.
+    Returns False when the change must be committed right away.
+    """
+    if not _unit.group_depth and not (_unit.pending or _unit.ops):
+        return False  # otherwise queue behind the changes a failed flush left
+    if op is None:
+        _unit.pending[file_path] = data
+        _unit.ops.pop(file_path, None)  # replaced by the full content
+    elif op[0] == "remove":
+        _unit.pending.pop(file_path, None)
+        _unit.ops[file_path] = [op]
+    else:
+        _unit.ops.setdefault(file_path, []).append(op)
+    _unit.since = _unit.since or time.monotonic()
+    if _unit.atomic_depth and file_path not in _unit.paths:
+        # Keep the file locked until the unit commits
+        _unit.locks.enter_context(file_lock(file_path))
+        _unit.paths.add(file_path)
+    cache.note_write(file_path)
+    return True
+
+def _flush_if_due():
+    if (not _unit.atomic_depth and _unit.since is not None
+            and (not _unit.group_depth or time.monotonic() - _unit.since >= GROUP_COMMIT_WINDOW)):
+        flush_pending()
+
+def _commit(writes, ops):
+    """
+    Apply the writes ({path: data}) and appends/removals ({path: [(kind, text)]})
+    all-or-nothing (see wal.commit) and refresh the cache. Call with every
+    file's exclusive lock held.
+    """
+    unit = []
+    try:
+        for file_path, data in writes.items():
+            unit.append((file_path, "write", json.dumps(data, default=_to_json).encode()))
+        for file_path, file_ops in ops.items():
+            unit.extend((file_path, kind, text.encode("utf-8") if text else b"")
+                        for kind, text in file_ops)
+        versions = wal.commit(unit)
+    except (TypeError, ValueError, DataPersistenceError) as e:
+        for file_path in [*writes, *ops]:
+            cache.note_write(file_path)
+            cache.invalidate(file_path)
+        if isinstance(e, DataPersistenceError):
+            raise
+        raise DataPersistenceError(f"Error saving JSON to {file_path}: {e}")
+
+    # Keep the cache in step with what is now on disk
+    for file_path, data in writes.items():
+        cache.put(file_path, watched([file_path]), data)
+        cache.put(f"version:{file_path}", watched([file_path]), versions[file_path])
+
+@retry_on_conflict
+def update_json(file_path, mutate, default=None):
+    """
+    Read-modify-write one JSON file safely against other processes.
+
+    `mutate(data)` changes a private copy of the loaded data in place (the
+    cached data stays untouched if it fails); the result is saved only if
+    the file is still at the version that was read, otherwise the read and
+    `mutate` are repeated on the fresh data.
+
+    Args:
+        file_path (str): File to update.
+        mutate (callable): Called with the data; may be called more than once.
+        default: Data to start from when the file does not exist yet
+            (None raises FileNotFoundError instead).
+
+    Returns:
+        Whatever the last call of `mutate` returned.
+    """
+    try:
+        data, version = load_json_versioned(file_path)
+    except FileNotFoundError:
+        if default is None:
+            raise
+        data, version = default, read_version(file_path)
+    data = copy.deepcopy(data)
+    result = mutate(data)
+    save_json(data, file_path, expected_version=version)
+    return result
+
+def _pending_state():
+    return (dict(_unit.pending), {path: list(o) for path, o in _unit.ops.items()},
+            _unit.since)
+
+def _set_pending(writes, ops, since):
+    _unit.pending, _unit.ops, _unit.since = writes, ops, since
+
+def _take_pending():
+    state = _pending_state()
+    _set_pending({}, {}, None)
+    return state
+
+def _restore_pending(writes, ops, since):
+    """Put back the changes of a failed flush, ahead of those deferred since."""
+    for path in dict.fromkeys([*writes, *ops]):
+        newer_ops = _unit.ops.get(path, [])
+        if path in _unit.pending or newer_ops[:1] == [("remove", None)]:
+            continue  # replaced meanwhile by a full write or a removal
+        if path in writes:
+            _unit.pending[path] = writes[path]
+        if path in ops or newer_ops:
+            _unit.ops[path] = ops.get(path, []) + newer_ops
+    _unit.since = min(t for t in (since, _unit.since) if t is not None)
+
+def flush_pending():
+    """
+    Commit every change this thread deferred by group_commit() as one unit
+    (one fsync). If that fails the changes stay pending and are retried by
+    the next flush.
+    """
+    writes, ops, since = _take_pending()
+    if writes or ops:
+        try:
+            with file_locks(list(dict.fromkeys([*writes, *ops]))):
+                _commit(writes, ops)
+        except BaseException:
+            _restore_pending(writes, ops, since)
+            raise
+
+@contextmanager
+def group_commit():
+    """
+    Coalesce save_json calls made inside the block.
+
+    Repeated saves of the same file are merged and written once, either when
+    GROUP_COMMIT_WINDOW seconds have passed since the first pending save or
+    when the outermost block exits.
+
+    Example:
+        with group_commit():
+            for row in rows:
+                add_transaction(...)
+    """
+    _unit.group_depth += 1
+    try:
+        yield
+    finally:
+        _unit.group_depth -= 1
+        if not _unit.group_depth:
+            flush_pending()
+
+@contextmanager
+def atomic():
+    """
+    Make every save_json, append_text and remove_file inside the block one
+    all-or-nothing WAL unit: after a crash either every file shows the
+    block's changes or none does. The files stay locked until the
+    outermost block commits. If the block raises, its own changes are
+    discarded; those of an enclosing group_commit() or atomic() block made
+    before it stay pending.
 
+    Example:
+        with atomic():
+            save_json(recurring, RECURRING_FILE)
+            insert_transactions(new_transactions)
+    """
+    _unit.group_depth += 1
+    _unit.atomic_depth += 1
+    before = _pending_state()
+    committed = False
     try:
-        with open(file_path, 'w') as file:
-            json.dump(data, file)
-    except OSError as e:
-        raise DataPersistenceError(f"Error saving JSON to {file_path}: {e}")
\ No newline at end of file
+        yield
+        committed = True
+    finally:
+        _unit.group_depth -= 1
+        _unit.atomic_depth -= 1
+        try:
+            if not committed:
+                _set_pending(*before)
+                cache.invalidate()  # drop the cached copies of the discarded changes
+            elif not _unit.group_depth:
+                flush_pending()
+        except BaseException:
+            _set_pending(*before)  # the block is all-or-nothing: not retried later
+            cache.invalidate()
+            raise
+        finally:
+            if not _unit.atomic_depth:
+                _unit.paths.clear()
+                _unit.locks.close()
@@ -0,0 +1,145 @@
+"""
+locking.py
+Cross-process file locks and version stamps.
+
+Every data file gets a sidecar "<file>.lock". It is locked with fcntl.flock
+(shared for reads, exclusive for writes) and holds the file's version
+stamp: a counter bumped on every write. A writer that read version N and
+finds another number under the exclusive lock knows someone else wrote in
+between, so it raises ConcurrentModificationError instead of overwriting
+their change; retry_on_conflict() then re-runs the whole read-modify-write
+on fresh data.
+
+Locks are reentrant within a process and also serialize its threads. On
+platforms without fcntl only the in-process part applies.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, ExitStack
+from functools import wraps
+from persistence import cache
+from utils.errors import ConcurrentModificationError
+from config import WRITE_RETRIES
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+_guard = threading.Lock()
+_thread_locks = defaultdict(threading.RLock)  # path -> lock serializing this process
+_held = {}                                    # path -> [fd, depth, exclusive]
+
+stats = {"conflicts": 0}  # conflicts seen by this process (see benchmarks/)
+
+
+def lock_path(path):
+    """Return the sidecar lock/version file of a data file."""
+    return f"{path}.lock"
+
+
+def watched(paths):
+    """Return `paths` plus their lock files, for cache signatures."""
+    return [str(p) for p in paths] + [lock_path(p) for p in paths]
+
+
+def _flock(fd, operation):
+    if fcntl is not None:
+        fcntl.flock(fd, getattr(fcntl, operation))
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    """
+    Hold the advisory lock of `path` for the duration of the block.
+    Nested blocks on the same path reuse the lock (a nested exclusive
+    request upgrades a shared one until it exits).
+    """
+    path = str(path)
+    with _guard:
+        thread_lock = _thread_locks[path]
+
+    with thread_lock:
+        held = _held.get(path)
+        if held is None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            fd = os.open(lock_path(path), os.O_RDWR | os.O_CREAT, 0o644)
+            _flock(fd, "LOCK_SH" if shared else "LOCK_EX")
+            held = _held[path] = [fd, 0, not shared]
+        upgraded = not shared and not held[2]
+        if upgraded:
+            _flock(held[0], "LOCK_EX")
+            held[2] = True
+        held[1] += 1
+        try:
+            yield
+        finally:
+            held[1] -= 1
+            if upgraded:
+                _flock(held[0], "LOCK_SH")
+                held[2] = False
+            if held[1] == 0:
+                del _held[path]
+                _flock(held[0], "LOCK_UN")
+                os.close(held[0])
+
+
+@contextmanager
+def file_locks(paths, shared=False):
+    """Lock several files, always in the given order."""
+    with ExitStack() as stack:
+        for path in paths:
+            stack.enter_context(file_lock(path, shared))
+        yield
+
+
+def read_version(path):
+    """Return the version stamp of `path` (0 if it was never written)."""
+    try:
+        with open(lock_path(path), "r") as f:
+            return int(f.read() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def bump_version(path):
+    """Increment the version stamp of `path`. Call with its exclusive lock held."""
+    version = read_version(path) + 1
+    with open(lock_path(path), "r+") as f:
+        f.write(str(version))
+        f.truncate()
+    cache.note_write(lock_path(path))
+    return version
+
+
+def check_versions(paths, expected):
+    """
+    Raise ConcurrentModificationError unless `paths` are still at the
+    `expected` list of versions. Call with their exclusive locks held.
+    """
+    if expected != [read_version(path) for path in paths]:
+        stats["conflicts"] += 1
+        raise ConcurrentModificationError(
+            f"{paths[0]} was modified by another writer since it was read.")
+
+
+def retry_on_conflict(func):
+    """
+    Re-run `func` when it raises ConcurrentModificationError, up to
+    WRITE_RETRIES attempts with a short randomized backoff. `func` must
+    re-read whatever it modifies on every call.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(WRITE_RETRIES):
+            try:
+                return func(*args, **kwargs)
+            except ConcurrentModificationError:
+                if attempt == WRITE_RETRIES - 1:
+                    raise
+                time.sleep(random.uniform(0, 0.005 * 2 ** attempt))
+    return wrapper
@@ -0,0 +1,180 @@
+"""
+migrate.py
+One-shot data migrations.
+
+Usage:
+    python -m persistence.migrate
+        Copy the JSON transaction files into the sqlite backend, then set
+        TRANSACTION_STORAGE = "sqlite" in config.py.
+    python -m persistence.migrate --shard
+        Split the global data files into one folder per user, then set
+        DATA_LAYOUT = "sharded" in config.py.
+    python -m persistence.migrate --amounts [--drop-invalid]
+        Round the stored amounts to whole cents. Rows whose amount is not a
+        finite number are listed; --drop-invalid deletes them.
+"""
+
+import argparse
+import os
+import config
+from persistence import transaction_log
+from persistence.load_save_json import load_json, save_json, remove_file
+from persistence.repository import sharded_user_ids
+from persistence.sqlite_repository import SqliteRepository
+from transactions.models import to_minor
+from utils.errors import InvalidTransactionError
+from config import (TRANSACTIONS_FILE, TRANSACTIONS_LOG_FILE, SQLITE_FILE, BUDGET_FILE,
+                    GOALS_FILE, RECURRING_FILE, USERS_DIR, user_shard_file)
+
+
+def migrate_json_to_sqlite(json_path=TRANSACTIONS_FILE, log_path=TRANSACTIONS_LOG_FILE,
+                           db_path=SQLITE_FILE):
+    """
+    Copy every transaction from the JSON snapshot (and pending JSONL log)
+    into the sqlite database. Running it twice is safe: rows are upserted
+    by transaction_id.
+
+    Returns:
+        int: Number of transactions migrated.
+    """
+    transactions = transaction_log.load_transactions(json_path, log_path)
+    repo = SqliteRepository(db_path)
+    repo.add_many(transactions)
+    return len(transactions)
+
+
+def migrate_to_sharded(json_path=TRANSACTIONS_FILE, log_path=TRANSACTIONS_LOG_FILE):
+    """
+    Split the global transactions, budgets, goals and recurring files into
+    data/users/<user_id>/. Each user file keeps the global shape (budgets
+    stay {user_id: {...}}) so the same code reads both layouts. The global
+    files are left in place; aggregates and text indexes are rebuilt on
+    first use. Running it again overwrites the user folders.
+
+    Returns:
+        dict: Number of users and transactions written.
+    """
+    by_user = {}
+    transactions = transaction_log.load_transactions(json_path, log_path)
+    for txn in transactions:
+        by_user.setdefault(txn["user_id"], []).append(txn)
+
+    for user_id, rows in by_user.items():
+        path = user_shard_file(user_id, "transactions")
+        os.makedirs(path.parent, exist_ok=True)
+        save_json(rows, path)
+        log = user_shard_file(user_id, "transactions_log")
+        remove_file(log)  # the snapshot above already holds every change
+
+    users = set(by_user)
+    for kind, global_file in (("budgets", BUDGET_FILE), ("goals", GOALS_FILE),
+                              ("recurring", RECURRING_FILE)):
+        if not os.path.exists(global_file):
+            continue
+        for user_id, value in load_json(global_file).items():
+            path = user_shard_file(user_id, kind)
+            os.makedirs(path.parent, exist_ok=True)
+            save_json({user_id: value}, path)
+            users.add(user_id)
+
+    return {"users": len(users), "transactions": len(transactions)}
+
+
+def _amount_fixes(rows):
+    """Return ({transaction_id: amount rounded to cents}, [IDs of non-finite amounts])."""
+    rounded, invalid = {}, []
+    for transaction_id, amount in rows:
+        try:
+            cents = to_minor(amount)
+        except (InvalidTransactionError, TypeError, ValueError):
+            invalid.append(transaction_id)
+            continue
+        if cents / 100 != amount:
+            rounded[transaction_id] = cents / 100
+    return rounded, invalid
+
+
+def _json_amounts(snapshot_path, log_path):
+    transactions = transaction_log.load_transactions(snapshot_path, log_path)
+    rounded, invalid = _amount_fixes((t["transaction_id"], t.get("amount")) for t in transactions)
+
+    def write():
+        dropped = set(invalid)
+        rows = [dict(t, amount=rounded.get(t["transaction_id"], t.get("amount")))
+                for t in transactions if t["transaction_id"] not in dropped]
+        transaction_log.save_snapshot(rows, snapshot_path, log_path)
+
+    return rounded, invalid, write
+
+
+def _sqlite_amounts(db_path):
+    repo = SqliteRepository(db_path)
+    rounded, invalid = _amount_fixes(repo.conn.execute(
+        "SELECT transaction_id, amount FROM transactions"))
+
+    def write():
+        with repo.conn:
+            repo.conn.executemany("UPDATE transactions SET amount = ? WHERE transaction_id = ?",
+                                  [(amount, tid) for tid, amount in rounded.items()])
+            repo.conn.executemany("DELETE FROM transactions WHERE transaction_id = ?",
+                                  [(tid,) for tid in invalid])
+
+    return rounded, invalid, write
+
+
+def migrate_amounts_to_cents(drop_invalid=False):
+    """
+    Round every stored amount of the configured backend to whole cents,
+    the precision transactions keep in memory (see models.to_minor), so
+    that what is stored matches what is shown and summed. Amounts that
+    are not finite numbers (NaN, infinity) cannot be loaded at all: the
+    rows holding them are only deleted with `drop_invalid`, otherwise
+    nothing is written.
+
+    Returns:
+        dict: Number of amounts rounded, and the IDs of the invalid rows.
+    """
+    if config.TRANSACTION_STORAGE == "sqlite":
+        stores = [_sqlite_amounts(SQLITE_FILE)]
+    elif config.DATA_LAYOUT == "sharded":
+        stores = [_json_amounts(user_shard_file(user_id, "transactions"),
+                                user_shard_file(user_id, "transactions_log"))
+                  for user_id in sharded_user_ids()
+                  if os.path.exists(user_shard_file(user_id, "transactions"))]
+    else:
+        stores = [_json_amounts(TRANSACTIONS_FILE, TRANSACTIONS_LOG_FILE)]
+
+    invalid = [tid for _, store_invalid, _ in stores for tid in store_invalid]
+    if drop_invalid or not invalid:
+        for rounded, store_invalid, write in stores:
+            if rounded or store_invalid:
+                write()
+    return {"rounded": sum(len(rounded) for rounded, _, _ in stores), "invalid": invalid}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate the finance data files.")
+    parser.add_argument("--shard", action="store_true",
+                        help="split the global files into one folder per user")
+    parser.add_argument("--amounts", action="store_true",
+                        help="round the stored amounts to whole cents")
+    parser.add_argument("--drop-invalid", action="store_true",
+                        help="with --amounts, delete rows whose amount is not a finite number")
+    args = parser.parse_args()
+
+    if args.amounts:
+        result = migrate_amounts_to_cents(args.drop_invalid)
+        if result["invalid"] and not args.drop_invalid:
+            print(f"Nothing written: {len(result['invalid'])} transaction(s) have an amount "
+                  f"that is not a finite number: {', '.join(result['invalid'])}. "
+                  f"Fix them or rerun with --drop-invalid.")
+        else:
+            print(f"Rounded {result['rounded']} amount(s) to whole cents, "
+                  f"deleted {len(result['invalid'])} invalid transaction(s).")
+    elif args.shard:
+        counts = migrate_to_sharded()
+        print(f"Wrote {counts['transactions']} transactions for {counts['users']} users "
+              f"into {USERS_DIR}.")
+    else:
+        count = migrate_json_to_sqlite()
+        print(f"Migrated {count} transactions into {SQLITE_FILE}.")
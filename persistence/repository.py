@@ -0,0 +1,567 @@
+"""
+repository.py
+Pluggable storage backends for transactions.
+
+Every backend implements the same TransactionRepository interface so the
+rest of the application never needs to know how transactions are stored.
+The backend is chosen with TRANSACTION_STORAGE in config.py:
+
+    "json"   -> JsonRepository   (single transactions.json file)
+    "jsonl"  -> JsonlRepository  (snapshot + append-only log)
+    "sqlite" -> SqliteRepository (indexed sqlite3 database)
+
+With DATA_LAYOUT = "sharded" the json/jsonl backends keep one set of
+files per user, routed by ShardedRepository.
+"""
+
+import os
+from datetime import date
+from persistence.load_save_json import load_json, save_json, iter_json_array
+from persistence import cache, transaction_log
+from persistence.locking import (file_locks, watched, read_version, check_versions,
+                                 retry_on_conflict)
+from transactions.index import UserDateIndex
+from transactions.models import Transaction
+from utils.date_utils import date_ordinal
+from utils.errors import ConcurrentModificationError
+import config
+
+
+class TransactionRepository:
+    """Base interface for transaction storage backends."""
+
+    def all(self):
+        """Return every stored transaction (list of Transaction records)."""
+        raise NotImplementedError
+
+    def iter_all(self):
+        """Iterate over every stored transaction (backends may stream them)."""
+        return iter(self.all())
+
+    def for_user(self, user_id, start_date=None, end_date=None, category=None, type=None,
+                 min_amount=None, max_amount=None):
+        """
+        Return one user's transactions, optionally narrowed down.
+
+        Args:
+            user_id (str): Owner of the transactions.
+            start_date (str): Inclusive 'YYYY-MM-DD' lower bound.
+            end_date (str): Inclusive 'YYYY-MM-DD' upper bound.
+            category (str): Category name (case-insensitive).
+            type (str): 'income' or 'expense' (case-insensitive).
+            min_amount (float): Inclusive lower bound on the amount.
+            max_amount (float): Inclusive upper bound on the amount.
+
+        Returns:
+            list: Matching transactions, oldest first.
+        """
+        raise NotImplementedError
+
+    def page(self, user_id, after=None, limit=50):
+        """
+        Return one page of a user's transactions for cursor pagination.
+
+        Args:
+            user_id (str): Owner of the transactions.
+            after (tuple): (day ordinal, transaction_id) of the last row
+                already seen, or None for the first page. Days compare as
+                dates, so '2024-1-5' and '2024-01-05' are the same day.
+            limit (int): Page size.
+
+        Returns:
+            list: Up to `limit` transactions ordered by (date, transaction_id).
+        """
+        start_date = date.fromordinal(after[0]).isoformat() if after else None
+        def key(t):
+            return (date_ordinal(t["date"]), t["transaction_id"])
+
+        rows = sorted(self.for_user(user_id, start_date=start_date), key=key)
+        if after:
+            rows = [t for t in rows if key(t) > tuple(after)]
+        return rows[:limit]
+
+    # The user_id arguments below name the owner of the transactions when the
+    # caller knows it; a sharded repository then only opens that user's files.
+
+    def get(self, transaction_id, user_id=None):
+        """Return the transaction with this ID, or None."""
+        return next((t for t in self.all() if t["transaction_id"] == transaction_id), None)
+
+    def add(self, txn):
+        """Store a new transaction."""
+        raise NotImplementedError
+
+    def add_many(self, transactions):
+        """Store several new transactions (backends override this with one write)."""
+        for txn in transactions:
+            self.add(txn)
+
+    def update(self, transaction_id, changes, user_id=None):
+        """Apply `changes` to a stored transaction. Returns True if found."""
+        raise NotImplementedError
+
+    def delete(self, transaction_id, user_id=None):
+        """Remove a stored transaction. Returns True if found."""
+        raise NotImplementedError
+
+    def update_many(self, changes, user_id=None):
+        """
+        Apply {transaction_id: changes} to several stored transactions
+        (backends override this with one write). Returns the number updated.
+        """
+        return sum(self.update(tid, c, user_id) for tid, c in changes.items())
+
+    def delete_many(self, transaction_ids, user_id=None):
+        """Remove several stored transactions. Returns the number deleted."""
+        return sum(self.delete(tid, user_id) for tid in dict.fromkeys(transaction_ids))
+
+    def replace_all(self, transactions):
+        """Replace the whole stored collection with `transactions`."""
+        raise NotImplementedError
+
+
+def match_filters(rows, category=None, type=None, min_amount=None, max_amount=None):
+    """Apply the non-date for_user() filters to `rows` in a single pass."""
+    if category is None and type is None and min_amount is None and max_amount is None:
+        return rows
+
+    # casefold(), like the Query predicates, so every backend matches the same rows
+    category = category.casefold() if category else None
+    type = type.casefold() if type else None
+    return [
+        t for t in rows
+        if (category is None or t.get("category", "").casefold() == category)
+        and (type is None or t.get("type", "").casefold() == type)
+        and (min_amount is None or float(t.get("amount", 0)) >= min_amount)
+        and (max_amount is None or float(t.get("amount", 0)) <= max_amount)
+    ]
+
+
+class FileRepository(TransactionRepository):
+    """
+    Shared logic for the file backends: the parsed list, the per-user date
+    index and the transaction_id -> position index are kept in the process
+    cache and updated on every write.
+
+    Writes are optimistic: the version stamps of the files (see locking.py)
+    are remembered when they are loaded, and a write that finds other
+    stamps under the exclusive lock raises ConcurrentModificationError.
+    The public write methods then retry on the reloaded data.
+    """
+
+    files = ()   # data files, in locking order
+    paths = ()   # data files and their lock files (cache signature)
+    cache_key = ""
+
+    def _load(self):
+        raise NotImplementedError
+
+    def all(self):
+        return cache.get(self.cache_key, self.paths, self._load_versioned)
+
+    def _versions(self):
+        return [read_version(path) for path in self.files]
+
+    def _load_versioned(self):
+        with file_locks(self.files, shared=True):
+            versions = self._versions()
+            transactions = self._load()
+        cache.put(f"versions:{self.cache_key}", self.paths, versions)
+        return transactions
+
+    def index(self):
+        """Return the per-user date index, rebuilt only when the data changed."""
+        return cache.get(f"index:{self.cache_key}", self.paths,
+                         lambda: UserDateIndex(self.all()))
+
+    def for_user(self, user_id, start_date=None, end_date=None, category=None, type=None,
+                 min_amount=None, max_amount=None):
+        rows = self.index().range(user_id, start_date, end_date)
+        return match_filters(rows, category, type, min_amount, max_amount)
+
+    def page(self, user_id, after=None, limit=50):
+        return self.index().page(user_id, after, limit)
+
+    def positions(self):
+        """Return the transaction_id -> list position hash index."""
+        return cache.get(f"ids:{self.cache_key}", self.paths,
+                         lambda: {t.transaction_id: i for i, t in enumerate(self.all())})
+
+    def get(self, transaction_id, user_id=None):
+        position = self.positions().get(transaction_id)
+        return self.all()[position] if position is not None else None
+
+    def _write(self, write, apply, base=None):
+        """
+        Run `write()` to persist a change, then apply the same change to the
+        cached list and index with `apply(transactions, index)`. The position
+        index is extended for appended rows and rebuilt once if rows were
+        removed.
+
+        Args:
+            base (list): The loaded list the change was computed from, or
+                None if it does not depend on the current rows.
+
+        Raises:
+            ConcurrentModificationError: If another process wrote the files
+                since `base` was loaded (nothing is written).
+        """
+        with file_locks(self.files):
+            transactions = self.all()
+            try:
+                if base is not None and transactions is not base:
+                    raise ConcurrentModificationError(
+                        f"{self.files[0]} was modified by another writer since it was read.")
+                check_versions(self.files, cache.peek(f"versions:{self.cache_key}", self.paths))
+            except ConcurrentModificationError:
+                self._forget()
+                raise
+
+            index = self.index()
+            positions = self.positions()
+            size = len(transactions)
+            write(transactions)
+            apply(transactions, index)
+
+            if len(transactions) < size:
+                positions = {t.transaction_id: i for i, t in enumerate(transactions)}
+            else:
+                for i in range(size, len(transactions)):
+                    positions[transactions[i].transaction_id] = i
+
+            self._remember(transactions, index, positions)
+
+    def _remember(self, transactions, index, positions=None):
+        """Cache the in-memory state as matching the files as they are now."""
+        cache.put(self.cache_key, self.paths, transactions)
+        cache.put(f"versions:{self.cache_key}", self.paths, self._versions())
+        for key, value in (("index", index), ("ids", positions)):
+            if value is None:
+                cache.invalidate(f"{key}:{self.cache_key}")
+            else:
+                cache.put(f"{key}:{self.cache_key}", self.paths, value)
+
+    def _forget(self):
+        for key in ("", "index:", "ids:", "versions:"):
+            cache.invalidate(f"{key}{self.cache_key}")
+
+    def _update_many(self, changes, write):
+        """
+        Apply {transaction_id: changes} with one `write()`.
+        Returns the number of transactions found and updated.
+        """
+        base = self.all()
+        found = [txn for txn in map(self.get, changes) if txn is not None]
+        if not found:
+            return 0
+
+        def apply(transactions, index):
+            # Rows only move in the date index when their date changes
+            moved = [t for t in found if "date" in changes[t.transaction_id]]
+            index.remove_many(moved)
+            for txn in found:
+                txn.update(changes[txn.transaction_id])
+            for txn in moved:
+                index.insert(txn)
+
+        self._write(write, apply, base)
+        return len(found)
+
+    def _delete_many(self, transaction_ids, write):
+        """
+        Remove the given IDs with one `write()`.
+        Returns the number of transactions found and deleted.
+        """
+        base = self.all()
+        positions = self.positions()
+        doomed = {tid for tid in transaction_ids if tid in positions}
+        if not doomed:
+            return 0
+
+        def apply(transactions, index):
+            index.remove_many([transactions[positions[tid]] for tid in doomed])
+            transactions[:] = [t for t in transactions if t.transaction_id not in doomed]
+
+        self._write(write, apply, base)
+        return len(doomed)
+
+    def update(self, transaction_id, changes, user_id=None):
+        return self.update_many({transaction_id: changes}) > 0
+
+    def delete(self, transaction_id, user_id=None):
+        return self.delete_many([transaction_id]) > 0
+
+
+class JsonRepository(FileRepository):
+    """Whole-file JSON storage (the original layout)."""
+
+    def __init__(self, path=None):
+        self.path = path or config.TRANSACTIONS_FILE
+        self.files = [self.path]
+        self.paths = watched(self.files)
+        self.cache_key = f"repo:{self.path}"
+
+    def _load(self):
+        return [Transaction.from_dict(t) for t in load_json(self.path)]
+
+    def iter_all(self):
+        cached = cache.peek(self.cache_key, self.paths)
+        if cached is not None:
+            return iter(cached)
+        # Not loaded yet: stream the file instead of parsing it all at once
+        return (Transaction.from_dict(t) for t in iter_json_array(self.path))
+
+    @retry_on_conflict
+    def add(self, txn):
+        txn = Transaction.from_dict(txn)
+
+        def apply(transactions, index):
+            transactions.append(txn)
+            index.insert(txn)
+
+        self._write(lambda txns: save_json(txns + [txn], self.path), apply)
+
+    @retry_on_conflict
+    def add_many(self, transactions):
+        new = [Transaction.from_dict(t) for t in transactions]
+
+        def apply(transactions, index):
+            transactions.extend(new)
+            for txn in new:
+                index.insert(txn)
+
+        self._write(lambda txns: save_json(txns + new, self.path), apply)
+
+    @retry_on_conflict
+    def update_many(self, changes, user_id=None):
+        def write(transactions):
+            updated = [dict(t, **changes[t.transaction_id]) if t.transaction_id in changes
+                       else t for t in transactions]
+            save_json(updated, self.path)
+
+        return self._update_many(changes, write)
+
+    @retry_on_conflict
+    def delete_many(self, transaction_ids, user_id=None):
+        doomed = set(transaction_ids)
+        return self._delete_many(doomed, lambda txns: save_json(
+            [t for t in txns if t.transaction_id not in doomed], self.path))
+
+    def replace_all(self, transactions):
+        transactions = [Transaction.from_dict(t) for t in transactions]
+        with file_locks(self.files):
+            save_json(transactions, self.path)
+            self._remember(transactions, None)
+
+
+class JsonlRepository(FileRepository):
+    """Snapshot + append-only JSONL log storage (see transaction_log.py)."""
+
+    def __init__(self, snapshot_path=None, log_path=None):
+        self.snapshot_path = snapshot_path or config.TRANSACTIONS_FILE
+        self.log_path = log_path or config.TRANSACTIONS_LOG_FILE
+        self.files = [self.snapshot_path, self.log_path]
+        self.paths = watched(self.files)
+        self.cache_key = f"jsonl:{self.snapshot_path}"
+
+    def _load(self):
+        return [Transaction.from_dict(t)
+                for t in transaction_log.load_transactions(self.snapshot_path, self.log_path)]
+
+    def iter_all(self):
+        cached = cache.peek(self.cache_key, self.paths)
+        if cached is not None:
+            return iter(cached)
+        if os.path.exists(self.log_path) and os.path.getsize(self.log_path):
+            return iter(self.all())  # the log has to be replayed over the whole snapshot
+        return (Transaction.from_dict(t) for t in iter_json_array(self.snapshot_path))
+
+    def _write(self, write, apply, base=None):
+        with file_locks(self.files):
+            super()._write(write, apply, base)
+            transactions, index, positions = self.all(), self.index(), self.positions()
+            if transaction_log.maybe_compact(self.snapshot_path, self.log_path):
+                self._remember(transactions, index, positions)
+
+    @retry_on_conflict
+    def add(self, txn):
+        txn = Transaction.from_dict(txn)
+
+        def apply(transactions, index):
+            transactions.append(txn)
+            index.insert(txn)
+
+        # Append a single record instead of rewriting the whole history
+        self._write(lambda txns: transaction_log.log_add(txn, self.log_path), apply)
+
+    @retry_on_conflict
+    def add_many(self, transactions):
+        new = [Transaction.from_dict(t) for t in transactions]
+
+        def apply(transactions, index):
+            transactions.extend(new)
+            for txn in new:
+                index.insert(txn)
+
+        records = [{"op": "add", "txn": txn} for txn in new]
+        self._write(lambda txns: transaction_log.append_records(records, self.log_path), apply)
+
+    @retry_on_conflict
+    def update_many(self, changes, user_id=None):
+        def write(transactions):
+            positions = self.positions()
+            transaction_log.append_records([{"op": "patch", "id": tid, "changes": c}
+                                            for tid, c in changes.items() if tid in positions],
+                                           self.log_path)
+
+        return self._update_many(changes, write)
+
+    @retry_on_conflict
+    def delete_many(self, transaction_ids, user_id=None):
+        def write(transactions):
+            positions = self.positions()
+            transaction_log.append_records([{"op": "delete", "id": tid}
+                                            for tid in dict.fromkeys(transaction_ids)
+                                            if tid in positions], self.log_path)
+
+        return self._delete_many(transaction_ids, write)
+
+    def replace_all(self, transactions):
+        transactions = [Transaction.from_dict(t) for t in transactions]
+        with file_locks(self.files):
+            transaction_log.save_snapshot(transactions, self.snapshot_path, self.log_path)
+            self._remember(transactions, None)
+
+
+def sharded_user_ids():
+    """Return the IDs of the users that have a folder in the sharded layout."""
+    if not os.path.isdir(config.USERS_DIR):
+        return []
+    return sorted(name for name in os.listdir(config.USERS_DIR)
+                  if os.path.isdir(os.path.join(config.USERS_DIR, name)))
+
+
+class ShardedRepository(TransactionRepository):
+    """
+    One JSON/JSONL repository per user under data/users/<user_id>/
+    (DATA_LAYOUT = "sharded"). Per-user reads and writes only touch that
+    user's files; whole-collection calls, and lookups by ID without a
+    user_id, visit every shard.
+    """
+
+    def __init__(self, backend="json"):
+        self.shard_backend = backend
+        self._shards = {}
+
+    def shard(self, user_id):
+        """Return the repository holding one user's transactions (created empty if new)."""
+        repo = self._shards.get(user_id)
+        if repo is None:
+            snapshot = config.user_data_file(user_id, "transactions")
+            if not os.path.exists(snapshot):
+                save_json([], snapshot)
+            if self.shard_backend == "jsonl":
+                repo = JsonlRepository(snapshot, config.user_data_file(user_id, "transactions_log"))
+            else:
+                repo = JsonRepository(snapshot)
+            self._shards[user_id] = repo
+        return repo
+
+    def _shards_with_data(self):
+        return [self.shard(user_id) for user_id in sharded_user_ids()
+                if os.path.exists(config.user_shard_file(user_id, "transactions"))]
+
+    def all(self):
+        return [txn for repo in self._shards_with_data() for txn in repo.all()]
+
+    def iter_all(self):
+        return (txn for repo in self._shards_with_data() for txn in repo.iter_all())
+
+    def for_user(self, user_id, *args, **kwargs):
+        return self.shard(user_id).for_user(user_id, *args, **kwargs)
+
+    def page(self, user_id, after=None, limit=50):
+        return self.shard(user_id).page(user_id, after, limit)
+
+    def _shards_for(self, user_id):
+        """The shards that can hold `user_id`'s rows: only that user's, or all if unknown."""
+        if user_id is None:
+            return self._shards_with_data()
+        if not os.path.exists(config.user_shard_file(user_id, "transactions")):
+            return []
+        return [self.shard(user_id)]
+
+    def get(self, transaction_id, user_id=None):
+        for repo in self._shards_for(user_id):
+            txn = repo.get(transaction_id)
+            if txn is not None:
+                return txn
+        return None
+
+    def add(self, txn):
+        self.shard(txn["user_id"]).add(txn)
+
+    def add_many(self, transactions):
+        by_user = {}
+        for txn in transactions:
+            by_user.setdefault(txn["user_id"], []).append(txn)
+        for user_id, rows in by_user.items():
+            self.shard(user_id).add_many(rows)
+
+    def update(self, transaction_id, changes, user_id=None):
+        return self.update_many({transaction_id: changes}, user_id) > 0
+
+    def update_many(self, changes, user_id=None):
+        updated = 0
+        for repo in self._shards_for(user_id):
+            positions = repo.positions()
+            mine = {tid: c for tid, c in changes.items() if tid in positions}
+            if mine:
+                updated += repo.update_many(mine)
+        return updated
+
+    def delete(self, transaction_id, user_id=None):
+        return self.delete_many([transaction_id], user_id) > 0
+
+    def delete_many(self, transaction_ids, user_id=None):
+        deleted = 0
+        for repo in self._shards_for(user_id):
+            positions = repo.positions()
+            mine = [tid for tid in transaction_ids if tid in positions]
+            if mine:
+                deleted += repo.delete_many(mine)
+        return deleted
+
+    def replace_all(self, transactions):
+        by_user = {user_id: [] for user_id in sharded_user_ids()}
+        for txn in transactions:
+            by_user.setdefault(txn["user_id"], []).append(txn)
+        for user_id, rows in by_user.items():
+            self.shard(user_id).replace_all(rows)
+
+
+_repository = None
+
+
+def get_repository():
+    """Return the process-wide repository for the configured backend and layout."""
+    global _repository
+    backend = config.TRANSACTION_STORAGE
+    sharded = config.DATA_LAYOUT == "sharded" and backend in ("json", "jsonl")
+
+    if (_repository is None or _repository.backend != backend
+            or isinstance(_repository, ShardedRepository) != sharded):
+        if backend not in ("json", "jsonl", "sqlite"):
+            raise ValueError(f"Unknown TRANSACTION_STORAGE '{backend}'.")
+        if sharded:
+            _repository = ShardedRepository(backend)
+        elif backend == "sqlite":
+            from persistence.sqlite_repository import SqliteRepository
+            _repository = SqliteRepository()
+        elif backend == "jsonl":
+            _repository = JsonlRepository()
+        else:
+            _repository = JsonRepository()
+        _repository.backend = backend
+
+    return _repository
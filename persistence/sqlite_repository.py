@@ -0,0 +1,191 @@
+"""
+sqlite_repository.py
+sqlite3 storage backend for transactions.
+
+Rows are indexed on (user_id, date), (user_id, category) and
+transaction_id, so per-user queries only touch the rows they return.
+Dates are stored zero-padded ('2024-01-05', never '2024-1-5') so the
+date range filters can compare them as strings.
+"""
+
+import sqlite3
+from datetime import date
+from persistence.repository import TransactionRepository
+from transactions.models import Transaction
+from utils.date_utils import normalize_date
+from utils.errors import DataPersistenceError
+import config
+
+COLUMNS = ("transaction_id", "user_id", "type", "amount", "category",
+           "date", "description", "payment_method")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    transaction_id TEXT NOT NULL UNIQUE,
+    user_id        TEXT NOT NULL,
+    type           TEXT NOT NULL,
+    amount         REAL NOT NULL,
+    category       TEXT NOT NULL COLLATE NOCASE,
+    date           TEXT NOT NULL,
+    description    TEXT,
+    payment_method TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_txn_user_date ON transactions (user_id, date);
+CREATE INDEX IF NOT EXISTS idx_txn_user_category ON transactions (user_id, category);
+"""
+# transaction_id is indexed by its UNIQUE constraint.
+
+# Dates that are not already in 'YYYY-MM-DD' form
+UNPADDED_DATES_SQL = ("SELECT transaction_id, date FROM transactions "
+                      "WHERE date NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'")
+
+INSERT_SQL = (f"INSERT OR REPLACE INTO transactions ({', '.join(COLUMNS)}) "
+              f"VALUES ({', '.join('?' for _ in COLUMNS)})")
+
+
+def _row(txn):
+    """Convert a transaction dict into a tuple in COLUMNS order (date normalized)."""
+    return tuple(normalize_date(txn.get(c)) if c == "date" else txn.get(c) for c in COLUMNS)
+
+
+class SqliteRepository(TransactionRepository):
+    """Indexed sqlite3 storage."""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or config.SQLITE_FILE
+        try:
+            self.conn = sqlite3.connect(self.db_path)
+            # NOCASE only folds ASCII; match categories like match_filters() does
+            self.conn.create_function("casefold", 1, lambda v: v.casefold() if v else v,
+                                      deterministic=True)
+            self.conn.executescript(SCHEMA)
+            self._normalize_dates()
+        except sqlite3.Error as e:
+            raise DataPersistenceError(f"Error opening database {self.db_path}: {e}")
+
+    def _normalize_dates(self):
+        """Rewrite dates stored unpadded by earlier versions ('2024-1-5')."""
+        rows = [(normalize_date(date), tid)
+                for tid, date in self.conn.execute(UNPADDED_DATES_SQL)]
+        if rows:
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE transactions SET date = ? WHERE transaction_id = ?", rows)
+
+    def _query(self, sql, params=()):
+        try:
+            return [Transaction(*row) for row in self.conn.execute(sql, params)]
+        except sqlite3.Error as e:
+            raise DataPersistenceError(f"Database query failed: {e}")
+
+    def _write(self, sql, rows):
+        try:
+            with self.conn:
+                return self.conn.executemany(sql, rows).rowcount
+        except sqlite3.Error as e:
+            raise DataPersistenceError(f"Database write failed: {e}")
+
+    def all(self):
+        return self._query(f"SELECT {', '.join(COLUMNS)} FROM transactions ORDER BY rowid")
+
+    def iter_all(self):
+        try:
+            cursor = self.conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM transactions ORDER BY rowid")
+        except sqlite3.Error as e:
+            raise DataPersistenceError(f"Database query failed: {e}")
+        return (Transaction(*row) for row in cursor)
+
+    def for_user(self, user_id, start_date=None, end_date=None, category=None, type=None,
+                 min_amount=None, max_amount=None):
+        clauses, params = ["user_id = ?"], [user_id]
+        if start_date:
+            clauses.append("date >= ?")
+            params.append(normalize_date(start_date))
+        if end_date:
+            clauses.append("date <= ?")
+            params.append(normalize_date(end_date))
+        if category:
+            clauses.append("casefold(category) = ?")
+            params.append(category.casefold())
+        if type:
+            clauses.append("casefold(type) = ?")
+            params.append(type.casefold())
+        if min_amount is not None:
+            clauses.append("amount >= ?")
+            params.append(min_amount)
+        if max_amount is not None:
+            clauses.append("amount <= ?")
+            params.append(max_amount)
+
+        sql = (f"SELECT {', '.join(COLUMNS)} FROM transactions "
+               f"WHERE {' AND '.join(clauses)} ORDER BY date, rowid")
+        return self._query(sql, params)
+
+    def page(self, user_id, after=None, limit=50):
+        if after:
+            where = "user_id = ? AND (date > ? OR (date = ? AND transaction_id > ?))"
+            day = date.fromordinal(after[0]).isoformat()
+            params = [user_id, day, day, after[1]]
+        else:
+            where, params = "user_id = ?", [user_id]
+        sql = (f"SELECT {', '.join(COLUMNS)} FROM transactions WHERE {where} "
+               f"ORDER BY date, transaction_id LIMIT ?")
+        return self._query(sql, params + [limit])
+
+    def get(self, transaction_id, user_id=None):
+        rows = self._query(
+            f"SELECT {', '.join(COLUMNS)} FROM transactions WHERE transaction_id = ?",
+            (transaction_id,))
+        return rows[0] if rows else None
+
+    def add(self, txn):
+        self.add_many([txn])
+
+    def add_many(self, transactions):
+        """Insert (or replace) several transactions in one SQL transaction."""
+        self._write(INSERT_SQL, [_row(t) for t in transactions])
+
+    def update(self, transaction_id, changes, user_id=None):
+        return self.update_many({transaction_id: changes}) > 0
+
+    def update_many(self, changes, user_id=None):
+        """Apply {transaction_id: changes} in one SQL transaction."""
+        # One executemany per distinct set of changed columns
+        statements = {}
+        for transaction_id, row_changes in changes.items():
+            fields = tuple(k for k in row_changes if k in COLUMNS and k != "transaction_id")
+            params = [normalize_date(row_changes[k]) if k == "date" else row_changes[k]
+                      for k in fields] + [transaction_id]
+            statements.setdefault(fields, []).append(params)
+
+        updated = 0
+        try:
+            with self.conn:
+                for fields, rows in statements.items():
+                    if fields:
+                        assignments = ", ".join(f"{k} = ?" for k in fields)
+                        sql = f"UPDATE transactions SET {assignments} WHERE transaction_id = ?"
+                    else:
+                        # Nothing to change: still report whether the rows exist
+                        sql = "UPDATE transactions SET rowid = rowid WHERE transaction_id = ?"
+                    updated += self.conn.executemany(sql, rows).rowcount
+        except sqlite3.Error as e:
+            raise DataPersistenceError(f"Database write failed: {e}")
+        return updated
+
+    def delete(self, transaction_id, user_id=None):
+        return self.delete_many([transaction_id]) > 0
+
+    def delete_many(self, transaction_ids, user_id=None):
+        """Delete several transactions in one SQL transaction."""
+        return self._write("DELETE FROM transactions WHERE transaction_id = ?",
+                           [(tid,) for tid in dict.fromkeys(transaction_ids)])
+
+    def replace_all(self, transactions):
+        try:
+            with self.conn:
+                self.conn.execute("DELETE FROM transactions")
+                self.conn.executemany(INSERT_SQL, [_row(t) for t in transactions])
+        except sqlite3.Error as e:
+            raise DataPersistenceError(f"Database write failed: {e}")
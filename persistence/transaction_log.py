@@ -0,0 +1,145 @@
+"""
+transaction_log.py
+Append-only JSONL storage for transactions.
+
+The snapshot file (transactions.json) holds the last compacted list of
+transactions. Every change made since then is appended to the log file
+(transactions.jsonl) as a single JSON record:
+
+    {"op": "add",    "txn": {...}}
+    {"op": "patch",  "id": "<transaction_id>", "changes": {...}}
+    {"op": "delete", "id": "<transaction_id>"}
+
+Replaying the log over the snapshot is idempotent, so a crash between
+writing a new snapshot and truncating the log never corrupts the data.
+Appends and compaction hold the files' locks (see locking.py), so another
+process never appends to a log that is being folded away. The snapshot
+write and log removal of a compaction commit together through the
+write-ahead log (see wal.py).
+"""
+
+import json
+import os
+from persistence.load_save_json import (load_json, save_json, append_text, remove_file,
+                                        pending_ops, atomic, _to_json)
+from persistence.locking import file_locks
+from config import TRANSACTIONS_FILE, TRANSACTIONS_LOG_FILE, LOG_COMPACT_BYTES
+
+
+def append_records(records, log_path=TRANSACTIONS_LOG_FILE):
+    """
+    Append one or more log records to the JSONL log.
+
+    Args:
+        records (list): Log records (dicts) to append.
+        log_path (str): Path of the JSONL log file.
+
+    Raises:
+        DataPersistenceError: If the log cannot be written.
+    """
+    lines = "".join(json.dumps(r, separators=(",", ":"), default=_to_json) + "\n"
+                    for r in records)
+    append_text(lines, log_path)
+
+
+def log_add(txn, log_path=TRANSACTIONS_LOG_FILE):
+    """Record a newly added transaction."""
+    append_records([{"op": "add", "txn": txn}], log_path)
+
+
+def log_patch(transaction_id, changes, log_path=TRANSACTIONS_LOG_FILE):
+    """Record an edit of an existing transaction."""
+    append_records([{"op": "patch", "id": transaction_id, "changes": changes}], log_path)
+
+
+def log_delete(transaction_id, log_path=TRANSACTIONS_LOG_FILE):
+    """Record a deleted transaction (tombstone)."""
+    append_records([{"op": "delete", "id": transaction_id}], log_path)
+
+
+def replay_log(transactions, log_path=TRANSACTIONS_LOG_FILE):
+    """
+    Apply the records of the log on top of a snapshot list.
+
+    A truncated last line (crash during append) is ignored. Appends still
+    deferred by group_commit()/atomic() are included.
+
+    Args:
+        transactions (list): Snapshot transactions.
+        log_path (str): Path of the JSONL log file.
+
+    Returns:
+        list: The transactions with every logged change applied.
+    """
+    pending = pending_ops(log_path)
+    removed = bool(pending) and pending[0][0] == "remove"
+    if not pending and not os.path.exists(log_path):
+        return transactions
+
+    by_id = {t["transaction_id"]: t for t in transactions}
+
+    def apply(lines):
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # partial write, skip it
+
+            op = record.get("op")
+            if op == "add":
+                txn = record["txn"]
+                by_id[txn["transaction_id"]] = txn
+            elif op == "patch" and record["id"] in by_id:
+                by_id[record["id"]].update(record["changes"])
+            elif op == "delete":
+                by_id.pop(record["id"], None)
+
+    if not removed and os.path.exists(log_path):
+        try:
+            with open(log_path, "r", encoding="utf-8") as f:
+                apply(f)
+        except OSError as e:
+            raise ValueError(f"Error reading log {log_path}: {e}")
+    for kind, text in pending:
+        if kind == "append":
+            apply(text.splitlines())
+
+    return list(by_id.values())
+
+
+def load_transactions(snapshot_path=TRANSACTIONS_FILE, log_path=TRANSACTIONS_LOG_FILE):
+    """Load the snapshot and replay the log over it."""
+    with file_locks([snapshot_path, log_path], shared=True):
+        return replay_log(load_json(snapshot_path), log_path)
+
+
+def save_snapshot(transactions, snapshot_path=TRANSACTIONS_FILE, log_path=TRANSACTIONS_LOG_FILE):
+    """
+    Write a full snapshot and drop the log records it already contains.
+    """
+    # One WAL unit: the log never goes away without the snapshot replacing it
+    with file_locks([snapshot_path, log_path]), atomic():
+        save_json(transactions, snapshot_path)
+        remove_file(log_path)
+
+
+def compact(snapshot_path=TRANSACTIONS_FILE, log_path=TRANSACTIONS_LOG_FILE):
+    """
+    Fold the log back into the snapshot.
+
+    Returns:
+        int: Number of transactions in the new snapshot.
+    """
+    with file_locks([snapshot_path, log_path]):
+        transactions = load_transactions(snapshot_path, log_path)
+        save_snapshot(transactions, snapshot_path, log_path)
+    return len(transactions)
+
+
+def maybe_compact(snapshot_path=TRANSACTIONS_FILE, log_path=TRANSACTIONS_LOG_FILE,
+                  max_bytes=LOG_COMPACT_BYTES):
+    """Compact the log once it grows past `max_bytes`. Returns True if compacted."""
+    if os.path.exists(log_path) and os.path.getsize(log_path) > max_bytes:
+        compact(snapshot_path, log_path)
+        return True
+    return False
@@ -0,0 +1,384 @@
+"""
+wal.py
+Write-ahead log for the changes that must span several data files.
+
+A commit of load_save_json.py that changes one file (a save_json, an
+appended log record, a removal) needs no log: the file is replaced through
+a fsynced temp file, or appended to and fsynced, which is all-or-nothing
+on its own. A commit that changes several files (an atomic() block, or a
+group_commit() flush touching more than one file) is first written to a
+log as one unit:
+
+    {"boot":"<boot id>","ops":[["<path>","write",<size>,0],["<path>","append",<size>,<offset>],...]}
+    <the payload bytes of every op, back to back>
+    {"commit":<crc32 of the payloads>}
+    {"applied":true}
+
+The unit is fsynced with a single sequential append before any file is
+touched; the files themselves are then changed without an fsync each, and
+the "applied" marker is added once they all were. Every op is idempotent
+(full-file writes, appends at a recorded offset, removals), so replay()
+can redo a unit any number of times:
+
+  - a unit without a valid commit line was never committed and is
+    ignored, so none of its files change;
+  - a unit without its marker (the writer died while applying it), or one
+    from before a reboot (its files may not have reached the disk), is
+    replayed together with every unit logged after it.
+
+Units whose files all live in one user's folder (the sharded layout, see
+config.DATA_LAYOUT) go to that folder's own wal.log, so users do not wait
+on each other's commits; every other unit goes to data/wal.log.
+
+Replay must never undo a newer change. So before a file is written
+directly, or logged to one log, every other log that may name it is
+checkpointed first: a file's logged changes always sit in a single log,
+older than any direct write, and the order logs are replayed in does not
+matter.
+
+A checkpoint (after WAL_CHECKPOINT_BYTES of log, and at startup) replays
+what needs it, fsyncs every file the log names and empties the log. A
+log's lock is always taken after the files' locks.
+"""
+
+import json
+import os
+import tempfile
+import zlib
+from persistence import cache
+from persistence.locking import file_lock, bump_version
+from utils.errors import DataPersistenceError
+from config import WAL_FILE, WAL_CHECKPOINT_BYTES, USERS_DIR
+
+_APPLIED = b'{"applied":true}\n'
+_UNIT_START = b'\n{"boot":'
+
+stats = {"units": 0, "replayed": 0, "checkpoints": 0}
+
+
+def _boot_id():
+    """Identify the current boot, to tell whether the page cache survived."""
+    try:
+        with open("/proc/sys/kernel/random/boot_id", "r") as f:
+            return f.read().strip()
+    except OSError:
+        return ""  # unknown: only the applied markers are used
+
+
+_BOOT = _boot_id()
+
+
+def _line_end(path):
+    """
+    Return the size of `path` without a torn last line (a crash during an
+    append), so the next append starts on a line of its own.
+    """
+    try:
+        with open(path, "rb") as f:
+            pos = f.seek(0, os.SEEK_END)
+            while pos > 0:
+                step = min(pos, 1 << 16)
+                pos -= step
+                f.seek(pos)
+                newline = f.read(step).rfind(b"\n")
+                if newline >= 0:
+                    return pos + newline + 1
+            return 0
+    except OSError:
+        return 0
+
+
+def _replace(data, path, sync=False):
+    """
+    Atomically replace `path` with `data`. Without `sync` the data is not
+    fsynced (the WAL holds it).
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _apply(path, kind, payload, offset, sync=False):
+    if kind == "write":
+        _replace(payload, path, sync)
+    elif kind == "append":
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            # Cut anything past the recorded offset so a replay never appends twice
+            size = os.fstat(fd).st_size
+            if size > offset:
+                os.ftruncate(fd, offset)
+            os.lseek(fd, min(size, offset), os.SEEK_SET)
+            os.write(fd, payload)
+        finally:
+            os.close(fd)
+    elif kind == "remove":
+        if os.path.exists(path):
+            os.remove(path)
+    else:
+        raise DataPersistenceError(f"Unknown WAL operation '{kind}' for {path}.")
+
+
+def _touched(path):
+    """Make readers of `path` see the change (new version stamp, stale cache)."""
+    try:
+        version = bump_version(path)
+    except OSError:
+        version = None  # no lock file yet: nobody has a version of it to compare
+    cache.note_write(path)
+    return version
+
+
+def _fsync(paths):
+    """Fsync the files in `paths` that exist and their directories."""
+    directories = dict.fromkeys(os.path.dirname(os.path.abspath(p)) for p in paths)
+    for path in [p for p in paths if os.path.isfile(p)] + list(directories):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            continue
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass  # directories cannot be fsynced on every platform
+        finally:
+            os.close(fd)
+
+
+def log_for(paths):
+    """Return the log for a unit changing `paths` (see the module docstring)."""
+    users = os.path.abspath(USERS_DIR)
+    owners = set()
+    for path in paths:
+        relative = os.path.relpath(os.path.abspath(path), users)
+        parts = relative.split(os.sep)
+        if relative.startswith(os.pardir) or len(parts) < 2:
+            return str(WAL_FILE)
+        owners.add(parts[0])
+    if len(owners) != 1:
+        return str(WAL_FILE)
+    return os.path.join(users, owners.pop(), os.path.basename(WAL_FILE))
+
+
+def _settle(paths, keep=None):
+    """
+    Checkpoint the non-empty logs (other than `keep`) that may name `paths`:
+    data/wal.log and the logs of their owners. Call with the files' locks held.
+    """
+    logs = {str(WAL_FILE)} | {log_for([path]) for path in paths}
+    for log in sorted(logs - {keep}):
+        if os.path.exists(log) and os.path.getsize(log):
+            with file_lock(log):
+                _checkpoint(log)
+
+
+def _logs():
+    """Return every log that may hold units: data/wal.log and the users' own."""
+    logs = [str(WAL_FILE)]
+    if os.path.isdir(USERS_DIR):
+        for name in sorted(os.listdir(USERS_DIR)):
+            log = os.path.join(USERS_DIR, name, os.path.basename(WAL_FILE))
+            if os.path.isfile(log):
+                logs.append(log)
+    return logs
+
+
+def commit(ops):
+    """
+    Apply `ops` all-or-nothing: directly when they change a single file,
+    otherwise through the log as one unit. Call with the exclusive lock of
+    every file involved held.
+
+    Args:
+        ops (list): (path, kind, payload) tuples, applied in order. `kind` is
+            "write" (replace the file with the payload bytes), "append"
+            (lines; a torn last line of the file is cut off first) or
+            "remove" (payload ignored).
+
+    Returns:
+        dict: path -> its new version stamp.
+
+    Raises:
+        DataPersistenceError: If the unit cannot be logged (nothing changed)
+            or applied (it is redone by the next checkpoint or startup).
+    """
+    entries, payloads, sizes = [], [], {}
+    for path, kind, payload in ops:
+        path, payload = str(path), payload or b""
+        offset = 0
+        if kind == "append":
+            offset = sizes[path] if path in sizes else _line_end(path)
+            sizes[path] = offset + len(payload)
+        else:
+            sizes[path] = len(payload)  # a removed file starts again from 0
+        entries.append([path, kind, len(payload), offset])
+        payloads.append(payload)
+
+    if len(sizes) == 1:
+        _settle(sizes)
+        return _commit_file(entries, payloads)
+
+    body = b"".join(payloads)
+    unit = b"".join([
+        b"\n", json.dumps({"boot": _BOOT, "ops": entries}, separators=(",", ":")).encode(),
+        b"\n", body, b'\n{"commit":%d}\n' % zlib.crc32(body),
+    ])
+
+    log = log_for(sizes)
+    _settle(sizes, keep=log)
+    versions = {}
+    with file_lock(log):
+        try:
+            with open(log, "ab") as f:
+                f.write(unit)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            raise DataPersistenceError(f"Error writing the write-ahead log {log}: {e}")
+
+        try:
+            for (path, kind, _, offset), payload in zip(entries, payloads):
+                _apply(path, kind, payload, offset)
+        except OSError as e:
+            raise DataPersistenceError(f"Error applying a logged change to {path}: {e}")
+        finally:
+            for path in sizes:
+                versions[path] = _touched(path)
+
+        with open(log, "ab") as f:
+            f.write(_APPLIED)
+            size = f.tell()
+        stats["units"] += 1
+        if size > WAL_CHECKPOINT_BYTES:
+            _checkpoint(log)
+    return versions
+
+
+def _commit_file(entries, payloads):
+    """
+    Apply the ops of a unit that changes a single file without the log:
+    they are folded into one write, append or removal, then fsynced.
+    """
+    path, kind, offset, data = entries[0][0], entries[0][1], entries[0][3], b""
+    for (_, op, _, _), payload in zip(entries, payloads):
+        if op == "append":
+            data += payload
+        else:
+            kind, data = op, payload
+    if kind == "remove" and data:
+        kind = "write"  # removed, then appended to: the appends are the new file
+    try:
+        _apply(path, kind, data, offset, sync=True)
+        _fsync([path])
+    except OSError as e:
+        raise DataPersistenceError(f"Error saving {path}: {e}")
+    finally:
+        version = _touched(path)
+    return {path: version}
+
+
+def _read_units(data):
+    """
+    Parse the log. Returns a list of (boot, ops, applied) for every
+    committed unit; torn or corrupt units are skipped.
+    """
+    units, pos = [], 0
+    while True:
+        start = data.find(_UNIT_START, pos)
+        if start < 0:
+            return units
+        try:
+            end = data.index(b"\n", start + 1)
+            header = json.loads(data[start + 1:end])
+            pos = end + 1
+            ops = []
+            for path, kind, size, offset in header["ops"]:
+                ops.append((path, kind, data[pos:pos + size], offset))
+                pos += size
+            end = data.index(b"\n", pos + 1)
+            commit_line = json.loads(data[pos + 1:end])
+            body = b"".join(op[2] for op in ops)
+            committed = (commit_line.get("commit") == zlib.crc32(body)
+                         and len(body) == sum(entry[2] for entry in header["ops"]))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            committed = False
+        if not committed:
+            pos = start + 1  # torn write: resume at the next unit header
+            continue
+        pos = end + 1
+        applied = data.startswith(_APPLIED, pos)
+        if applied:
+            pos += len(_APPLIED)
+        units.append((header.get("boot"), ops, applied))
+
+
+def _checkpoint(log):
+    """Replay what needs it, fsync the logged files and empty `log` (its lock held)."""
+    try:
+        with open(log, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return 0
+    except OSError as e:
+        raise DataPersistenceError(f"Error reading the write-ahead log {log}: {e}")
+
+    units = _read_units(data)
+    first = next((i for i, (boot, _, applied) in enumerate(units)
+                  if not applied or boot != _BOOT), len(units))
+    try:
+        for _, ops, _ in units[first:]:
+            for path, kind, payload, offset in ops:
+                _apply(path, kind, payload, offset)
+            for path in dict.fromkeys(op[0] for op in ops):
+                _touched(path)
+
+        _fsync(list(dict.fromkeys(op[0] for _, ops, _ in units for op in ops)))
+
+        with open(log, "r+b") as f:
+            f.truncate(0)
+            os.fsync(f.fileno())
+    except OSError as e:
+        raise DataPersistenceError(f"Checkpoint of the write-ahead log {log} failed: {e}")
+
+    stats["replayed"] += len(units) - first
+    stats["checkpoints"] += 1
+    return len(units) - first
+
+
+def checkpoint():
+    """
+    Make every logged change durable in its file and empty the logs.
+
+    Returns:
+        int: Number of units that had to be replayed.
+    """
+    replayed = 0
+    for log in _logs():
+        with file_lock(log):
+            replayed += _checkpoint(log)
+    return replayed
+
+
+def recover():
+    """
+    Redo the changes a crash left half-applied. Call once at startup,
+    before any data file is read.
+
+    Returns:
+        int: Number of units replayed.
+    """
+    if not any(os.path.getsize(log) for log in _logs() if os.path.exists(log)):
+        return 0
+    return checkpoint()
@@ -0,0 +1,218 @@
+"""
+aggregates.py
+Materialized per-user report aggregates.
+
+aggregates.json stores, for every user and month, the total per
+transaction type and the total per (type, category), in integer minor
+units so repeated deltas never drift (in the sharded layout each user
+folder has its own aggregates.json holding just that user):
+
+    {
+        "USR-1a2b3c": {
+            "2024-05": {
+                "totals": {"income": 500000, "expense": 123450},
+                "categories": {"expense": {"Food": 23450, "Rent": 100000}}
+            }
+        }
+    }
+
+add/edit/delete and the recurring processor apply deltas to it, so the
+monthly report, category breakdown and spending trends read O(months)
+data instead of every transaction. The deltas are appended to
+aggregates.jsonl, one net amount per line (see delta_log.py):
+
+    ["USR-1a2b3c", "2024-05", "expense", "Food", 2350]
+
+and folded into aggregates.json once that log grows large, so recording
+a change never rewrites the whole file. verify_aggregates() rebuilds the
+aggregates from scratch (a columnar reduction, see columnar.py) and lists
+any difference with the stored copy.
+"""
+
+import copy
+import os
+from persistence import cache, delta_log
+from persistence.load_save_json import load_json_cached
+from persistence.locking import file_locks, watched
+from persistence.repository import get_repository, sharded_user_ids
+from reports.columnar import TransactionTable, aggregate
+from transactions.models import to_minor
+from utils.date_utils import month_key, format_month_key
+import config
+
+
+def apply_delta(aggregates, txn, sign=1):
+    """
+    Add (sign=1) or subtract (sign=-1) one transaction to an aggregates dict.
+    Totals that drop to zero are removed so rebuilt and incremental
+    aggregates compare equal.
+    """
+    _apply(aggregates, txn["user_id"], format_month_key(month_key(txn["date"])),
+           txn["type"], txn["category"], sign * to_minor(txn["amount"]))
+
+
+def _apply(aggregates, user_id, label, type_, category, amount):
+    """Add `amount` (minor units) to one user/month/type/category total."""
+    month = aggregates.setdefault(user_id, {}).setdefault(
+        label, {"totals": {}, "categories": {}})
+
+    totals = month["totals"]
+    totals[type_] = totals.get(type_, 0) + amount
+    if totals[type_] == 0:
+        del totals[type_]
+
+    categories = month["categories"].setdefault(type_, {})
+    categories[category] = categories.get(category, 0) + amount
+    if categories[category] == 0:
+        del categories[category]
+    if not categories:
+        del month["categories"][type_]
+
+    if not totals and not month["categories"]:
+        del aggregates[user_id][label]
+        if not aggregates[user_id]:
+            del aggregates[user_id]
+
+
+def rebuild_aggregates(transactions):
+    """Compute the aggregates from scratch, in one grouped reduction (see columnar.py)."""
+    return aggregate(TransactionTable(transactions))
+
+
+def _aggregates_file(user_id):
+    """The file holding a user's aggregates (shared by every user in the global layout)."""
+    return config.user_data_file(user_id, "aggregates")
+
+
+def _rebuild_file(user_id):
+    """Rebuild and store the aggregates file that holds `user_id`."""
+    path = _aggregates_file(user_id)
+    with file_locks(delta_log.paths(path)):
+        if config.DATA_LAYOUT == "sharded":
+            transactions = get_repository().for_user(user_id)
+        else:
+            transactions = get_repository().iter_all()
+        aggregates = rebuild_aggregates(transactions)
+        delta_log.compact(path, aggregates)
+    return aggregates
+
+
+def _fold(path):
+    """The stored aggregates with every logged delta applied."""
+    aggregates = copy.deepcopy(load_json_cached(path))
+    for record in delta_log.read(path):
+        _apply(aggregates, *record)
+    return aggregates
+
+
+def load_aggregates(user_id=None):
+    """
+    Load the stored aggregates holding `user_id` (every user in the global
+    layout), building them first if the file is missing. The result is
+    shared: do not mutate it.
+    """
+    path = _aggregates_file(user_id)
+    if not os.path.exists(path):
+        _rebuild_file(user_id)
+    return cache.get(f"aggregates:{path}", watched(delta_log.paths(path)),
+                     lambda: _fold(path))
+
+
+def _net_deltas(deltas):
+    """Sum (sign, txn) pairs into one delta record per user/month/type/category."""
+    net = {}
+    for sign, txn in deltas:
+        key = (txn["user_id"], format_month_key(month_key(txn["date"])),
+               txn["type"], txn["category"])
+        net[key] = net.get(key, 0) + sign * to_minor(txn["amount"])
+    return [[*key, amount] for key, amount in net.items() if amount]
+
+
+def record_changes(added=(), removed=()):
+    """
+    Update the stored aggregates for added and removed transactions.
+    An edit is recorded as removing the old version and adding the new one.
+    """
+    changes = {}  # aggregates file -> (a user it holds, [(sign, txn), ...])
+    for sign, txns in ((-1, removed), (1, added)):
+        for txn in txns:
+            path = str(_aggregates_file(txn["user_id"]))
+            changes.setdefault(path, (txn["user_id"], []))[1].append((sign, txn))
+
+    for path, (user_id, deltas) in changes.items():
+        # Held from the read to the cache update, so no other writer's delta is missed
+        with file_locks(delta_log.paths(path)):
+            if not os.path.exists(path):
+                # A fresh rebuild already reflects the change that was just stored
+                _rebuild_file(user_id)
+                continue
+            aggregates = load_aggregates(user_id)
+            records = _net_deltas(deltas)
+            delta_log.append(path, records)
+            for record in records:
+                _apply(aggregates, *record)
+            cache.put(f"aggregates:{path}", watched(delta_log.paths(path)), aggregates)
+            if delta_log.due(path):
+                delta_log.compact(path, copy.deepcopy(aggregates))
+
+
+def monthly_totals(user_id):
+    """
+    Same result as generate_monthly_report() for the user, read from the
+    aggregates: {"YYYY-MM": {"income": float, "expense": float}}, sorted.
+    """
+    months = load_aggregates(user_id).get(user_id, {})
+    report = {}
+    for label in sorted(months):
+        totals = {"income": 0, "expense": 0}
+        for type_, minor in months[label]["totals"].items():
+            totals[type_] = minor / 100
+        report[label] = totals
+    return report
+
+
+def category_totals(user_id, type_filter="expense"):
+    """Same result as generate_category_breakdown() for the user, from the aggregates."""
+    breakdown = {}
+    for month in load_aggregates(user_id).get(user_id, {}).values():
+        for category, minor in month["categories"].get(type_filter, {}).items():
+            breakdown[category] = breakdown.get(category, 0) + minor
+    return {category: minor / 100 for category, minor in breakdown.items()}
+
+
+def verify_aggregates(transactions=None):
+    """
+    Rebuild the aggregates from the transactions and diff them against the
+    stored copy.
+
+    Returns:
+        list: Human-readable differences (empty when they match).
+    """
+    if transactions is None:
+        transactions = get_repository().iter_all()
+
+    expected = rebuild_aggregates(transactions)
+    if config.DATA_LAYOUT == "sharded":
+        stored = {}
+        for user_id in sorted(set(expected) | set(sharded_user_ids())):
+            stored.update(load_aggregates(user_id))
+    else:
+        stored = load_aggregates()
+
+    differences = []
+    for user_id in sorted(set(expected) | set(stored)):
+        exp_months, got_months = expected.get(user_id, {}), stored.get(user_id, {})
+        for label in sorted(set(exp_months) | set(got_months)):
+            exp, got = exp_months.get(label), got_months.get(label)
+            if exp != got:
+                differences.append(f"{user_id} {label}: expected {exp}, stored {got}")
+    return differences
+
+
+def repair_aggregates():
+    """Overwrite the stored aggregates with a fresh rebuild."""
+    if config.DATA_LAYOUT == "sharded":
+        for user_id in sharded_user_ids():
+            _rebuild_file(user_id)
+    else:
+        _rebuild_file(None)
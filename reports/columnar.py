@@ -0,0 +1,117 @@
+"""
+columnar.py
+Columnar (struct-of-arrays) view of transactions for reporting.
+
+A TransactionTable stores one array per field: amount in minor units,
+month key, type code, category code and user code. aggregate() turns it
+into the per-user report aggregates (see aggregates.py) with one grouped
+reduction over the combined (user, month, type, category) key instead of
+a Python pass that updates nested dicts row by row. Every report (the
+dashboard, monthly report, category breakdown and spending trends, see
+report_engine.py) is read from those aggregates.
+
+NumPy is optional. Without it the same columns are kept as Python lists
+and the reduction falls back to a plain loop. Amounts are integer minor
+units, so both paths give exactly the same totals.
+"""
+
+from transactions.models import to_minor
+from utils.date_utils import month_key, format_month_key
+
+try:
+    import numpy as np
+except ImportError:  # NumPy not installed: use the pure-Python fallback
+    np = None
+
+
+class TransactionTable:
+    """Column arrays built once from an iterable of transactions."""
+
+    def __init__(self, transactions):
+        self.users = []        # user code -> user_id
+        self.types = []        # type code -> type
+        self.categories = []   # category code -> name
+        codes = ({}, {}, {})
+
+        amounts, months, users, types, categories = [], [], [], [], []
+        for t in transactions:
+            amounts.append(t.amount_minor if hasattr(t, "amount_minor") else to_minor(t["amount"]))
+            months.append(t.month if hasattr(t, "month") else month_key(t["date"]))
+            users.append(_code(codes[0], self.users, t["user_id"]))
+            types.append(_code(codes[1], self.types, t["type"]))
+            categories.append(_code(codes[2], self.categories, t["category"]))
+
+        if np is not None:
+            self.amount = np.array(amounts, dtype=np.int64)
+            self.month = np.array(months, dtype=np.int64)
+            self.user = np.array(users, dtype=np.int64)
+            self.type = np.array(types, dtype=np.int64)
+            self.category = np.array(categories, dtype=np.int64)
+        else:
+            self.amount, self.month, self.user = amounts, months, users
+            self.type, self.category = types, categories
+
+    def __len__(self):
+        return len(self.amount)
+
+
+def _code(codes, names, value):
+    """Return the integer code of `value`, assigning a new one if needed."""
+    code = codes.get(value)
+    if code is None:
+        code = codes[value] = len(names)
+        names.append(value)
+    return code
+
+
+def _group_sums(table):
+    """
+    Sum the amounts per (user, month, type, category).
+
+    Returns:
+        list: ((user code, month key, type code, category code), minor units) pairs.
+    """
+    if np is not None:
+        if not len(table):
+            return []
+        months, month_index = np.unique(table.month, return_inverse=True)
+        # One integer key per group: user, month, type and category codes mixed radix
+        keys = ((table.user * len(months) + month_index.ravel()) * max(len(table.types), 1)
+                + table.type) * max(len(table.categories), 1) + table.category
+        uniques, inverse = np.unique(keys, return_inverse=True)
+        totals = np.bincount(inverse.ravel(), weights=table.amount, minlength=len(uniques))
+
+        rest, category = np.divmod(uniques, max(len(table.categories), 1))
+        rest, type_ = np.divmod(rest, max(len(table.types), 1))
+        user, month = np.divmod(rest, len(months))
+        return list(zip(zip(user.tolist(), months[month].tolist(), type_.tolist(),
+                            category.tolist()),
+                        totals.round().astype(np.int64).tolist()))
+
+    groups = {}
+    for key in zip(table.user, table.month, table.type, table.category, table.amount):
+        groups[key[:4]] = groups.get(key[:4], 0) + key[4]
+    return list(groups.items())
+
+
+def aggregate(table):
+    """
+    Return the report aggregates of every user in `table`, equal to
+    aggregates.rebuild_aggregates() applied row by row.
+    """
+    aggregates = {}
+    for (user, month, type_, category), amount in _group_sums(table):
+        if not amount:
+            continue  # totals that net to zero are left out
+        type_, category = table.types[type_], table.categories[category]
+        entry = aggregates.setdefault(table.users[user], {}).setdefault(
+            format_month_key(month), {"totals": {}, "categories": {}})
+        entry["totals"][type_] = entry["totals"].get(type_, 0) + amount
+        entry["categories"].setdefault(type_, {})[category] = amount
+
+    # A type whose categories cancel out has no total either
+    for months in aggregates.values():
+        for entry in months.values():
+            for type_ in [t for t, total in entry["totals"].items() if not total]:
+                del entry["totals"][type_]
+    return aggregates
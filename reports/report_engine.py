@@ -0,0 +1,87 @@
+"""
+report_engine.py
+Report engine for the Reports menu.
+
+build_report() reads a user's stored aggregates (see aggregates.py) once
+and produces everything the Reports menu shows: the dashboard summary,
+the month x type matrix, the per-type category breakdown, the top
+categories and the spending trends. It costs O(months x categories), not
+a scan of the transactions. Results match the individual generate_*
+functions in reports_manager.py.
+"""
+
+from datetime import datetime
+from reports.aggregates import load_aggregates
+from reports.reports_manager import spending_trends_from_monthly
+from reports.top_k import top_totals
+from utils.date_utils import current_month_key, format_month_key
+
+
+def build_report(user_id, top_k=3):
+    """
+    Compute every report for one user from the stored aggregates.
+
+    Args:
+        user_id (str): Owner of the transactions.
+        top_k (int): Number of top spending categories to keep.
+
+    Returns:
+        dict: {
+            "has_data": whether the user has any transactions,
+            "dashboard": same as generate_dashboard_summary(),
+            "monthly": same as generate_monthly_report(), oldest month first,
+            "categories": {type: same as generate_category_breakdown(type)},
+            "top_categories": [(category, amount), ...] over all months,
+            "trends": same as generate_spending_trends(),
+        }
+    """
+    months = load_aggregates(user_id).get(user_id, {})
+
+    overall = {"income": 0, "expense": 0}
+    monthly = {}
+    categories = {}  # type -> category -> minor units
+    for label in sorted(months):
+        totals = {"income": 0, "expense": 0}
+        for type_, minor in months[label]["totals"].items():
+            totals[type_] = minor / 100
+            overall[type_] = overall.get(type_, 0) + minor
+        monthly[label] = totals
+        for type_, by_category in months[label]["categories"].items():
+            type_totals = categories.setdefault(type_, {})
+            for category, minor in by_category.items():
+                type_totals[category] = type_totals.get(category, 0) + minor
+    categories = {type_: {category: minor / 100 for category, minor in totals.items()}
+                  for type_, totals in categories.items()}
+
+    current_month = format_month_key(current_month_key())
+    this_month = monthly.get(current_month, {"income": 0, "expense": 0})
+    total_income, total_expenses = this_month["income"], this_month["expense"]
+    this_month_categories = {
+        category: minor / 100 for category, minor
+        in months.get(current_month, {}).get("categories", {}).get("expense", {}).items()
+    }
+
+    dashboard = {
+        "period": datetime.today().strftime("%B %Y"),
+        "total_income": total_income,
+        "total_expenses": total_expenses,
+        "net_savings": total_income - total_expenses,
+        "current_balance": (overall["income"] - overall["expense"]) / 100,
+        "top_categories": [
+            {
+                "category": cat,
+                "amount": amt,
+                "percent": round((amt / total_expenses * 100), 1) if total_expenses > 0 else 0
+            }
+            for cat, amt in top_totals(this_month_categories, 3)
+        ]
+    }
+
+    return {
+        "has_data": bool(monthly),
+        "dashboard": dashboard,
+        "monthly": monthly,
+        "categories": categories,
+        "top_categories": top_totals(categories.get("expense", {}), top_k),
+        "trends": spending_trends_from_monthly(monthly),
+    }
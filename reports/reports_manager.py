@@ -3,36 +3,36 @@ from collections import defaultdict
 from persistence.load_save_json import load_json
 from config import TRANSACTIONS_FILE
 from datetime import datetime 
+from utils.date_utils import month_key, current_month_key, format_month_key
+from reports.top_k import top_totals
 
 def generate_dashboard_summary(transactions):
     """Generate a dashboard summary for the current month and overall balance."""
     today = datetime.today()
-    current_month = today.strftime("%Y-%m")
+    current_month = current_month_key()
 
-    # --- Monthly filtering ---
-    monthly_txns = [
-        t for t in transactions
-        if datetime.strptime(t["date"], "%Y-%m-%d").strftime("%Y-%m") == current_month
-    ]
+    # --- One pass, so any iterable of transactions works (e.g. a file stream) ---
+    total_income = total_expenses = 0      # current month
+    overall_income = overall_expenses = 0  # all transactions
+    category_totals = defaultdict(float)   # current month's expenses per category
+    for t in transactions:
+        t_type, amount = t["type"], t["amount"]
+        in_month = month_key(t["date"]) == current_month
+        if t_type == "income":
+            overall_income += amount
+            if in_month:
+                total_income += amount
+        elif t_type == "expense":
+            overall_expenses += amount
+            if in_month:
+                total_expenses += amount
+                category_totals[t["category"]] += amount
 
-    # --- Monthly totals ---
-    total_income = sum(t["amount"] for t in monthly_txns if t["type"] == "income")
-    total_expenses = sum(t["amount"] for t in monthly_txns if t["type"] == "expense")
     net_savings = total_income - total_expenses
-
-    # --- Overall current balance (across all transactions) ---
-    overall_income = sum(t["amount"] for t in transactions if t["type"] == "income")
-    overall_expenses = sum(t["amount"] for t in transactions if t["type"] == "expense")
     current_balance = overall_income - overall_expenses
 
-    # --- Top spending categories for the month ---
-    category_totals = defaultdict(float)
-    for t in monthly_txns:
-        if t["type"] == "expense":
-            category_totals[t["category"]] += t["amount"]
-
-    # Sort and get top 3 categories
-    top_categories = sorted(category_totals.items(), key=lambda x: x[1], reverse=True)[:3]
+    # Keep the top 3 categories (heap selection, no full sort)
+    top_categories = top_totals(category_totals, 3)
 
     # Calculate percentage contribution per category
     top_categories = [
@@ -72,9 +72,8 @@ def generate_dashboard_summary(transactions):
 def generate_monthly_report(transactions):
     monthly_summary = defaultdict(lambda: {"income": 0, "expense": 0})
     for t in transactions:
-        month = datetime.strptime(t["date"], "%Y-%m-%d").strftime("%Y-%m")
-        monthly_summary[month][t["type"]] += t["amount"]
-    return dict(monthly_summary)
+        monthly_summary[month_key(t["date"])][t["type"]] += t["amount"]
+    return {format_month_key(key): monthly_summary[key] for key in sorted(monthly_summary)}
 
 def generate_category_breakdown(transactions, type_filter="expense"):
     categories = defaultdict(float)
@@ -84,7 +83,10 @@ def generate_category_breakdown(transactions, type_filter="expense"):
     return dict(categories)
 
 def generate_spending_trends(transactions):
-    monthly = generate_monthly_report(transactions)
+    return spending_trends_from_monthly(generate_monthly_report(transactions))
+
+def spending_trends_from_monthly(monthly):
+    """Month-to-month expense changes from a generate_monthly_report()-style dict."""
     months = sorted(monthly.keys())
     trends = []
     for i in range(1, len(months)):
@@ -0,0 +1,70 @@
+"""
+top_k.py
+Top-k queries: largest transactions, top categories and top payment methods.
+
+Every query makes one pass over the transactions and keeps only the k
+best candidates in a heap (heapq.nlargest), so it runs in O(n log k)
+instead of sorting everything. Ties keep their input order, exactly like
+sorted(..., reverse=True)[:k].
+
+All functions accept any iterable of transactions (dicts or Transaction
+records) and an optional inclusive 'YYYY-MM-DD' date window.
+"""
+
+import heapq
+from utils.date_utils import date_ordinal
+
+
+def _window(transactions, type_filter=None, start_date=None, end_date=None):
+    """
+    Yield the transactions of one type inside the date window. Dates
+    compare as days, so '2024-1-5' and '2024-01-05' are the same date.
+    """
+    low = date_ordinal(start_date) if start_date else None
+    high = date_ordinal(end_date) if end_date else None
+    for t in transactions:
+        if type_filter and t["type"] != type_filter:
+            continue
+        if low is not None or high is not None:
+            day = t.day if hasattr(t, "day") else date_ordinal(t["date"])
+            if (low is not None and day < low) or (high is not None and day > high):
+                continue
+        yield t
+
+
+def top_totals(totals, k=3):
+    """Return the k largest (key, total) pairs of a {key: total} dict, largest first."""
+    return heapq.nlargest(k, totals.items(), key=lambda x: x[1])
+
+
+def largest_transactions(transactions, k=5, type_filter="expense", start_date=None, end_date=None):
+    """
+    Return the k transactions with the largest amounts, largest first.
+
+    Args:
+        transactions (iterable): Transactions to consider.
+        k (int): Number of transactions to return.
+        type_filter (str): 'expense', 'income' or None for both.
+        start_date (str): Inclusive 'YYYY-MM-DD' lower bound.
+        end_date (str): Inclusive 'YYYY-MM-DD' upper bound.
+    """
+    return heapq.nlargest(k, _window(transactions, type_filter, start_date, end_date),
+                          key=lambda t: t["amount"])
+
+
+def _top_by(field, transactions, k, type_filter, start_date, end_date):
+    totals = {}
+    for t in _window(transactions, type_filter, start_date, end_date):
+        key = t.get(field) or "Unknown"
+        totals[key] = totals.get(key, 0.0) + t["amount"]
+    return top_totals(totals, k)
+
+
+def top_categories(transactions, k=3, type_filter="expense", start_date=None, end_date=None):
+    """Return the k categories with the largest totals as (category, total) pairs."""
+    return _top_by("category", transactions, k, type_filter, start_date, end_date)
+
+
+def top_payment_methods(transactions, k=3, type_filter="expense", start_date=None, end_date=None):
+    """Return the k payment methods with the largest totals as (method, total) pairs."""
+    return _top_by("payment_method", transactions, k, type_filter, start_date, end_date)
@@ -0,0 +1,44 @@
+# conftest.py
+# Every test runs against an empty scratch data directory (FINANCE_DATA_DIR),
+# with the default json storage and global layout.
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["FINANCE_DATA_DIR"] = tempfile.mkdtemp(prefix="finance-tests-")
+
+import pytest
+import config
+from persistence import cache, repository
+
+
+@pytest.fixture(autouse=True)
+def data_dir(monkeypatch):
+    for name in os.listdir(config.DATA_DIR):
+        path = os.path.join(config.DATA_DIR, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    os.makedirs(config.BACKUP_DIR, exist_ok=True)
+    cache.invalidate()
+    monkeypatch.setattr(config, "TRANSACTION_STORAGE", "json")
+    monkeypatch.setattr(config, "DATA_LAYOUT", "global")
+    monkeypatch.setattr(repository, "_repository", None)
+    yield config.DATA_DIR
+
+
+@pytest.fixture(params=["json", "jsonl", "sqlite"])
+def backend(request, monkeypatch):
+    """Run the test once per TRANSACTION_STORAGE backend."""
+    monkeypatch.setattr(config, "TRANSACTION_STORAGE", request.param)
+    return request.param
+
+
+def make_txn(transaction_id, user_id="USR-A", date="2025-01-15", amount=10.0,
+             type="expense", category="Food", description="lunch", payment_method="cash"):
+    return {"transaction_id": transaction_id, "user_id": user_id, "type": type,
+            "amount": amount, "category": category, "date": date,
+            "description": description, "payment_method": payment_method}
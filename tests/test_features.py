@@ -1 +1,119 @@
 # test_features.py
+import asyncio
+import os
+
+import pytest
+
+import config
+from conftest import make_txn
+from features.recurring_daemon import RecurringDaemon
+from features.recurring_processor import RecurringSchedule, post_due, process_due_recurring
+from persistence.load_save_json import save_json, load_json
+from utils.date_utils import get_today_str
+
+
+def _rule(next_date, **fields):
+    rule = {"type": "expense", "amount": 950.0, "category": "Rent", "description": "Rent",
+            "payment_method": "bank", "next_date": next_date}
+    rule.update(fields)
+    return rule
+
+
+def test_missed_months_are_caught_up_on_their_own_days(data_dir):
+    data = {"USR-A": [_rule("2025-01-31", frequency="monthly")]}
+
+    posted = post_due(data, "2025-04-30")
+    assert [t["date"] for t in posted] == ["2025-01-31", "2025-02-28", "2025-03-31", "2025-04-30"]
+    assert data["USR-A"][0]["next_date"] == "2025-05-31"  # the clamp to February doesn't stick
+
+
+@pytest.mark.parametrize("fields, dates", [
+    ({"frequency": "month_end"}, ["2024-01-31", "2024-02-29", "2024-03-31"]),
+    ({"frequency": "weekly", "interval": 2}, ["2024-01-31", "2024-02-14", "2024-02-28", "2024-03-13",
+                                              "2024-03-27"]),
+    ({"interval_days": 30}, ["2024-01-31", "2024-03-01", "2024-03-31"]),
+])
+def test_calendar_frequencies(data_dir, fields, dates):
+    posted = post_due({"USR-A": [_rule("2024-01-31", **fields)]}, "2024-03-31")
+    assert [t["date"] for t in posted] == dates
+
+
+def test_invalid_rules_are_counted_and_skipped(data_dir):
+    good = _rule("2025-01-01", frequency="monthly")
+    bad = [_rule("2025-01-01", frequency="monthly", category=None),
+           _rule("2025-01-01", frequency="monthly", amount="950"),
+           _rule("2025-01-01", frequency="monthly", amount=float("nan")),
+           _rule("2025-01-01", frequency="yearly"),
+           {"next_date": "2025-01-01", "interval_days": 7}]
+    schedule = RecurringSchedule({"USR-A": [good, *bad], "USR-B": "not a list"})
+    assert len(schedule) == 1 and schedule.invalid == 6
+
+    save_json([make_txn("T1")], config.TRANSACTIONS_FILE)
+    save_json({"USR-A": [good, *bad]}, config.RECURRING_FILE)
+    posted = process_due_recurring("2025-02-01")
+    assert [(t["user_id"], t["date"]) for t in posted] == [("USR-A", "2025-01-01"),
+                                                          ("USR-A", "2025-02-01")]
+    rules = load_json(config.RECURRING_FILE)["USR-A"]
+    assert rules[0]["next_date"] == "2025-03-01"
+    assert all(rule["next_date"] == "2025-01-01" for rule in rules[1:])
+    assert len(load_json(config.TRANSACTIONS_FILE)) == 3
+
+
+def test_daemon_keeps_posting_around_a_bad_users_rules(data_dir, monkeypatch):
+    monkeypatch.setattr(config, "DATA_LAYOUT", "sharded")
+    save_json({"USR-A": [_rule("2025-01-01", frequency="month_end")]},
+              config.user_shard_file("USR-A", "recurring"))
+    save_json({"USR-C": [_rule("2025-01-01", frequency="monthly", amount=-5)]},
+              config.user_shard_file("USR-C", "recurring"))
+    os.makedirs(config.USERS_DIR / "USR-B")
+    with open(config.user_shard_file("USR-B", "recurring"), "w") as f:
+        f.write("{not json")
+    daemon = RecurringDaemon(poll_interval=0.01, status_file=str(data_dir / "status.json"))
+
+    async def run_one_batch():
+        task = asyncio.create_task(daemon.run())
+        while not daemon.runs:
+            await asyncio.sleep(0.01)
+        daemon.stop()
+        await task
+
+    asyncio.run(asyncio.wait_for(run_one_batch(), 10))
+    status = load_json(str(data_dir / "status.json"))
+    assert status["posted"] > 0 and status["last_error"] is None
+    assert sorted(status["skipped"]) == ["USR-B", "USR-C"]
+    assert status["skipped"]["USR-C"] == "1 invalid rule(s)"
+    assert os.path.exists(config.user_shard_file("USR-A", "transactions"))
+
+
+def test_daemon_does_not_spin_on_rules_it_cannot_update(data_dir, monkeypatch):
+    import features.recurring_processor as processor
+
+    monkeypatch.setattr(config, "DATA_LAYOUT", "sharded")
+    save_json({"USR-A": [_rule("2025-01-01", frequency="month_end")]},
+              config.user_shard_file("USR-A", "recurring"))
+    stuck = str(config.user_shard_file("USR-B", "recurring"))
+    save_json({"USR-B": [_rule("2025-01-01", frequency="monthly")]}, stuck)
+    update_json = processor.update_json
+
+    def failing_update(path, fn):
+        if str(path) == stuck:
+            raise OSError("read-only file system")
+        return update_json(path, fn)
+
+    monkeypatch.setattr(processor, "update_json", failing_update)
+    daemon = RecurringDaemon(poll_interval=0.2, status_file=str(data_dir / "status.json"))
+
+    async def run_for_a_while():
+        task = asyncio.create_task(daemon.run())
+        await asyncio.sleep(0.5)
+        running = load_json(str(data_dir / "status.json"))
+        daemon.stop()
+        await task
+        return running
+
+    running = asyncio.run(asyncio.wait_for(run_for_a_while(), 10))
+    # One catch-up batch, then a retry of USR-B per poll interval at most
+    assert 2 <= daemon.runs <= 5
+    assert running["state"] == "running" and running["posted"] > 0
+    assert list(running["skipped"]) == ["USR-B"]
+    assert running["next_due"] > get_today_str()  # USR-A's, not the stuck rule's
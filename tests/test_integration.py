@@ -1 +1,94 @@
 # test_integration.py
+import os
+import time
+
+import pytest
+
+import config
+from conftest import make_txn
+from persistence import backup, backup_worker
+from persistence.repository import get_repository
+from persistence.load_save_json import load_json, save_json
+from reports import aggregates
+from transactions import text_index
+from transactions.transaction_manager import insert_transactions
+
+
+def _write_data():
+    save_json([make_txn("T1"), make_txn("T2")], config.TRANSACTIONS_FILE)
+    save_json({"USR-A": {"Food": 100.0}}, config.BUDGET_FILE)
+    save_json([make_txn("B1", user_id="USR-B")], config.user_shard_file("USR-B", "transactions"))
+
+
+def test_backup_round_trip_restores_every_file(data_dir):
+    _write_data()
+    first = backup.create_backup()
+    assert set(first["files"]) == {"transactions.json", "budgets.json",
+                                   os.path.join("users", "USR-B", "transactions.json")}
+
+    save_json([make_txn("T1")], config.TRANSACTIONS_FILE)
+    save_json({}, config.BUDGET_FILE)
+    assert backup.create_backup()["new_chunks"] > 0
+
+    backup.restore_backup(first["id"])
+    assert [t["transaction_id"] for t in load_json(config.TRANSACTIONS_FILE)] == ["T1", "T2"]
+    assert load_json(config.BUDGET_FILE) == {"USR-A": {"Food": 100.0}}
+    restored = backup.create_backup()["files"]
+    assert {name: e["sha256"] for name, e in restored.items()} \
+        == {name: e["sha256"] for name, e in first["files"].items()}
+
+
+@pytest.mark.parametrize("storage", ["json", "jsonl"])  # the backups hold the JSON files
+def test_a_restore_drops_the_logs_written_after_the_backup(data_dir, monkeypatch, storage):
+    monkeypatch.setattr(config, "TRANSACTION_STORAGE", storage)
+    save_json([], config.TRANSACTIONS_FILE)
+    insert_transactions([make_txn("T1", amount=10.0, description="Coffee")])
+    first = backup.create_backup()
+    insert_transactions([make_txn("T2", amount=99.0, description="Concert")])
+
+    backup.restore_backup(first["id"])
+    assert [t["amount"] for t in get_repository().for_user("USR-A")] == [10.0]
+    assert aggregates.monthly_totals("USR-A") == {"2025-01": {"income": 0, "expense": 10.0}}
+    assert aggregates.verify_aggregates() == []
+    assert text_index.search_text("USR-A", "concert") == set()
+
+
+def test_backing_up_one_file_keeps_the_others_in_the_manifest(data_dir):
+    _write_data()
+    full = backup.create_backup()
+    save_json({"USR-A": {"Food": 50.0}}, config.BUDGET_FILE)
+
+    backup.backup_file(config.BUDGET_FILE)
+    latest = backup.find_backup()
+    assert set(latest["files"]) == set(full["files"])
+    assert latest["files"]["transactions.json"] == full["files"]["transactions.json"]
+    assert backup.create_backup(only_if_changed=True) is None
+
+    save_json({}, config.BUDGET_FILE)
+    save_json([], config.TRANSACTIONS_FILE)
+    backup.restore_backup()
+    assert load_json(config.BUDGET_FILE) == {"USR-A": {"Food": 50.0}}
+    assert len(load_json(config.TRANSACTIONS_FILE)) == 2
+
+
+def test_a_failing_backup_does_not_stop_the_worker():
+    calls = []
+
+    def flaky_backup(only_if_changed):
+        calls.append(only_if_changed)
+        if len(calls) == 1:
+            raise KeyError("manifest")
+        return None
+
+    worker = backup_worker.BackupWorker(interval=0, backup=flaky_backup)
+    worker.start()
+    worker.request()
+    deadline = time.monotonic() + 5
+    while worker.last_error is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert worker.running and worker.status()["errors"] == 1
+    assert worker.last_error == "KeyError: 'manifest'"
+
+    worker.request()
+    worker.stop(timeout=5)
+    assert len(calls) == 2 and worker.skipped == 1 and worker.last_error is None
@@ -0,0 +1,289 @@
+# test_persistence.py
+import os
+import threading
+
+import pytest
+
+import config
+from conftest import make_txn
+from persistence import migrate, repository, transaction_log, wal
+from persistence.load_save_json import (save_json, load_json, load_json_cached, update_json,
+                                        append_text, pending_ops, flush_pending,
+                                        group_commit, atomic)
+from persistence.repository import JsonlRepository
+from utils.errors import DataPersistenceError
+
+
+def _paths(data_dir):
+    return str(data_dir / "t.json"), str(data_dir / "t.jsonl")
+
+
+def test_log_replays_adds_patches_and_deletes_over_the_snapshot(data_dir):
+    snapshot, log = _paths(data_dir)
+    save_json([make_txn("T1")], snapshot)
+    transaction_log.log_add(make_txn("T2"), log)
+    transaction_log.log_patch("T1", {"amount": 3.5}, log)
+    transaction_log.log_delete("T2", log)
+
+    rows = transaction_log.load_transactions(snapshot, log)
+    assert [(t["transaction_id"], t["amount"]) for t in rows] == [("T1", 3.5)]
+
+
+def test_torn_last_line_is_ignored(data_dir):
+    snapshot, log = _paths(data_dir)
+    save_json([], snapshot)
+    transaction_log.log_add(make_txn("T1"), log)
+    with open(log, "a") as f:
+        f.write('{"op": "add", "txn": {"transaction_')
+
+    rows = transaction_log.load_transactions(snapshot, log)
+    assert [t["transaction_id"] for t in rows] == ["T1"]
+
+
+def test_an_append_after_a_torn_line_is_kept(data_dir):
+    snapshot, log = _paths(data_dir)
+    save_json([], snapshot)
+    transaction_log.log_add(make_txn("T1"), log)
+    with open(log, "a") as f:
+        f.write('{"op": "add", "txn": {"transaction_')
+    transaction_log.log_add(make_txn("T2"), log)
+
+    rows = transaction_log.load_transactions(snapshot, log)
+    assert [t["transaction_id"] for t in rows] == ["T1", "T2"]
+
+
+def test_compaction_folds_the_log_into_the_snapshot(data_dir):
+    snapshot, log = _paths(data_dir)
+    save_json([make_txn("T1")], snapshot)
+    transaction_log.log_add(make_txn("T2"), log)
+
+    assert transaction_log.compact(snapshot, log) == 2
+    assert not os.path.exists(log)
+    assert [t["transaction_id"] for t in load_json(snapshot)] == ["T1", "T2"]
+
+
+def test_jsonl_repository_appends_instead_of_rewriting(data_dir):
+    snapshot, log = _paths(data_dir)
+    save_json([make_txn("T1")], snapshot)
+    before = os.path.getmtime(snapshot)
+    repo = JsonlRepository(snapshot, log)
+
+    repo.add(make_txn("T2"))
+    repo.update("T1", {"category": "Rent"})
+
+    assert os.path.getmtime(snapshot) == before
+    assert sum(1 for _ in open(log)) == 2
+    fresh = JsonlRepository(snapshot, log)
+    assert fresh.get("T1")["category"] == "Rent" and fresh.get("T2") is not None
+
+
+def test_date_ranges_match_unpadded_dates_on_every_backend(data_dir, backend):
+    save_json([], config.TRANSACTIONS_FILE)
+    repo = repository.get_repository()
+    repo.add_many([make_txn("T1", date="2024-1-5"), make_txn("T2", date="2024-01-20"),
+                   make_txn("T3", date="2024-2-1")])
+
+    rows = repo.for_user("USR-A", start_date="2024-01-02", end_date="2024-1-31")
+    assert sorted(t["transaction_id"] for t in rows) == ["T1", "T2"]
+
+
+def test_update_json_leaves_the_cached_data_alone_when_mutate_fails(data_dir):
+    path = str(data_dir / "budgets.json")
+    save_json({"USR-A": {"Food": 100.0}}, path)
+    cached = load_json_cached(path)
+
+    def fail(budgets):
+        budgets["USR-A"]["Food"] = 1.0
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        update_json(path, fail)
+    assert cached == {"USR-A": {"Food": 100.0}}
+    assert load_json_cached(path) == {"USR-A": {"Food": 100.0}}
+
+    update_json(path, lambda budgets: budgets["USR-A"].update(Food=50.0))
+    assert cached == {"USR-A": {"Food": 100.0}}
+    assert load_json(path) == {"USR-A": {"Food": 50.0}}
+
+
+def _disk_full(ops):
+    raise DataPersistenceError("disk full")
+
+
+def test_a_failed_group_flush_keeps_the_changes_for_the_next_one(data_dir, monkeypatch):
+    first, second = str(data_dir / "a.json"), str(data_dir / "b.json")
+    commit = wal.commit
+
+    monkeypatch.setattr(wal, "commit", _disk_full)
+    with pytest.raises(DataPersistenceError):
+        with group_commit():
+            save_json({"n": 1}, first)
+            append_text("line 1\n", second)
+    assert not os.path.exists(first) and load_json(first) == {"n": 1}
+
+    monkeypatch.setattr(wal, "commit", commit)
+    append_text("line 2\n", second)  # queued behind the leftovers, then flushed
+    assert load_json(first) == {"n": 1} and pending_ops(second) == []
+    assert open(second).read() == "line 1\nline 2\n"
+
+
+def test_a_failed_atomic_commit_is_discarded(data_dir, monkeypatch):
+    path = str(data_dir / "a.json")
+    save_json({"n": 1}, path)
+    commit = wal.commit
+
+    monkeypatch.setattr(wal, "commit", _disk_full)
+    with pytest.raises(DataPersistenceError):
+        with atomic():
+            save_json({"n": 2}, path)
+    monkeypatch.setattr(wal, "commit", commit)
+    assert load_json(path) == {"n": 1}
+    flush_pending()
+    assert load_json(path) == {"n": 1}
+
+
+def test_atomic_rollback_keeps_the_enclosing_blocks_changes(data_dir):
+    first, second = str(data_dir / "a.json"), str(data_dir / "b.json")
+    with group_commit():
+        save_json({"n": 1}, first)
+        with pytest.raises(RuntimeError):
+            with atomic():
+                save_json({"n": 2}, first)
+                save_json({"n": 2}, second)
+                raise RuntimeError("boom")
+        assert load_json(first) == {"n": 1}
+    assert load_json(first) == {"n": 1} and not os.path.exists(second)
+
+    with atomic():
+        save_json({"n": 3}, first)
+        with pytest.raises(RuntimeError):
+            with atomic():
+                save_json({"n": 4}, second)
+                raise RuntimeError("boom")
+    assert load_json(first) == {"n": 3} and not os.path.exists(second)
+
+
+def test_each_thread_has_its_own_group_commit(data_dir):
+    mine, theirs = str(data_dir / "a.json"), str(data_dir / "b.json")
+    with group_commit():
+        save_json({"n": 1}, mine)
+        worker = threading.Thread(target=save_json, args=({"n": 2}, theirs))
+        worker.start()
+        worker.join()
+        with open(theirs) as f:
+            assert f.read() == '{"n": 2}'  # written at once, not deferred into this block
+        assert not os.path.exists(mine)
+    assert load_json(mine) == {"n": 1}
+
+
+def _crash_before_applying(path, kind, payload, offset, sync=False):
+    raise OSError("power cut")
+
+
+def _interrupted_unit(data_dir, monkeypatch):
+    """Log a two-file unit that never reaches the files."""
+    first, second = str(data_dir / "a.json"), str(data_dir / "b.json")
+    with atomic():
+        save_json({"n": 1}, first)
+        save_json({"n": 1}, second)
+    apply = wal._apply
+    monkeypatch.setattr(wal, "_apply", _crash_before_applying)
+    with pytest.raises(DataPersistenceError):
+        with atomic():
+            save_json({"n": 2}, first)
+            save_json({"n": 2}, second)
+    monkeypatch.setattr(wal, "_apply", apply)
+    assert load_json(first) == load_json(second) == {"n": 1}
+    return first, second
+
+
+def test_recovery_redoes_a_unit_that_was_logged_but_not_applied(data_dir, monkeypatch):
+    first, second = _interrupted_unit(data_dir, monkeypatch)
+    assert wal.recover() == 1
+    assert load_json(first) == load_json(second) == {"n": 2}
+    assert os.path.getsize(config.WAL_FILE) == 0
+
+
+def test_recovery_ignores_a_torn_unit(data_dir, monkeypatch):
+    first, second = _interrupted_unit(data_dir, monkeypatch)
+    with open(config.WAL_FILE, "r+b") as f:
+        f.truncate(os.path.getsize(config.WAL_FILE) - 5)  # the commit line never made it
+    assert wal.recover() == 0
+    assert load_json(first) == load_json(second) == {"n": 1}
+
+
+def test_replay_after_a_reboot_never_undoes_newer_writes(data_dir, monkeypatch):
+    first, second = str(data_dir / "a.json"), str(data_dir / "b.json")
+    with atomic():
+        save_json([1], first)
+        save_json([1], second)
+    save_json([1, 2, 3], first)  # written directly, after the logged unit
+
+    shard, other = (str(config.user_shard_file("USR-A", kind)) for kind in ("budgets", "goals"))
+    with atomic():  # logged in the user's own log
+        save_json({"n": 1}, shard)
+        save_json({"n": 1}, other)
+    with atomic():  # names the same file, logged in data/wal.log
+        save_json({"n": 2}, shard)
+        save_json([2], second)
+
+    monkeypatch.setattr(wal, "_BOOT", "another boot")
+    wal.recover()
+    assert load_json(first) == [1, 2, 3]
+    assert load_json(shard) == {"n": 2} and load_json(second) == [2]
+
+
+def test_only_multi_file_units_are_logged_and_users_use_their_own_log(data_dir):
+    save_json({"n": 1}, str(data_dir / "a.json"))
+    append_text("line\n", str(data_dir / "a.jsonl"))
+    assert not os.path.exists(config.WAL_FILE)
+
+    budgets, goals = (config.user_shard_file("USR-A", kind) for kind in ("budgets", "goals"))
+    with atomic():
+        save_json({}, budgets)
+        save_json({}, goals)
+    assert os.path.exists(os.path.join(os.path.dirname(budgets), "wal.log"))
+    assert not os.path.exists(config.WAL_FILE)
+    assert wal.log_for([budgets, str(data_dir / "a.json")]) == str(config.WAL_FILE)
+
+
+def test_amount_migration_rounds_to_cents_and_lists_invalid_rows(data_dir):
+    save_json([make_txn("T1", amount=1.234), make_txn("T2", amount=5.0),
+               make_txn("T3", amount=float("nan"))], config.TRANSACTIONS_FILE)
+
+    result = migrate.migrate_amounts_to_cents()
+    assert result == {"rounded": 1, "invalid": ["T3"]}
+    assert load_json(config.TRANSACTIONS_FILE)[0]["amount"] == 1.234  # nothing written
+
+    migrate.migrate_amounts_to_cents(drop_invalid=True)
+    assert [(t["transaction_id"], t["amount"]) for t in load_json(config.TRANSACTIONS_FILE)] \
+        == [("T1", 1.23), ("T2", 5.0)]
+
+
+def test_sharded_layout_keeps_each_user_in_their_own_files(data_dir, monkeypatch):
+    monkeypatch.setattr(config, "DATA_LAYOUT", "sharded")
+    repo = repository.get_repository()
+    repo.add_many([make_txn("A1"), make_txn("A2"), make_txn("B1", user_id="USR-B")])
+
+    assert [t["transaction_id"] for t in load_json(config.user_shard_file("USR-A", "transactions"))] \
+        == ["A1", "A2"]
+    assert repo.get("B1")["user_id"] == "USR-B"  # without an owner every shard is searched
+
+    # With the owner given, only that user's shard is opened
+    monkeypatch.setattr(repository, "sharded_user_ids", lambda: pytest.fail("scanned all shards"))
+    assert repo.get("A1", "USR-A") is not None and repo.get("B1", "USR-A") is None
+    assert repo.update("A1", {"amount": 2.0}, "USR-A")
+    assert repo.delete_many(["A2", "B1"], "USR-A") == 1
+    assert [(t["transaction_id"], t["amount"]) for t in repo.for_user("USR-A")] == [("A1", 2.0)]
+    assert [t["transaction_id"] for t in repo.for_user("USR-B")] == ["B1"]
+    assert repo.get("A1", "USR-C") is None
+
+
+def test_migration_splits_the_global_files_per_user(data_dir):
+    save_json([make_txn("A1"), make_txn("B1", user_id="USR-B")], config.TRANSACTIONS_FILE)
+    save_json({"USR-A": {"Food": 100.0}, "USR-B": {"Rent": 500.0}}, config.BUDGET_FILE)
+
+    assert migrate.migrate_to_sharded() == {"users": 2, "transactions": 2}
+    assert load_json(config.user_shard_file("USR-B", "budgets")) == {"USR-B": {"Rent": 500.0}}
+    assert [t["transaction_id"] for t in load_json(config.user_shard_file("USR-B", "transactions"))] \
+        == ["B1"]
@@ -1 +1,118 @@
 # test_reports.py
+import datetime
+import os
+import random
+
+import pytest
+
+import config
+from conftest import make_txn
+from persistence import cache, delta_log
+from persistence.load_save_json import save_json
+from persistence.repository import get_repository
+from reports import aggregates, columnar, top_k
+from reports.report_engine import build_report
+from reports.reports_manager import (generate_category_breakdown, generate_dashboard_summary,
+                                     generate_monthly_report, generate_spending_trends)
+from transactions.models import Transaction
+from transactions.transaction_manager import insert_transactions, record_changes
+
+ROWS = [
+    make_txn("T1", date="2025-01-03", amount=100.0, type="income", category="Salary"),
+    make_txn("T2", date="2025-01-10", amount=20.0, category="Food"),
+    make_txn("T3", date="2025-02-01", amount=5.5, category="Food"),
+    make_txn("T4", date="2025-02-07", amount=30.0, category="Rent"),
+]
+
+
+def test_reports_accept_a_stream_of_rows():
+    assert generate_monthly_report(iter(ROWS)) == {
+        "2025-01": {"income": 100.0, "expense": 20.0},
+        "2025-02": {"income": 0, "expense": 35.5},
+    }
+    assert generate_category_breakdown(iter(ROWS)) == {"Food": 25.5, "Rent": 30.0}
+
+
+
+def test_top_k_date_windows_compare_days():
+    rows = [make_txn("T1", date="2025-1-5", amount=50.0), make_txn("T2", date="2025-01-20"),
+            make_txn("T3", date="2025-10-01", amount=99.0)]
+    assert [t["transaction_id"] for t in top_k.largest_transactions(
+        rows, start_date="2025-01-01", end_date="2025-1-31")] == ["T1", "T2"]
+    assert top_k.top_categories([Transaction.from_dict(t) for t in rows],
+                                start_date="2025-02-01") == [("Food", 99.0)]
+
+
+def _random_rows(count):
+    rng = random.Random(7)
+    rows = [make_txn(f"T{i}", user_id=rng.choice(["USR-A", "USR-B", "USR-C"]),
+                     date=f"202{rng.randint(3, 5)}-{rng.randint(1, 12)}-{rng.randint(1, 28)}",
+                     amount=rng.choice([0.001, 0.285, 19.99, 100.0, rng.uniform(1, 500)]),
+                     type=rng.choice(["income", "expense"]),
+                     category=rng.choice(["Food", "Rent", "Salary", "Fun"]))
+            for i in range(count)]
+    return rows + [Transaction.from_dict(row) for row in rows[:50]]
+
+
+@pytest.mark.parametrize("numpy", [True, False])
+def test_columnar_aggregates_match_the_row_by_row_ones(monkeypatch, numpy):
+    if numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(columnar, "np", None)
+    rows = _random_rows(2000)
+
+    expected = {}
+    for row in rows:
+        aggregates.apply_delta(expected, row)
+    assert aggregates.rebuild_aggregates(iter(rows)) == expected
+    assert aggregates.rebuild_aggregates([]) == {}
+
+
+def _store(rows):
+    save_json([], config.TRANSACTIONS_FILE)
+    insert_transactions(rows)
+
+
+def test_recorded_changes_are_appended_not_rewritten(data_dir):
+    _store(ROWS[:2])
+    snapshot = os.stat(config.AGGREGATES_FILE).st_ino
+
+    insert_transactions(ROWS[2:])
+    get_repository().delete("T2")
+    record_changes(removed=[ROWS[1]])
+
+    assert os.stat(config.AGGREGATES_FILE).st_ino == snapshot
+    remaining = [ROWS[0], *ROWS[2:]]
+    assert aggregates.monthly_totals("USR-A") == generate_monthly_report(remaining)
+    cache.invalidate()  # fold the log again from disk
+    assert aggregates.category_totals("USR-A") == {"Food": 5.5, "Rent": 30.0}
+    assert aggregates.verify_aggregates() == []
+
+
+def test_the_delta_log_is_folded_into_the_snapshot_once_large(data_dir, monkeypatch):
+    _store(ROWS[:1])
+    monkeypatch.setattr(delta_log.due, "__defaults__", (0,))
+
+    insert_transactions(ROWS[1:])
+    assert not os.path.exists(delta_log.log_path(config.AGGREGATES_FILE))
+    cache.invalidate()
+    assert aggregates.category_totals("USR-A") == {"Food": 25.5, "Rent": 30.0}
+
+
+def test_build_report_reads_the_aggregates_with_months_in_order(data_dir):
+    this_month = datetime.date.today().strftime("%Y-%m-01")
+    rows = [*reversed(ROWS), make_txn("T5", date=this_month, amount=12.0, category="Food"),
+            make_txn("T6", user_id="USR-B", amount=999.0)]
+    _store(rows)
+    mine = [t for t in rows if t["user_id"] == "USR-A"]
+
+    report = build_report("USR-A")
+    assert report["has_data"]
+    assert list(report["monthly"]) == sorted(report["monthly"])
+    assert report["monthly"] == generate_monthly_report(mine)
+    assert report["categories"]["expense"] == generate_category_breakdown(mine)
+    assert report["trends"] == generate_spending_trends(mine)
+    dashboard = generate_dashboard_summary(mine)
+    assert report["dashboard"] == dashboard and dashboard["total_expenses"] == 12.0
+    assert not build_report("USR-C")["has_data"]
@@ -1 +1,149 @@
 # test_transactions.py
+import math
+import os
+
+import pytest
+
+import config
+from conftest import make_txn
+from persistence import cache
+from persistence.load_save_json import save_json
+from persistence.repository import get_repository
+from transactions.importer import import_statement
+from transactions import text_index, transaction_manager
+from transactions.query import And, Eq, In, Query, Range
+from transactions.transaction_manager import insert_transactions, record_changes
+from transactions.models import Transaction, to_minor
+from utils.errors import InvalidTransactionError
+
+
+def test_amounts_are_kept_in_whole_cents():
+    assert to_minor(12.5) == 1250
+    assert to_minor("0.07") == 7
+    assert to_minor(12.344) == 1234
+    assert Transaction.from_dict(make_txn("T1", amount=19.999)).amount == 20.0
+
+
+@pytest.mark.parametrize("amount, cents", [(0.285, 29), (1.005, 101), ("2.675", 268),
+                                           (-0.125, -13), (0.015, 2)])
+def test_half_cents_round_on_the_decimal_value(amount, cents):
+    assert to_minor(amount) == cents
+
+
+@pytest.mark.parametrize("amount", [math.nan, math.inf, -math.inf, "nan"])
+def test_non_finite_amounts_are_rejected(amount):
+    with pytest.raises(InvalidTransactionError):
+        to_minor(amount)
+    with pytest.raises(InvalidTransactionError):
+        Transaction.from_dict(make_txn("T1", amount=amount))
+
+
+def test_an_import_skips_bad_rows_and_stores_the_rest(data_dir, tmp_path):
+    save_json([], config.TRANSACTIONS_FILE)
+    statement = tmp_path / "statement.csv"
+    statement.write_text(
+        "Date,Amount,Memo,Category\n"
+        "2025-01-03,-12.50,Coffee,Food\n"
+        "2025-01-04,nan,Broken,Food\n"
+        "2025-01-05,inf,Broken,Food\n"
+        "2025-01-06,abc,Broken,Food\n"
+        "2025-13-01,-3,Bad date,Food\n"
+        '2025-01-07,"1,500.00",Salary,\n'
+        "2025-01-08,0,Zero,Food\n")
+
+    result = import_statement(str(statement), user_id="USR-A")
+
+    assert [number for number, _ in result["errors"]] == [2, 3, 4, 5, 7]
+    stored = sorted((t["type"], t["amount"], t["category"])
+                    for t in get_repository().for_user("USR-A"))
+    assert stored == [("expense", 12.5, "Food"), ("income", 1500.0, "Uncategorized")]
+
+
+def test_imported_dates_are_stored_zero_padded_on_every_backend(data_dir, backend, tmp_path):
+    save_json([], config.TRANSACTIONS_FILE)
+    statement = tmp_path / "statement.csv"
+    statement.write_text("Date,Amount,Memo,Category\n2024-1-5,-12.50,Coffee,Food\n")
+
+    import_statement(str(statement), user_id="USR-A")
+    assert [t["date"] for t in get_repository().for_user("USR-A")] == ["2024-01-05"]
+
+
+def test_queries_match_the_same_rows_on_every_backend(data_dir, backend):
+    save_json([], config.TRANSACTIONS_FILE)
+    get_repository().add_many([
+        make_txn("T1", date="2024-1-5", category="Straße"),
+        make_txn("T2", date="2024-01-20", category="STRASSE"),
+        make_txn("T3", date="2024-02-01", category="strasse"),
+        make_txn("T4", date="2024-01-09", category="Food"),
+    ])
+    where = And(Range("date", "2024-01-01", "2024-1-31"), Eq("category", "strasse"))
+
+    pushed = Query("USR-A", where=where).run()
+    scanned = Query(where=where).run()  # no user: checked row by row
+    assert [t["transaction_id"] for t in pushed] == ["T1", "T2"]
+    assert [t["transaction_id"] for t in scanned] == ["T1", "T2"]
+
+
+def test_results_are_ordered_by_day_like_ranges_filter(data_dir):
+    save_json([], config.TRANSACTIONS_FILE)
+    rows = [make_txn("T1", date="2024-10-01"), make_txn("T2", date="2024-9-30"),
+            make_txn("T3", date="2024-01-15")]
+    get_repository().add_many(rows)
+
+    ordered = Query(order_by=("date",)).stream(rows)
+    assert [t["transaction_id"] for t in ordered] == ["T3", "T2", "T1"]
+    by_id = Query("USR-A", where=In("transaction_id", ["T1", "T2", "T3"])).run()
+    assert [t["transaction_id"] for t in by_id] == ["T3", "T2", "T1"]
+
+
+def test_text_index_changes_are_logged_and_folded_back(data_dir):
+    save_json([], config.TRANSACTIONS_FILE)
+    insert_transactions([make_txn("T1", description="Uber ride")])
+    index_file = text_index._index_path("USR-A")
+    snapshot = os.stat(index_file).st_ino
+
+    insert_transactions([make_txn("T2", description="Uber Eats"),
+                         make_txn("T3", description="Cinema")])
+    get_repository().update("T2", {"description": "Pizza"})
+    record_changes(added=[get_repository().get("T2")],
+                   removed=[make_txn("T2", description="Uber Eats")])
+
+    assert os.stat(index_file).st_ino == snapshot
+    assert text_index.search_text("USR-A", "ub") == {"T1"}
+    cache.invalidate()  # fold the log again from disk
+    assert text_index.search_text("USR-A", "ub") == {"T1"}
+    assert text_index.search_text("USR-A", "piz") == {"T2"}
+
+
+def test_pages_cover_every_row_once_in_date_order(data_dir, backend):
+    save_json([], config.TRANSACTIONS_FILE)
+    rows = [make_txn(f"T{i:02d}", date=f"2025-01-{i % 7 + 1:02d}") for i in range(23)]
+    get_repository().add_many(rows)
+
+    pages = list(transaction_manager.iter_transaction_pages("USR-A", page_size=5))
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+    seen = [transaction_manager.page_cursor(t) for page in pages for t in page]
+    assert seen == sorted(transaction_manager.page_cursor(t) for t in rows)
+
+    rest = transaction_manager.iter_transaction_pages("USR-A", 5, after=seen[9])
+    assert [t["transaction_id"] for t in next(rest)] == [tid for _, tid in seen[10:15]]
+
+
+def test_pages_order_unpadded_dates_by_day(data_dir, backend):
+    save_json([], config.TRANSACTIONS_FILE)
+    get_repository().add_many([make_txn("T1", date="2025-1-10"), make_txn("T2", date="2025-01-09"),
+                               make_txn("T3", date="2025-1-9"), make_txn("T4", date="2025-01-10")])
+
+    pages = list(transaction_manager.iter_transaction_pages("USR-A", page_size=1))
+    assert [t["transaction_id"] for page in pages for t in page] == ["T2", "T3", "T1", "T4"]
+
+
+def test_view_transaction_still_returns_the_list(data_dir, monkeypatch, capsys):
+    save_json([], config.TRANSACTIONS_FILE)
+    get_repository().add_many([make_txn("T1"), make_txn("T2"), make_txn("T3", user_id="USR-B")])
+    monkeypatch.setattr(transaction_manager, "get_current_user", lambda: {"user_id": "USR-A"})
+
+    viewed = transaction_manager.view_transaction()
+    assert [t["transaction_id"] for t in viewed] == ["T1", "T2"]
+    assert transaction_manager.view_transaction_pages(user_only=False, page_size=1) == 3
+    assert capsys.readouterr().out.count("[ T") == 5
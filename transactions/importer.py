@@ -0,0 +1,110 @@
+"""
+importer.py
+Import bank statements (CSV or OFX) as transactions.
+
+Statements are parsed into raw row dicts and handed to
+add_transactions_bulk(), which validates every row, generates IDs and
+stores the whole statement with one write.
+
+CSV files need a header row. Recognised columns (case-insensitive):
+    date, type, amount, category, description, payment_method
+plus the aliases in CSV_ALIASES. Without a 'type' column the sign of the
+amount decides: negative amounts are expenses, positive ones income.
+"""
+
+import csv
+import os
+import re
+from transactions.transaction_manager import add_transactions_bulk
+from utils.errors import InvalidTransactionError
+
+DEFAULT_CATEGORY = "Uncategorized"
+
+CSV_ALIASES = {
+    "transaction date": "date",
+    "posted date": "date",
+    "memo": "description",
+    "details": "description",
+    "narrative": "description",
+    "payee": "description",
+    "method": "payment_method",
+    "payment method": "payment_method",
+    "account": "payment_method",
+}
+
+_OFX_TRANSACTION = re.compile(r"<STMTTRN>(.*?)</STMTTRN>", re.IGNORECASE | re.DOTALL)
+_OFX_FIELD = re.compile(r"<(\w+)>([^<\r\n]*)")
+
+
+def _signed_row(row, default_category, payment_method):
+    """Fill in type/category/payment method for rows with a signed amount."""
+    row["amount"] = str(row.get("amount", "")).replace(",", "")  # "1,234.50"
+    if not row.get("type"):
+        try:
+            amount = float(row["amount"])
+        except ValueError:
+            return row  # left for validation to report
+        row["type"] = "expense" if amount < 0 else "income"
+        row["amount"] = abs(amount)
+    row["category"] = row.get("category") or default_category
+    row["payment_method"] = row.get("payment_method") or payment_method
+    return row
+
+
+def read_csv_statement(path, default_category=DEFAULT_CATEGORY, payment_method="Bank"):
+    """Yield raw rows from a CSV statement, one per line."""
+    with open(path, "r", newline="", encoding="utf-8-sig") as f:
+        for raw in csv.DictReader(f):
+            row = {}
+            for key, value in raw.items():
+                if key is None:
+                    continue
+                name = key.strip().lower()
+                row[CSV_ALIASES.get(name, name.replace(" ", "_"))] = (value or "").strip()
+            yield _signed_row(row, default_category, payment_method)
+
+
+def read_ofx_statement(path, default_category=DEFAULT_CATEGORY, payment_method="Bank"):
+    """Yield raw rows from the <STMTTRN> blocks of an OFX statement."""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        content = f.read()
+
+    for block in _OFX_TRANSACTION.findall(content):
+        fields = {tag.upper(): value.strip() for tag, value in _OFX_FIELD.findall(block)}
+        posted = fields.get("DTPOSTED", "")
+        row = {
+            "date": f"{posted[:4]}-{posted[4:6]}-{posted[6:8]}" if len(posted) >= 8 else "",
+            "amount": fields.get("TRNAMT", ""),
+            "description": fields.get("NAME") or fields.get("MEMO", ""),
+        }
+        yield _signed_row(row, default_category, payment_method)
+
+
+def import_statement(path, user_id=None, default_category=DEFAULT_CATEGORY):
+    """
+    Import a CSV or OFX statement for a user.
+
+    Args:
+        path (str): Statement file (.csv, .ofx or .qfx).
+        user_id (str): Owner of the rows. Defaults to the logged-in user.
+        default_category (str): Category for rows that have none.
+
+    Returns:
+        dict: The add_transactions_bulk() result.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        InvalidTransactionError: If the file type is not supported.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Statement '{path}' does not exist.")
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        rows = read_csv_statement(path, default_category)
+    elif extension in (".ofx", ".qfx"):
+        rows = read_ofx_statement(path, default_category)
+    else:
+        raise InvalidTransactionError(f"Unsupported statement type '{extension}' (use CSV or OFX).")
+
+    return add_transactions_bulk(rows, user_id=user_id)
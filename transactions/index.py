@@ -0,0 +1,105 @@
+"""
+index.py
+Per-user index of transactions kept sorted by date.
+
+Each transaction is keyed by its day ordinal, so date ranges are resolved
+with two binary searches over integers instead of a full scan.
+Transactions with the same date keep their insertion order.
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from utils.date_utils import date_ordinal
+
+
+class UserDateIndex:
+    """Maps user_id -> that user's transactions, sorted by date."""
+
+    def __init__(self, transactions=()):
+        self._rows = defaultdict(list)   # user_id -> transactions sorted by date
+        self._days = defaultdict(list)   # user_id -> their day ordinals, same order
+
+        for txn in transactions:
+            self._rows[txn.get("user_id")].append(txn)
+
+        for user_id, rows in self._rows.items():
+            rows.sort(key=lambda t: date_ordinal(t["date"]))  # stable: ties keep file order
+            self._days[user_id] = [date_ordinal(t["date"]) for t in rows]
+
+    def insert(self, txn):
+        """Add a transaction after any others with the same date."""
+        user_id = txn.get("user_id")
+        day = date_ordinal(txn["date"])
+        pos = bisect_right(self._days[user_id], day)
+        self._days[user_id].insert(pos, day)
+        self._rows[user_id].insert(pos, txn)
+
+    def remove(self, txn):
+        """Remove a transaction (matched by identity). Returns True if found."""
+        user_id = txn.get("user_id")
+        days, rows = self._days[user_id], self._rows[user_id]
+        day = date_ordinal(txn["date"])
+        lo = bisect_left(days, day)
+        hi = bisect_right(days, day)
+
+        for pos in range(lo, hi):
+            if rows[pos] is txn:
+                del days[pos]
+                del rows[pos]
+                return True
+        return False
+
+    def remove_many(self, transactions):
+        """Remove several transactions (matched by identity) with one pass per user."""
+        by_user = defaultdict(set)
+        for txn in transactions:
+            by_user[txn.get("user_id")].add(id(txn))
+
+        for user_id, doomed in by_user.items():
+            kept = [(day, txn) for day, txn in zip(self._days[user_id], self._rows[user_id])
+                    if id(txn) not in doomed]
+            self._days[user_id] = [day for day, _ in kept]
+            self._rows[user_id] = [txn for _, txn in kept]
+
+    def range(self, user_id, start_date=None, end_date=None):
+        """
+        Return the user's transactions between two dates (inclusive).
+
+        Args:
+            user_id (str): Owner of the transactions.
+            start_date (str): 'YYYY-MM-DD' lower bound, or None for no bound.
+            end_date (str): 'YYYY-MM-DD' upper bound, or None for no bound.
+
+        Returns:
+            list: A new list of matching transactions, oldest first.
+        """
+        if user_id not in self._rows:
+            return []
+        days, rows = self._days[user_id], self._rows[user_id]
+        lo = bisect_left(days, date_ordinal(start_date)) if start_date else 0
+        hi = bisect_right(days, date_ordinal(end_date)) if end_date else len(rows)
+        return rows[lo:hi]
+
+    def page(self, user_id, after=None, limit=50):
+        """
+        Return up to `limit` of the user's transactions ordered by
+        (date, transaction_id), starting after the cursor `after`, a
+        (day ordinal, transaction_id) tuple (see page_cursor in
+        transaction_manager.py). Only the day groups the page touches are
+        sorted.
+        """
+        if user_id not in self._rows:
+            return []
+        days, rows = self._days[user_id], self._rows[user_id]
+        pos = bisect_left(days, after[0]) if after else 0
+
+        page = []
+        while pos < len(rows) and len(page) < limit:
+            end = bisect_right(days, days[pos], pos)
+            for txn in sorted(rows[pos:end], key=lambda t: t["transaction_id"]):
+                if after is None or (days[pos], txn["transaction_id"]) > tuple(after):
+                    page.append(txn)
+                    if len(page) == limit:
+                        break
+            pos = end
+        return page
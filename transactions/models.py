@@ -0,0 +1,140 @@
+"""
+models.py
+Compact in-memory record type for transactions.
+
+A Transaction uses __slots__ instead of a per-object dict, interns the
+strings that repeat across rows (user, type, category, date, payment
+method) and keeps the amount as integer minor units (cents). It also
+carries the pre-computed day ordinal and month key of its date.
+
+It behaves like the dicts used elsewhere in the project: t["amount"],
+t.get("category"), t.update(...), dict(t) and json output all work.
+"""
+
+import math
+import sys
+from decimal import Decimal, ROUND_HALF_UP
+from utils.date_utils import date_ordinal, month_key
+from utils.errors import InvalidTransactionError
+
+_CENT = Decimal("0.01")
+
+FIELDS = ("transaction_id", "user_id", "type", "amount", "category",
+          "date", "description", "payment_method")
+
+
+def _intern(value):
+    """Intern repeated strings so equal values share one object."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def to_minor(amount) -> int:
+    """
+    Convert an amount (e.g. 12.5) into integer minor units (1250).
+
+    Amounts are rounded to the nearest cent, halves away from zero, on
+    their decimal digits rather than their binary float value (0.285 ->
+    29, 12.344 -> 1234). Stored data with finer amounts is rounded once
+    by `python -m persistence.migrate --amounts`.
+
+    Raises:
+        InvalidTransactionError: If the amount is NaN or infinite.
+    """
+    value = float(amount)
+    if not math.isfinite(value):
+        raise InvalidTransactionError(f"Amount must be a finite number, got {amount!r}.")
+    return int(Decimal(str(amount)).quantize(_CENT, ROUND_HALF_UP) * 100)
+
+
+class Transaction:
+    """A single income or expense record."""
+
+    __slots__ = ("transaction_id", "user_id", "type", "amount_minor", "category",
+                 "_date", "description", "payment_method", "day", "month")
+
+    def __init__(self, transaction_id, user_id, type, amount, category, date,
+                 description="", payment_method=""):
+        self.transaction_id = transaction_id
+        self.user_id = _intern(user_id)
+        self.type = _intern(type)
+        self.amount_minor = to_minor(amount)
+        self.category = _intern(category)
+        self.date = date
+        self.description = description
+        self.payment_method = _intern(payment_method)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a Transaction from a stored dict (or return it unchanged)."""
+        if isinstance(data, cls):
+            return data
+        return cls(
+            data["transaction_id"], data["user_id"], data["type"], data.get("amount", 0),
+            data.get("category", ""), data["date"], data.get("description", ""),
+            data.get("payment_method", ""))
+
+    def to_dict(self):
+        """Return the plain dict form used in the JSON files."""
+        return {field: self[field] for field in FIELDS}
+
+    # --- Derived fields ---
+
+    @property
+    def amount(self):
+        return self.amount_minor / 100
+
+    @amount.setter
+    def amount(self, value):
+        self.amount_minor = to_minor(value)
+
+    @property
+    def date(self):
+        return self._date
+
+    @date.setter
+    def date(self, value):
+        self._date = _intern(value)
+        self.day = date_ordinal(value)
+        self.month = month_key(value)
+
+    # --- dict-compatible accessors ---
+
+    def __getitem__(self, key):
+        if key not in FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in FIELDS:
+            raise KeyError(key)
+        if key in ("user_id", "type", "category", "payment_method"):
+            value = _intern(value)
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in FIELDS else default
+
+    def update(self, changes=(), **kwargs):
+        for key, value in dict(changes, **kwargs).items():
+            self[key] = value
+
+    def keys(self):
+        return FIELDS
+
+    def values(self):
+        return [self[field] for field in FIELDS]
+
+    def items(self):
+        return [(field, self[field]) for field in FIELDS]
+
+    def __contains__(self, key):
+        return key in FIELDS
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __repr__(self):
+        return repr(self.to_dict())
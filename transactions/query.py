@@ -0,0 +1,266 @@
+"""
+query.py
+Composable queries over transactions.
+
+A Query combines predicates, a projection, a multi-key sort and
+limit/offset:
+
+    Query(user_id, where=And(Range("date", "2024-01-01", "2024-03-31"),
+                             In("category", ["Food", "Transport"]),
+                             Contains("description", "uber")),
+          select=("date", "amount", "description"),
+          order_by=("-amount", "date"), limit=10).run()
+
+Predicates can also be combined with & and |. String comparisons ignore
+case. Conditions the storage can answer from its indexes (user, date
+range, category, type and amount bounds, transaction IDs) are pushed down
+to the repository; everything else is checked in a single streaming pass
+that builds the result list directly.
+"""
+
+from itertools import islice
+from persistence.repository import get_repository
+from transactions.models import FIELDS
+from utils.date_utils import date_ordinal
+from utils.errors import InvalidTransactionError
+
+
+# Larger transaction_id sets are matched during the scan instead of looked up one by one
+ID_LOOKUP_LIMIT = 1000
+
+
+def _fold(value):
+    return value.casefold() if isinstance(value, str) else value
+
+
+def _sort_value(field, value):
+    """Sort key of one field: dates by day, like Range; strings case-insensitively."""
+    if field == "date" and value is not None:
+        return date_ordinal(value)
+    return _fold(value)
+
+
+class Predicate:
+    """Base class: a condition on one transaction."""
+
+    def matches(self, txn):
+        raise NotImplementedError
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+
+class FieldPredicate(Predicate):
+    def __init__(self, field):
+        if field not in FIELDS:
+            raise InvalidTransactionError(f"Unknown field '{field}'.")
+        self.field = field
+
+
+class Eq(FieldPredicate):
+    """field == value"""
+
+    def __init__(self, field, value):
+        super().__init__(field)
+        self.value = value
+        self._folded = _fold(value)
+
+    def matches(self, txn):
+        return _fold(txn.get(self.field)) == self._folded
+
+
+class In(FieldPredicate):
+    """field is one of values"""
+
+    def __init__(self, field, values):
+        super().__init__(field)
+        self.values = list(values)
+        self._folded = {_fold(v) for v in self.values}
+
+    def matches(self, txn):
+        return _fold(txn.get(self.field)) in self._folded
+
+
+class Range(FieldPredicate):
+    """
+    low <= field <= high (either bound may be None). Dates compare as days,
+    so '2024-1-5' and '2024-01-05' are the same date.
+    """
+
+    def __init__(self, field, low=None, high=None):
+        super().__init__(field)
+        self.low, self.high = low, high
+        try:
+            self._low = self._key(low) if low is not None else None
+            self._high = self._key(high) if high is not None else None
+        except ValueError:
+            raise InvalidTransactionError(f"Range bounds on '{field}' must be 'YYYY-MM-DD' dates.")
+
+    def _key(self, value):
+        return date_ordinal(value) if self.field == "date" else value
+
+    def matches(self, txn):
+        value = txn.get(self.field)
+        if value is None:
+            return False
+        value = self._key(value)
+        return ((self._low is None or value >= self._low)
+                and (self._high is None or value <= self._high))
+
+
+class Prefix(FieldPredicate):
+    """field starts with prefix"""
+
+    def __init__(self, field, prefix):
+        super().__init__(field)
+        self.prefix = prefix.casefold()
+
+    def matches(self, txn):
+        return str(txn.get(self.field) or "").casefold().startswith(self.prefix)
+
+
+class Contains(FieldPredicate):
+    """field contains text"""
+
+    def __init__(self, field, text):
+        super().__init__(field)
+        self.text = text.casefold()
+
+    def matches(self, txn):
+        return self.text in str(txn.get(self.field) or "").casefold()
+
+
+class And(Predicate):
+    def __init__(self, *predicates):
+        self.predicates = [p for p in predicates if p is not None]
+
+    def matches(self, txn):
+        return all(p.matches(txn) for p in self.predicates)
+
+
+class Or(Predicate):
+    def __init__(self, *predicates):
+        self.predicates = [p for p in predicates if p is not None]
+
+    def matches(self, txn):
+        return any(p.matches(txn) for p in self.predicates)
+
+
+def _conjuncts(predicate):
+    """Flatten nested Ands into a list of the predicates that must all hold."""
+    if predicate is None:
+        return []
+    if isinstance(predicate, And):
+        return [c for p in predicate.predicates for c in _conjuncts(p)]
+    return [predicate]
+
+
+class Query:
+    """
+    A transaction query.
+
+    Args:
+        user_id (str): Owner of the transactions, or None for every user.
+        where (Predicate): Condition rows must satisfy (None for all rows).
+        select (iterable): Fields to return; rows become plain dicts. None
+            returns the stored transaction records.
+        order_by (iterable): Sort keys, e.g. ("date", "-amount"); a leading
+            '-' sorts that key descending. Strings sort case-insensitively.
+        limit (int): Maximum number of rows to return.
+        offset (int): Number of rows to skip first.
+    """
+
+    def __init__(self, user_id=None, where=None, select=None, order_by=(), limit=None, offset=0):
+        self.user_id = user_id
+        self.where = where
+        self.select = tuple(select) if select else None
+        self.order_by = [(key.lstrip("-"), key.startswith("-")) for key in order_by or ()]
+        self.limit = limit
+        self.offset = offset or 0
+
+        for field in (self.select or ()) + tuple(f for f, _ in self.order_by):
+            if field not in FIELDS:
+                raise InvalidTransactionError(f"Unknown field '{field}'.")
+        if self.offset < 0 or (self.limit is not None and self.limit < 0):
+            raise InvalidTransactionError("limit and offset cannot be negative.")
+
+    def _plan(self):
+        """
+        Split the top-level AND into arguments the repository can answer
+        from its indexes and the predicates left to check per row.
+
+        Returns:
+            tuple: (for_user keyword arguments, transaction IDs or None, residual predicates)
+        """
+        pushed, ids, residual = {}, None, []
+        for p in _conjuncts(self.where):
+            if isinstance(p, Range) and p.field == "date" and "start_date" not in pushed:
+                pushed["start_date"], pushed["end_date"] = p.low, p.high
+            elif isinstance(p, Range) and p.field == "amount" and "min_amount" not in pushed:
+                pushed["min_amount"], pushed["max_amount"] = p.low, p.high
+            elif (isinstance(p, Eq) and p.field in ("category", "type")
+                  and isinstance(p.value, str) and p.field not in pushed):
+                pushed[p.field] = p.value
+            elif (isinstance(p, (Eq, In)) and p.field == "transaction_id" and ids is None
+                  and (isinstance(p, Eq) or len(p.values) <= ID_LOOKUP_LIMIT)):
+                ids = [p.value] if isinstance(p, Eq) else p.values
+            else:
+                residual.append(p)
+        return pushed, ids, residual
+
+    def _candidates(self, repository):
+        pushed, ids, residual = self._plan()
+
+        if ids is not None:
+            # ID lookups use the repository's transaction_id index
+            rows = (repository.get(tid, self.user_id) for tid in dict.fromkeys(ids))
+            rows = [t for t in rows if t is not None
+                    and (self.user_id is None or t["user_id"] == self.user_id)]
+            # Oldest first, like for_user
+            rows.sort(key=lambda t: (date_ordinal(t["date"]), t["transaction_id"]))
+            return rows, _conjuncts(self.where)  # few rows: re-check every condition
+
+        if self.user_id is not None:
+            return repository.for_user(self.user_id, **pushed), residual
+
+        # No user index to use: every condition is checked per row
+        return repository.all(), _conjuncts(self.where)
+
+    def run(self, repository=None):
+        """Execute the query. Returns a list of transactions (or dicts with `select`)."""
+        rows, residual = self._candidates(repository or get_repository())
+        return list(self._evaluate(rows, residual))
+
+    def stream(self, rows):
+        """
+        Apply the query to any iterable of transactions (e.g. a file stream)
+        and yield the results lazily. Without order_by this keeps only one
+        row in memory at a time.
+        """
+        conditions = _conjuncts(self.where)
+        if self.user_id is not None:
+            conditions.insert(0, Eq("user_id", self.user_id))
+        return self._evaluate(rows, conditions)
+
+    def _evaluate(self, rows, residual):
+        """Filter, sort, slice and project `rows`, lazily where possible."""
+        if residual:
+            rows = (t for t in rows if all(p.matches(t) for p in residual))
+
+        if self.order_by:
+            rows = list(rows)
+            # Stable sorts from the last key to the first give a multi-key order
+            for field, descending in reversed(self.order_by):
+                rows.sort(key=lambda t, f=field: (t.get(f) is None, _sort_value(f, t.get(f))),
+                          reverse=descending)
+
+        stop = self.offset + self.limit if self.limit is not None else None
+        if self.offset or stop is not None:
+            rows = islice(rows, self.offset, stop)
+
+        if self.select:
+            return ({field: t.get(field) for field in self.select} for t in rows)
+        return iter(rows)
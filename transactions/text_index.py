@@ -0,0 +1,198 @@
+"""
+text_index.py
+Per-user inverted index over transaction text.
+
+The description and payment method of every transaction are split into
+lowercase word tokens. For each user, data/text_index/<user_id>.json
+(data/users/<user_id>/text_index.json in the sharded layout) maps every
+token to the IDs of the transactions that contain it:
+
+    {"uber": ["TXN-01H...", "TXN-01J..."], "visa": ["TXN-01H..."]}
+
+add/edit/delete update the index with the same added/removed deltas as the
+aggregates, appended to <user_id>.jsonl next to the index (see
+delta_log.py) as one record per transaction:
+
+    ["+", "TXN-01H...", ["uber", "visa"]]      (added)
+    ["-", "TXN-01H...", ["uber", "visa"]]      (removed)
+
+so recording a change never rewrites the whole index; the log is folded
+into the index file once it grows large. A missing file is rebuilt from
+the transactions. Searches
+resolve every term by prefix against the sorted vocabulary (two binary
+searches) and intersect the posting sets, so they never scan the
+transactions.
+"""
+
+import os
+import re
+from bisect import bisect_left, insort
+from persistence import cache, delta_log
+from persistence.load_save_json import load_json, remove_file
+from persistence.locking import file_locks, watched
+from persistence.repository import get_repository, sharded_user_ids
+import config
+
+TEXT_FIELDS = ("description", "payment_method")
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Return the distinct lowercase word tokens of `text`."""
+    return set(_TOKEN.findall(str(text or "").casefold()))
+
+
+def _tokens(txn):
+    tokens = set()
+    for field in TEXT_FIELDS:
+        tokens |= tokenize(txn.get(field))
+    return tokens
+
+
+class TextIndex:
+    """token -> set of transaction IDs, plus the sorted token list for prefix lookups."""
+
+    def __init__(self, postings=None):
+        self.postings = {token: set(ids) for token, ids in (postings or {}).items()}
+        self.vocabulary = sorted(self.postings)
+
+    def apply(self, records):
+        """Apply logged ["+" or "-", transaction_id, tokens] records."""
+        resort = len(records) > 1  # sort the vocabulary once instead of per new token
+        changed = False
+        for op, transaction_id, tokens in records:
+            for token in tokens:
+                ids = self.postings.get(token)
+                if op == "+":
+                    if ids is None:
+                        ids = self.postings[token] = set()
+                        changed = True
+                        if not resort:
+                            insort(self.vocabulary, token)
+                    ids.add(transaction_id)
+                elif ids is not None:
+                    ids.discard(transaction_id)
+                    if not ids:
+                        del self.postings[token]
+                        changed = True
+                        if not resort:
+                            del self.vocabulary[bisect_left(self.vocabulary, token)]
+        if resort and changed:
+            self.vocabulary = sorted(self.postings)
+
+    def prefix(self, term):
+        """Return the IDs of every transaction with a token starting with `term`."""
+        start = bisect_left(self.vocabulary, term)
+        end = bisect_left(self.vocabulary, term + "\U0010ffff")
+        if end - start == 1:
+            return self.postings[self.vocabulary[start]]
+        matches = set()
+        for token in self.vocabulary[start:end]:
+            matches |= self.postings[token]
+        return matches
+
+    def search(self, text):
+        """
+        Return the IDs of the transactions matching every term of `text`
+        (each term matches as a word prefix).
+        """
+        terms = tokenize(text)
+        if not terms:
+            return set()
+        # Start from the longest term: usually the most selective
+        result = None
+        for term in sorted(terms, key=len, reverse=True):
+            ids = self.prefix(term)
+            result = set(ids) if result is None else result & ids
+            if not result:
+                break
+        return result
+
+    def to_json(self):
+        return {token: sorted(ids) for token, ids in self.postings.items()}
+
+
+def _index_path(user_id):
+    return str(config.user_data_file(user_id, "text_index"))
+
+
+def _record(op, txn):
+    return [op, txn["transaction_id"], sorted(_tokens(txn))]
+
+
+def _save(user_id, index):
+    """Store the whole index and drop its log."""
+    path = _index_path(user_id)
+    delta_log.compact(path, index.to_json())
+    cache.put(f"text:{path}", watched(delta_log.paths(path)), index)
+
+
+def _fold(path):
+    """The stored index with every logged change applied."""
+    index = TextIndex(load_json(path))
+    index.apply(delta_log.read(path))
+    return index
+
+
+def rebuild_text_index(user_id):
+    """Rebuild and store one user's index from their transactions."""
+    with file_locks(delta_log.paths(_index_path(user_id))):
+        postings = {}
+        for txn in get_repository().for_user(user_id):
+            for token in _tokens(txn):
+                postings.setdefault(token, []).append(txn["transaction_id"])
+        index = TextIndex(postings)  # sorts the vocabulary once
+        _save(user_id, index)
+    return index
+
+
+def load_text_index(user_id):
+    """Return a user's index, building it first if the file is missing."""
+    path = _index_path(user_id)
+    if not os.path.exists(path):
+        return rebuild_text_index(user_id)
+    return cache.get(f"text:{path}", watched(delta_log.paths(path)), lambda: _fold(path))
+
+
+def record_changes(added=(), removed=()):
+    """Log the added and removed transactions in their users' indexes."""
+    changes = {}
+    for op, txns in (("-", removed), ("+", added)):
+        for txn in txns:
+            changes.setdefault(txn["user_id"], []).append(_record(op, txn))
+
+    for user_id, records in changes.items():
+        path = _index_path(user_id)
+        # Held from the read to the cache update, so no other writer's change is missed
+        with file_locks(delta_log.paths(path)):
+            if not os.path.exists(path):
+                # A fresh rebuild already reflects the change that was just stored
+                rebuild_text_index(user_id)
+                continue
+            index = load_text_index(user_id)
+            delta_log.append(path, records)
+            index.apply(records)
+            cache.put(f"text:{path}", watched(delta_log.paths(path)), index)
+            if delta_log.due(path):
+                _save(user_id, index)
+
+
+def repair_text_indexes():
+    """Rebuild the index of every user that has transactions; drop the rest."""
+    users = {t["user_id"] for t in get_repository().iter_all()}
+    for user_id in users:
+        rebuild_text_index(user_id)
+    if config.DATA_LAYOUT == "sharded":
+        for user_id in set(sharded_user_ids()) - users:
+            for path in delta_log.paths(_index_path(user_id)):
+                remove_file(path)
+    elif os.path.isdir(config.TEXT_INDEX_DIR):
+        for name in os.listdir(config.TEXT_INDEX_DIR):
+            user_id, extension = os.path.splitext(name)
+            if extension in (".json", ".jsonl") and user_id not in users:
+                remove_file(os.path.join(config.TEXT_INDEX_DIR, name))
+
+
+def search_text(user_id, text):
+    """Return the IDs of the user's transactions whose text matches `text`."""
+    return load_text_index(user_id).search(text)
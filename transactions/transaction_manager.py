@@ -1,13 +1,64 @@
+import math
 import os
+import time
 import datetime
 from utils.ids import generate_transaction_id
-from utils.date_utils import get_today_str, parse_date
-from persistence.load_save_json import load_json, save_json
+from utils.date_utils import get_today_str, parse_date, normalize_date, date_ordinal
+from persistence.repository import get_repository
+from transactions.query import Query, And, Eq, In, Range
+from reports import aggregates
+from transactions import text_index
+from persistence import backup_worker
 from auth.user_manager import get_current_user
 from utils.errors import InvalidTransactionError, UserNotFoundError
 from config import *
 
 
+def load_transactions():
+    """Load every transaction from the configured storage."""
+    return get_repository().all()
+
+
+def iter_transactions(user_id=None):
+    """
+    Stream stored transactions (optionally only one user's) without loading
+    them all; the report functions and Query.stream() accept the result.
+    """
+    rows = get_repository().iter_all()
+    if user_id is None:
+        return rows
+    return (t for t in rows if t["user_id"] == user_id)
+
+
+def load_user_transactions(user_id):
+    """Load only the given user's transactions from the configured storage."""
+    return get_repository().for_user(user_id)
+
+
+def record_changes(added=(), removed=()):
+    """
+    Update the derived data (report aggregates, text index) after a write
+    and queue a background backup.
+    """
+    aggregates.record_changes(added=added, removed=removed)
+    text_index.record_changes(added=added, removed=removed)
+    backup_worker.notify_write()
+
+
+def save_transactions(transactions):
+    """Replace the stored transactions with the given list."""
+    get_repository().replace_all(transactions)
+    aggregates.repair_aggregates()
+    text_index.repair_text_indexes()
+
+
+def insert_transactions(transactions):
+    """Store already-built transactions (e.g. recurring postings) in one write."""
+    if transactions:
+        get_repository().add_many(transactions)
+        record_changes(added=transactions)
+
+
 def add_transaction(type, amount, category, description, payment_method):
     """ Add an income or expense transaction for the current user."""
     user = get_current_user()
@@ -15,8 +66,6 @@ def add_transaction(type, amount, category, description, payment_method):
     if not user:
         raise UserNotFoundError("No active user found. Please log in first.")
 
-    transaction = load_json(TRANSACTIONS_FILE)
-
     new_transaction = {
         "transaction_id": generate_transaction_id(),
         "user_id": user["user_id"],
@@ -28,13 +77,148 @@ def add_transaction(type, amount, category, description, payment_method):
         "payment_method": payment_method
     }
 
-    transaction.append(new_transaction)
-    save_json(transaction, TRANSACTIONS_FILE)
+    get_repository().add(new_transaction)
+    record_changes(added=[new_transaction])
 
     print(f"Transaction added successfully: {new_transaction['transaction_id']}")
     return new_transaction
 
 
+def validate_transaction_row(row, user_id):
+    """
+    Validate one raw row (e.g. from an imported statement) and build the
+    transaction to store.
+
+    Args:
+        row (dict): Needs 'type', 'amount' and 'category'; 'date' (YYYY-MM-DD),
+            'description' and 'payment_method' are optional.
+        user_id (str): Owner of the new transaction.
+
+    Returns:
+        dict: The new transaction, with a generated ID.
+
+    Raises:
+        InvalidTransactionError: If a field is missing or invalid.
+    """
+    try:
+        amount = float(row.get("amount"))
+    except (TypeError, ValueError):
+        raise InvalidTransactionError(f"invalid amount {row.get('amount')!r}.")
+    if not math.isfinite(amount):
+        raise InvalidTransactionError(f"amount must be a finite number, got {row.get('amount')!r}.")
+    if amount <= 0:
+        raise InvalidTransactionError("amount must be greater than zero.")
+
+    txn_type = str(row.get("type") or "").strip().lower()
+    if txn_type not in ("income", "expense"):
+        raise InvalidTransactionError("type must be 'income' or 'expense'.")
+
+    category = str(row.get("category") or "").strip()
+    if not category:
+        raise InvalidTransactionError("category cannot be empty.")
+
+    date = str(row.get("date") or "").strip() or get_today_str()
+    try:
+        date = normalize_date(date)  # stored zero-padded, like the sqlite backend does
+    except ValueError:
+        raise InvalidTransactionError(f"date {date!r} must be in 'YYYY-MM-DD' format.")
+
+    return {
+        "transaction_id": generate_transaction_id(),
+        "user_id": user_id,
+        "type": txn_type,
+        "amount": amount,
+        "category": category,
+        "date": date,
+        "description": str(row.get("description") or "").strip() or "No description provided.",
+        "payment_method": str(row.get("payment_method") or "").strip() or "Unknown",
+    }
+
+
+def add_transactions_bulk(rows, user_id=None):
+    """
+    Validate and add many transactions with a single storage write.
+
+    Invalid rows are reported and skipped; they do not abort the batch.
+
+    Args:
+        rows (iterable): Raw row dicts (see validate_transaction_row).
+        user_id (str): Owner of the rows. Defaults to the logged-in user.
+
+    Returns:
+        dict: {
+            "added": list of stored transactions,
+            "errors": list of (row_number, message) tuples (1-based),
+            "seconds": elapsed time,
+            "rows_per_second": throughput over all rows read,
+        }
+
+    Raises:
+        UserNotFoundError: If no user_id is given and nobody is logged in.
+    """
+    started = time.perf_counter()
+
+    if user_id is None:
+        user = get_current_user()
+        if not user:
+            raise UserNotFoundError("No active user found. Please log in first.")
+        user_id = user["user_id"]
+
+    added, errors = [], []
+    total = 0
+    for number, row in enumerate(rows, start=1):
+        total = number
+        try:
+            added.append(validate_transaction_row(row, user_id))
+        except InvalidTransactionError as e:
+            errors.append((number, str(e)))
+
+    insert_transactions(added)
+
+    seconds = time.perf_counter() - started
+    return {
+        "added": added,
+        "errors": errors,
+        "seconds": seconds,
+        "rows_per_second": total / seconds if seconds > 0 else float(total),
+    }
+
+
+def page_cursor(txn):
+    """
+    Return the pagination cursor that resumes right after `txn`: its
+    (day ordinal, transaction_id), so padded and unpadded dates order alike.
+    """
+    return (date_ordinal(txn["date"]), txn["transaction_id"])
+
+
+def iter_transaction_pages(user_id, page_size=PAGE_SIZE, after=None):
+    """
+    Yield a user's transactions one page at a time, oldest first.
+
+    Pages are ordered by (date, transaction_id) and fetched lazily, so
+    memory and latency depend on the page size, not on the history length.
+    To resume later, pass page_cursor(last_row_seen) as `after`.
+
+    Args:
+        user_id (str): Owner of the transactions.
+        page_size (int): Number of transactions per page.
+        after (tuple): page_cursor() of the row to start after.
+
+    Yields:
+        list: Up to page_size transactions.
+    """
+    repo = get_repository()
+    while True:
+        page = repo.page(user_id, after=after, limit=page_size)
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        after = page_cursor(page[-1])
+
+
 def view_transaction(user_only=True):
     """View transactions (default for the current user only)"""
     
@@ -43,55 +227,73 @@ def view_transaction(user_only=True):
     if not user:
         raise UserNotFoundError("No active user found. Please log in first.")
 
-    transactions = load_json(TRANSACTIONS_FILE)
-
-    # Handle case where transactions file doesn't exist or is empty
-    if not transactions:
-        print("No transactions found in the system.")
-        return []
-    transactions = load_json(TRANSACTIONS_FILE)
-
     if user_only:
-        user_txns = [t for t in transactions if t["user_id"] == user["user_id"]]
+        user_txns = load_user_transactions(user["user_id"])
     else:
-        user_txns = transactions
+        user_txns = load_transactions()
 
     if not user_txns:
         print("No Transactions found.")
         return []
     
     for txn in user_txns:
-        print(f"[ {txn['transaction_id'][:10]} | {txn['date']} | {txn['type'].capitalize()} | {txn['category']} | {txn['amount']} EGP ]")
+        print(f"[ {txn['transaction_id']} | {txn['date']} | {txn['type'].capitalize()} | {txn['category']} | {txn['amount']} EGP ]")
     return user_txns
 
 
+def view_transaction_pages(user_only=True, page_size=PAGE_SIZE):
+    """
+    Same output as view_transaction(), but streamed page by page so the
+    whole history is never loaded at once.
+
+    Returns:
+        int: Number of transactions printed.
+    """
+    user = get_current_user()
+    if not user:
+        raise UserNotFoundError("No active user found. Please log in first.")
+
+    if user_only:
+        user_ids = [user["user_id"]]
+    else:
+        user_ids = sorted({t["user_id"] for t in iter_transactions()})
+
+    count = 0
+    for user_id in user_ids:
+        for page in iter_transaction_pages(user_id, page_size):
+            for txn in page:
+                print(f"[ {txn['transaction_id']} | {txn['date']} | {txn['type'].capitalize()} | {txn['category']} | {txn['amount']} EGP ]")
+            count += len(page)
+
+    if not count:
+        print("No Transactions found.")
+    return count
+
+
 
 def edit_transaction(transaction_id, **updates):
     """Edit a transaction by ID (for the current user)."""
     user = get_current_user()
-    transactions = load_json(TRANSACTIONS_FILE)
-    updated = False
-
-    for txn in transactions:
-        if txn["transaction_id"] == transaction_id and txn["user_id"] == user["user_id"]:
-            txn.update({k: v for k, v in updates.items() if v is not None})
-            updated = True
-            break
+    user_id = user["user_id"]
+    repo = get_repository()
+    txn = repo.get(transaction_id, user_id)
 
-    if not updated:
+    if not txn or txn["user_id"] != user_id:
         raise InvalidTransactionError("Transaction not found or access denied.")
 
-    save_json(transactions, TRANSACTIONS_FILE)
+    old = dict(txn)
+    repo.update(transaction_id, {k: v for k, v in updates.items() if v is not None}, user_id)
+    record_changes(added=[repo.get(transaction_id, user_id)], removed=[old])
     print(f"Transaction {transaction_id} updated successfully.")
 
 
 def delete_transaction(transaction_id, confirm=True):
     """Delete a transaction by ID, with optional confirmation."""
     user = get_current_user()
-    transactions = load_json(TRANSACTIONS_FILE)
-    remaining = [t for t in transactions if not (t["transaction_id"] == transaction_id and t["user_id"] == user["user_id"])]
+    repo = get_repository()
+    txn = repo.get(transaction_id, user["user_id"])
 
-    if len(remaining) == len(transactions):
+    if not txn or txn["user_id"] != user["user_id"]:
         raise InvalidTransactionError("Transaction not found or access denied.")
 
     if confirm:
@@ -100,14 +302,105 @@ def delete_transaction(transaction_id, confirm=True):
             print("Deletion cancelled.")
             return
 
-    save_json(remaining, TRANSACTIONS_FILE)
+    repo.delete(transaction_id, user["user_id"])
+    record_changes(removed=[txn])
     print(f"Transaction {transaction_id} deleted successfully.")
 
 
+def select_user_transactions(user_id, transaction_ids=None, filters=None):
+    """
+    Resolve the targets of a batch operation.
+
+    Args:
+        user_id (str): Only this user's transactions are selected.
+        transaction_ids (iterable): IDs to select (looked up in the ID index).
+        filters (dict): search_transactions() keyword filters, used when no
+            IDs are given (e.g. {"category": "Food", "end_date": "2024-01-31"}).
+
+    Returns:
+        tuple: (transactions, missing_ids)
+
+    Raises:
+        InvalidTransactionError: If neither IDs nor filters are given.
+    """
+    if transaction_ids is not None:
+        repo = get_repository()
+        selected, missing = [], []
+        for transaction_id in dict.fromkeys(transaction_ids):
+            txn = repo.get(transaction_id, user_id)
+            if txn is None or txn["user_id"] != user_id:
+                missing.append(transaction_id)
+            else:
+                selected.append(txn)
+        return selected, missing
+
+    if not filters:
+        raise InvalidTransactionError("Give a list of transaction IDs or a filter.")
+    return search_transactions(user_id, **filters), []
+
+
+def edit_transactions_many(transaction_ids=None, filters=None, **updates):
+    """
+    Apply the same updates to many of the current user's transactions with
+    a single storage write (e.g. recategorize every 'Food' row).
+
+    Returns:
+        dict: {"updated": number of rows changed, "missing": IDs not found or not owned}
+    """
+    user = get_current_user()
+    if not user:
+        raise UserNotFoundError("No active user found. Please log in first.")
+
+    changes = {k: v for k, v in updates.items() if v is not None}
+    if "transaction_id" in changes or "user_id" in changes:
+        raise InvalidTransactionError("transaction_id and user_id cannot be edited.")
+
+    targets, missing = select_user_transactions(user["user_id"], transaction_ids, filters)
+    if not targets or not changes:
+        return {"updated": 0, "missing": missing}
+
+    old = [dict(t) for t in targets]
+    repo = get_repository()
+    repo.update_many({t["transaction_id"]: changes for t in targets}, user["user_id"])
+    new = [repo.get(t["transaction_id"], user["user_id"]) for t in old]
+    record_changes(added=new, removed=old)
+
+    print(f"{len(new)} transactions updated successfully.")
+    return {"updated": len(new), "missing": missing}
+
+
+def delete_transactions_many(transaction_ids=None, filters=None, confirm=True):
+    """
+    Delete many of the current user's transactions with a single storage write.
+
+    Returns:
+        dict: {"deleted": number of rows removed, "missing": IDs not found or not owned}
+    """
+    user = get_current_user()
+    if not user:
+        raise UserNotFoundError("No active user found. Please log in first.")
+
+    targets, missing = select_user_transactions(user["user_id"], transaction_ids, filters)
+    if not targets:
+        return {"deleted": 0, "missing": missing}
+
+    if confirm:
+        choice = input(f"Are you sure you want to delete {len(targets)} transactions? (y/n): ")
+        if choice.lower() != "y":
+            print("Deletion cancelled.")
+            return {"deleted": 0, "missing": missing}
+
+    get_repository().delete_many([t["transaction_id"] for t in targets], user["user_id"])
+    record_changes(removed=targets)
+    print(f"{len(targets)} transactions deleted successfully.")
+    return {"deleted": len(targets), "missing": missing}
+
+
 
 def search_transactions(user_id, start_date=None, end_date=None,
                         category=None, type=None, min_amount=None, max_amount=None,
-                        sort_by=None, descending=False):
+                        sort_by=None, descending=False, order_by=None, limit=None, offset=0,
+                        text=None):
     """
     Search and filter transactions for a specific user.
 
@@ -120,9 +413,16 @@ def search_transactions(user_id, start_date=None, end_date=None,
         max_amount (float): Maximum transaction amount.
         sort_by (str): One of ['date', 'amount', 'category', 'type'].
         descending (bool): Sort order.
+        order_by (list): Several sort keys instead of sort_by, e.g.
+            ['-amount', 'date'] ('-' means descending).
+        limit (int): Maximum number of results.
+        offset (int): Number of results to skip.
+        text (str): Words that must all appear in the description or payment
+            method; each word also matches longer words it starts
+            ("uber ca" finds "Uber cab"). Answered from the text index.
 
     Returns:
-        List of filtered transactions.
+        List of filtered transactions (oldest first unless sort_by is given).
     """
 
     # --- Validation layer ---
@@ -164,43 +464,26 @@ def search_transactions(user_id, start_date=None, end_date=None,
         raise InvalidTransactionError("type must be 'income' or 'expense'.")
 
     # Validate sorting field
-    valid_sort_keys = ("date", "amount", "category")
-    if sort_by and sort_by not in valid_sort_keys:
+    valid_sort_keys = ("date", "amount", "category", "type")
+    if order_by is None:
+        order_by = [("-" if descending else "") + sort_by] if sort_by else []
+    if any(key.lstrip("-") not in valid_sort_keys for key in order_by):
         raise InvalidTransactionError(f"sort_by must be one of {valid_sort_keys}.")
 
-    # --- Load data ---
-    all_transactions = load_json(TRANSACTIONS_FILE)
-    if not isinstance(all_transactions, list):
-        raise InvalidTransactionError("Invalid transactions data format (expected list).")
-
-    results = [txn for txn in all_transactions if txn.get("user_id") == user_id]
-
-    # --- Apply filters ---
-    if start:
-        results = [t for t in results if parse_date(t["date"]) >= start]
-
-    if end:
-        results = [t for t in results if parse_date(t["date"]) <= end]
-
-    if category:
-        results = [t for t in results if t.get("category", "").lower() == category.lower()]
-
-    if type:
-        results = [t for t in results if t.get("type", "").lower() == type.lower()]
-
-    if min_amount is not None:
-        results = [t for t in results if float(t.get("amount", 0)) >= min_amount]
-
-    if max_amount is not None:
-        results = [t for t in results if float(t.get("amount", 0)) <= max_amount]
-
-    # --- Sorting (added transaction 'type' support) ---
-    if sort_by:
-        results.sort(
-            key=lambda x: x.get(sort_by, "").lower() if isinstance(x.get(sort_by), str)
-            else x.get(sort_by, 0),
-            reverse=descending
-        )
-
-    return results
+    # --- One query: the filters are pushed down to the storage index ---
+    text_ids = None
+    if text and text.strip():
+        text_ids = text_index.search_text(user_id, text)
+        if not text_ids:
+            return []
+
+    where = And(
+        In("transaction_id", text_ids) if text_ids is not None else None,
+        Range("date", start_date, end_date) if start_date or end_date else None,
+        Eq("category", category) if category else None,
+        Eq("type", type) if type else None,
+        Range("amount", min_amount, max_amount)
+        if min_amount is not None or max_amount is not None else None,
+    )
+    return Query(user_id, where=where, order_by=order_by, limit=limit, offset=offset).run()
 
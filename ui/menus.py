@@ -1,7 +1,9 @@
 from auth.user_manager import get_current_user
 from ui.prompts import *
-from config import TRANSACTIONS_FILE, BUDGET_FILE, GOALS_FILE, RECURRING_FILE
+from config import user_data_file
 from persistence.load_save_json import load_json, save_json
+from reports.report_engine import build_report
+from persistence import backup_worker
 import os
 
 # ========== Utility Functions ==========
@@ -30,7 +32,8 @@ def transactions_menu():
         print("3. Edit Transaction")
         print("4. Delete Transaction")
         print("5. Search/Filter Transactions")
-        print("6. Back to Main Menu")
+        print("6. Import Statement (CSV/OFX)")
+        print("7. Back to Main Menu")
         choice = input("Choose an option: ").strip()
 
         if choice == "1":
@@ -44,6 +47,8 @@ def transactions_menu():
         elif choice == "5":
             prompt_search_transactions()
         elif choice == "6":
+            prompt_import_statement()
+        elif choice == "7":
             break
         else:
             print("Invalid option.")
@@ -58,7 +63,8 @@ def reports_menu():
         print("Please log in first.")
         return
 
-    transactions = load_json(TRANSACTIONS_FILE)
+    # Read the stored aggregates once; every report below reuses the result
+    report = build_report(user["user_id"])
 
     while True:
         print_header("REPORTS")
@@ -66,18 +72,21 @@ def reports_menu():
         print("2. Monthly Report")
         print("3. Category Breakdown")
         print("4. Spending Trends")
-        print("5. Back to Main Menu")
+        print("5. Top Expenses, Categories & Payment Methods")
+        print("6. Back to Main Menu")
         choice = input("Choose an option: ").strip()
 
         if choice == "1":
-            prompt_dashboard_summary()
+            prompt_dashboard_summary(report)
         elif choice == "2":
-            prompt_monthly_report()
+            prompt_monthly_report(report)
         elif choice == "3":
-            prompt_category_breakdown()
+            prompt_category_breakdown(report)
         elif choice == "4":
-            prompt_spending_trends()
+            prompt_spending_trends(report)
         elif choice == "5":
+            prompt_top_k()
+        elif choice == "6":
             break
         else:
             print("Invalid choice.")
@@ -101,6 +110,13 @@ Tips:
 * Data is stored in JSON files under the 'data/' folder.
 * Use Ctrl+C to safely exit the application anytime.
 """)
+    status = backup_worker.status()
+    if status and status["running"]:
+        latency = f"{status['last_latency']:.2f}s" if status["last_latency"] is not None else "n/a"
+        print(f"Background backups: {status['backups']} taken, {status['queue_depth']} queued, "
+              f"last run {latency}, {status['bytes_saved']} bytes saved.")
+        if status["last_error"]:
+            print(f"Last backup error: {status['last_error']}")
 
 # ========== Advanced Features Menu ==========
 
@@ -114,10 +130,11 @@ def advanced_features_menu():
     user_id = user["user_id"]
 
     # Ensure all data files exist
-    for file in [TRANSACTIONS_FILE, BUDGET_FILE, GOALS_FILE, RECURRING_FILE]:
+    for kind, empty in (("transactions", []), ("budgets", {}), ("goals", {}), ("recurring", {})):
+        file = user_data_file(user_id, kind)
         if not os.path.exists(file):
             print(f"{file} missing — creating a new one.")
-            save_json({}, file if "transactions" not in file else [])
+            save_json(empty, file)
 
     while True:
         print_header("ADVANCED FEATURES")
@@ -1,18 +1,25 @@
 from typing import Optional
 from auth.user_manager import get_current_user, login_user, create_user, logout_user
-from transactions.transaction_manager import add_transaction, view_transaction, edit_transaction, delete_transaction, search_transactions
+from transactions.transaction_manager import (
+    add_transaction, view_transaction, edit_transaction, delete_transaction,
+    search_transactions, load_transactions, load_user_transactions, save_transactions,
+    insert_transactions, iter_transaction_pages)
 from reports.reports_manager import (
     generate_dashboard_summary, generate_monthly_report,
-    generate_category_breakdown, generate_spending_trends)
-from persistence.load_save_json import load_json, save_json
+    generate_category_breakdown, generate_spending_trends, spending_trends_from_monthly)
+from reports import aggregates
+from reports.top_k import largest_transactions, top_categories, top_payment_methods
+from persistence.load_save_json import load_json, load_json_cached, save_json, atomic
 from config import TRANSACTIONS_FILE
+from transactions.importer import import_statement
+from transactions.query import Query
 from features.budgets import set_budget_limit, check_budget_limits
 from features.goals import set_goal, check_goals_progress
 from features.financial_health import calculate_financial_health
 from features.recurring_processor import process_recurring_transactions
 from ui.input_validators import *
 from utils.date_utils import get_today_str, parse_date
-from config import TRANSACTIONS_FILE, BUDGET_FILE, GOALS_FILE, RECURRING_FILE
+from config import TRANSACTIONS_FILE, PAGE_SIZE, user_data_file
 from getpass import getpass
 
 def prompt_register() -> bool:
@@ -98,30 +105,46 @@ def prompt_add_transaction() -> Optional[dict]:
 
 
 def prompt_view_transaction() -> None:
-    """ prompt user to view only the logged in user's transactions."""
+    """ Page through the logged in user's transactions, one screen at a time."""
     print("\n=== View Transactions ===")
     try:
-        transactions = view_transaction(user_only=True)
-        if not transactions:
+        user = get_current_user()
+        if not user:
+            print("Please log in first.")
+            return
+
+        pages = iter_transaction_pages(user["user_id"], PAGE_SIZE)
+        page = next(pages, None)
+        if page is None:
             print("No transactions to display.")
+            return
 
-        print("\n" + "=" * 65)
-        print(f"{'ID':<10} | {'Date':<12} | {'Type':<8} | {'Category':<12} | {'Amount':>10}")
-        print("-" * 65)
+        shown, number = 0, 1
+        while page is not None:
+            # Fetch one page ahead so we know whether to offer another
+            upcoming = next(pages, None)
+
+            # Render the whole page into a buffer and print it at once
+            lines = ["", "=" * 86,
+                     f"{'ID':<30} | {'Date':<12} | {'Type':<8} | {'Category':<12} | {'Amount':>10}",
+                     "-" * 86]
+            for txn in page:
+                txn_id = txn.get('transaction_id', 'N/A')
+                date = txn.get('date', 'N/A')
+                txn_type = txn.get('type', 'N/A').capitalize()
+                category = txn.get('category', 'N/A')
+                amount = txn.get('amount', 0.0)
+                lines.append(f"{txn_id:<30} | {date:<12} | {txn_type:<8} | {category:<12} | ${amount:>9.2f}")
+            shown += len(page)
+            lines += ["=" * 86, f"Page {number} - {shown} transaction(s) shown"]
+            print("\n".join(lines))
+
+            if upcoming is None:
+                break
+            if input("Press Enter for the next page or 'q' to stop: ").strip().lower() == "q":
+                break
+            page, number = upcoming, number + 1
 
-        # Print each transaction in table format
-        for txn in transactions:
-            txn_id = txn.get('transaction_id', 'N/A')[:10]
-            date = txn.get('date', 'N/A')
-            txn_type = txn.get('type', 'N/A').capitalize()
-            category = txn.get('category', 'N/A')
-            amount = txn.get('amount', 0.0)
-            print(f"{txn_id:<10} | {date:<12} | {txn_type:<8} | {category:<12} | ${amount:>9.2f}")
-
-        print("=" * 65)
-        print(f"Total transactions: {len(transactions)}\n")
-        return transactions
-    
     except Exception as e:
         print(f"Unexpected Error: {e}")
 
@@ -131,10 +154,7 @@ def prompt_edit_transactions() -> Optional[dict]:
 
     try:
         user = get_current_user()
-        transactions = load_json(TRANSACTIONS_FILE)
-
-        # Filter transactions for the current user
-        user_transactions = [t for t in transactions if t.get("user_id") == user["user_id"]]
+        user_transactions = load_user_transactions(user["user_id"])
 
         # --- Validation: Check if there are any transactions to edit ---
         if not user_transactions:
@@ -211,10 +231,7 @@ def prompt_delete_transactions() -> Optional[str]:
 
     try:
         user = get_current_user()
-        transactions = load_json(TRANSACTIONS_FILE)
-
-        # Filter transactions for the current user
-        user_transactions = [t for t in transactions if t.get("user_id") == user["user_id"]]
+        user_transactions = load_user_transactions(user["user_id"])
 
         # --- Validation: Check if there are any transactions to delete ---
         if not user_transactions:
@@ -266,13 +283,9 @@ def prompt_search_transactions():
             return
 
         user_id = user["user_id"]
-        transactions = load_json(TRANSACTIONS_FILE)
-
-        # Filter transactions for the current user
-        user_transactions = [t for t in transactions if t.get("user_id") == user_id]
 
         # --- Validation: No transactions at all ---
-        if not user_transactions:
+        if not Query(user_id, limit=1).run():
             print("No transactions found. You must add one before using the search filters.")
             return
 
@@ -285,24 +298,25 @@ def prompt_search_transactions():
         print("3. Type (income or expense)")
         print("4. Amount Range (Min and Max)")
         print("5. Sort Results")
-        print("6. No Filter (show all transactions)\n")
+        print("6. Text (words in description or payment method)")
+        print("7. No Filter (show all transactions)\n")
 
         # Initialize all filters to None
-        start_date = end_date = category = txn_type = sort_by = None
+        start_date = end_date = category = txn_type = text = None
         min_amount = max_amount = None
-        descending = False
+        order_by = []
 
         # Ask which filters to apply
         filters_chosen = input(
             "Enter the numbers of the filters you want to apply (comma-separated, e.g. 1,3,5): "
         ).strip()
 
-        valid_choices = {"1", "2", "3", "4", "5", "6"}
+        valid_choices = {"1", "2", "3", "4", "5", "6", "7"}
         selected_filters = {f.strip() for f in filters_chosen.split(",") if f.strip()}
 
         # Validate input
         if not selected_filters.issubset(valid_choices):
-            print("Invalid selection. Please enter numbers between 1 and 6.")
+            print("Invalid selection. Please enter numbers between 1 and 7.")
             return
 
         if "1" in selected_filters:  # Date range
@@ -338,15 +352,17 @@ def prompt_search_transactions():
                 return
 
         if "5" in selected_filters:  # Sorting
-            print("\nSort options: date | amount | category")
-            sort_by = input("Sort by: ").strip().lower()
-            if sort_by not in ("date", "amount", "category", ""):
+            print("\nSort options: date | amount | category | type")
+            print("Use commas for several keys and '-' for descending, e.g. -amount,date")
+            order_by = [k.strip().lower() for k in input("Sort by: ").split(",") if k.strip()]
+            if any(k.lstrip("-") not in ("date", "amount", "category", "type") for k in order_by):
                 print("Invalid sort field.")
                 return
-            order = input("Descending order? (y/n): ").strip().lower()
-            descending = order == "y"
 
-        # --- Fetch results ---
+        if "6" in selected_filters:  # Text
+            text = input("Words to find (e.g. 'uber ca'): ").strip() or None
+
+        # --- Fetch results (one query, pushed down to the storage index) ---
         transactions = search_transactions(
             user_id=user_id,
             start_date=start_date,
@@ -355,8 +371,8 @@ def prompt_search_transactions():
             type=txn_type,
             min_amount=min_amount,
             max_amount=max_amount,
-            sort_by=sort_by,
-            descending=descending
+            order_by=order_by,
+            text=text
         )
 
         # --- Display results ---
@@ -365,36 +381,72 @@ def prompt_search_transactions():
             return
 
         print("\nFiltered Transactions:")
-        print("\n" + "=" * 65)
-        print(f"{'ID':<10} | {'Date':<12} | {'Type':<8} | {'Category':<12} | {'Amount':>10}")
-        print("-" * 65)
+        print("\n" + "=" * 86)
+        print(f"{'ID':<30} | {'Date':<12} | {'Type':<8} | {'Category':<12} | {'Amount':>10}")
+        print("-" * 86)
 
         for txn in transactions:
             print(
-                f"{txn.get('transaction_id', ''):<10} "
+                f"{txn.get('transaction_id', ''):<30} "
                 f"{txn.get('date', ''):<12} "
                 f"{txn.get('type', ''):<8} "
                 f"{txn.get('category', ''):<15} "
                 f"{txn.get('amount', 0):<10.2f} "
                 f"{txn.get('description', '')}"
             )
-        print("-" * 65)
+        print("-" * 86)
         print(f"Total transactions found: {len(transactions)}\n")
     
     except Exception as e:
         print(f"Error during search: {e}")
 
-def prompt_dashboard_summary():
-    """Display the monthly dashboard summary in ASCII format (no colors)."""
+def print_import_result(result):
+    """Print the summary of an add_transactions_bulk()/import_statement() run."""
+    added, errors = result["added"], result["errors"]
+    print(f"Imported {len(added)} transaction(s) in {result['seconds']:.2f}s "
+          f"({result['rows_per_second']:,.0f} rows/s).")
+    if errors:
+        print(f"{len(errors)} row(s) skipped:")
+        for number, message in errors:
+            print(f"  Row {number}: {message}")
+
+def prompt_import_statement():
+    """Prompt for a CSV/OFX statement file and import it for the current user."""
+    print("\n=== Import Statement ===")
+    path = input("Statement file (.csv or .ofx): ").strip()
+    if not path:
+        print("File path cannot be empty.")
+        return None
+
+    try:
+        result = import_statement(path)
+    except Exception as e:
+        print(f"Error importing statement: {e}")
+        return None
+
+    print_import_result(result)
+    return result
+
+def prompt_dashboard_summary(report=None):
+    """
+    Display the monthly dashboard summary in ASCII format (no colors).
+    `report` is an optional precomputed build_report() result.
+    """
     user = get_current_user()
-    all_transactions = load_json(TRANSACTIONS_FILE)
-    user_transactions = [t for t in all_transactions if t["user_id"] == user["user_id"]]
 
-    if not user_transactions:
-        print("\nNo transactions found for this user.\n")
-        return
+    if report is not None:
+        if not report["has_data"]:
+            print("\nNo transactions found for this user.\n")
+            return
+        summary = report["dashboard"]
+    else:
+        user_transactions = load_user_transactions(user["user_id"])
+
+        if not user_transactions:
+            print("\nNo transactions found for this user.\n")
+            return
 
-    summary = generate_dashboard_summary(user_transactions)
+        summary = generate_dashboard_summary(user_transactions)
     name = user["name"]
     period = summary["period"]
 
@@ -420,7 +472,7 @@ def prompt_dashboard_summary():
     print()
 
 
-def prompt_monthly_report():
+def prompt_monthly_report(report=None):
     """Prompt user for month and year to generate monthly report."""
     print("\n=== Monthly Report ===")
     print("-" * 40)
@@ -433,17 +485,16 @@ def prompt_monthly_report():
 
         user_id = user["user_id"]
 
-        # Load all transactions and filter by current user
-        all_transactions = load_json(TRANSACTIONS_FILE)
-        user_transactions = [t for t in all_transactions if t.get("user_id") == user_id]
+        # Use the precomputed report, else read the stored aggregates
+        if report is not None:
+            monthly_summary = report["monthly"]
+        else:
+            monthly_summary = aggregates.monthly_totals(user_id)
 
-        if not user_transactions:
+        if not monthly_summary:
             print("No transactions available to generate a report.")
             return
 
-        # Generate the monthly report
-        monthly_summary = generate_monthly_report(user_transactions)
-
         # Display formatted report
         print(f"\n{'Month':<10} {'Income':>12} {'Expense':>12} {'Balance':>12}")
         print("-" * 50)
@@ -466,7 +517,7 @@ def prompt_monthly_report():
     except Exception as e:
         print(f"Unexpected error: {e}")
 
-def prompt_category_breakdown():
+def prompt_category_breakdown(report=None):
     """Display spending or income breakdown by category."""
     print("\nCategory Breakdown")
     print("-" * 40)
@@ -478,15 +529,17 @@ def prompt_category_breakdown():
             return
 
         user_id = user["user_id"]
-        all_transactions = load_json(TRANSACTIONS_FILE)
-        user_transactions = [t for t in all_transactions if t.get("user_id") == user_id]
-
-        if not user_transactions:
+        if report is not None:
+            has_data = report["has_data"]
+            breakdown = report["categories"].get("expense", {})
+        else:
+            has_data = bool(aggregates.monthly_totals(user_id))
+            breakdown = aggregates.category_totals(user_id)
+
+        if not has_data:
             print("No transactions available to generate report.")
             return
 
-        breakdown = generate_category_breakdown(user_transactions)
-
         if not breakdown:
             print(f"No expenses transactions found to analyze.")
             return
@@ -507,7 +560,7 @@ def prompt_category_breakdown():
     except Exception as e:
         print(f"Unexpected error: {e}")
 
-def prompt_spending_trends():
+def prompt_spending_trends(report=None):
     """Display month-to-month spending changes for the current user."""
     print("\nSpending Trends Report")
     print("-" * 55)
@@ -519,15 +572,17 @@ def prompt_spending_trends():
             return
 
         user_id = user["user_id"]
-        all_transactions = load_json(TRANSACTIONS_FILE)
-        user_transactions = [t for t in all_transactions if t.get("user_id") == user_id]
+        monthly_summary = report["monthly"] if report is not None else aggregates.monthly_totals(user_id)
 
-        if not user_transactions:
+        if not monthly_summary:
             print("No transactions available to analyze trends.")
             return
 
         # Generate the monthly spending trends
-        trends = generate_spending_trends(user_transactions)
+        if report is not None:
+            trends = report["trends"]
+        else:
+            trends = spending_trends_from_monthly(monthly_summary)
 
         if not trends:
             print("Not enough monthly data to determine trends.")
@@ -545,6 +600,59 @@ def prompt_spending_trends():
     except Exception as e:
         print(f"Unexpected error: {e}")
 
+def prompt_top_k():
+    """Show the largest expenses, top categories and top payment methods."""
+    print("\nTop Spending Report")
+    print("-" * 55)
+
+    try:
+        user = get_current_user()
+        if not user:
+            print("You must be logged in to view this report.")
+            return
+
+        k_input = input("How many results per list? (default 5): ").strip()
+        k = int(k_input) if k_input else 5
+        if k <= 0:
+            print("The number of results must be positive.")
+            return
+
+        start_date = input("Start date (YYYY-MM-DD) or leave blank: ").strip() or None
+        end_date = input("End date (YYYY-MM-DD) or leave blank: ").strip() or None
+        for label, date_str in [("Start", start_date), ("End", end_date)]:
+            if date_str:
+                try:
+                    parse_date(date_str)
+                except ValueError:
+                    print(f"{label} date must be in YYYY-MM-DD format.")
+                    return
+
+        # The date window is answered by the storage index
+        transactions = search_transactions(
+            user["user_id"], start_date=start_date, end_date=end_date, type="expense")
+        if not transactions:
+            print("No expenses found in this period.")
+            return
+
+        print(f"\nLargest {k} Expenses:")
+        print(f"{'Date':<12} {'Category':<15} {'Amount (EGP)':>15}  Description")
+        print("-" * 55)
+        for t in largest_transactions(transactions, k):
+            print(f"{t['date']:<12} {t['category']:<15} {t['amount']:>15.2f}  {t['description']}")
+
+        for title, rows in (("Categories", top_categories(transactions, k)),
+                            ("Payment Methods", top_payment_methods(transactions, k))):
+            print(f"\nTop {k} {title}:")
+            print("-" * 40)
+            for name, amount in rows:
+                print(f"{name:<20} {amount:>15.2f}")
+        print("-" * 55)
+
+    except ValueError:
+        print("Please enter a whole number.")
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+
 def prompt_set_budget(user_id):
     """Prompt user for budget info and call the logic layer."""
     category = input("Enter category name: ").strip()
@@ -555,8 +663,8 @@ def prompt_set_budget(user_id):
         print("Invalid limit. Please enter a number.")
 
 def prompt_check_budget(user_id):
-    transactions = load_json(TRANSACTIONS_FILE)
-    budgets = load_json(BUDGET_FILE)
+    transactions = load_user_transactions(user_id)
+    budgets = load_json_cached(user_data_file(user_id, "budgets"))
 
     print("\nBudget Status")
     print("-" * 40)
@@ -575,8 +683,8 @@ def prompt_set_goal(user_id):
         print("Invalid amount. Please enter a number.")
 
 def prompt_view_goals(user_id):
-    transactions = load_json(TRANSACTIONS_FILE)
-    goals = load_json(GOALS_FILE)
+    transactions = load_user_transactions(user_id)
+    goals = load_json_cached(user_data_file(user_id, "goals"))
 
     print("\nGoals Progress")
     print("-" * 40)
@@ -594,17 +702,21 @@ def prompt_view_goals(user_id):
 
 def prompt_process_recurring(user_id):
     
-    transactions = load_json(TRANSACTIONS_FILE)
+    transactions = load_user_transactions(user_id)
+    existing = len(transactions)
 
     print("\nProcess Recurring Transactions")
     print("-" * 40)
 
-    updated_txns = process_recurring_transactions(user_id, transactions)
-    save_json(updated_txns, TRANSACTIONS_FILE)
+    # One WAL unit: the advanced due dates and the posted transactions
+    # reach the disk together, so a crash can't lose or repeat a posting
+    with atomic():
+        updated_txns = process_recurring_transactions(user_id, transactions)
+        insert_transactions(updated_txns[existing:])
 
 def prompt_calculate_health(user_id):
-    transactions = load_json(TRANSACTIONS_FILE)
-    goals = load_json(GOALS_FILE)
+    transactions = load_user_transactions(user_id)
+    goals = load_json_cached(user_data_file(user_id, "goals"))
 
     print("\nFinancial Health Score")
     print("-" * 40)
@@ -4,7 +4,8 @@ Utility functions for date parsing, formatting, and validation.
 Uses ISO 8601 format (YYYY-MM-DD) for consistency.
 """
 
-from datetime import datetime
+from datetime import date, datetime
+from functools import lru_cache
 
 DATE_FORMAT = "%Y-%m-%d"
 
@@ -61,6 +62,21 @@ def format_date(date_obj: datetime) -> str:
     """
     return date_obj.strftime(DATE_FORMAT)
 
+@lru_cache(maxsize=None)
+def normalize_date(date_str: str) -> str:
+    """
+    Return a date string in zero-padded ISO form, so that plain string
+    comparisons order dates correctly.
+
+    Raises:
+        ValueError: If date string is in wrong format
+
+    Example:
+        >>> normalize_date("2024-1-5")
+        '2024-01-05'
+    """
+    return parse_date(date_str).strftime(DATE_FORMAT)
+
 def days_between(start_date: str, end_date: str) -> int:
     """
     Calculate number of days between two date strings.
@@ -81,6 +97,61 @@ def days_between(start_date: str, end_date: str) -> int:
     return (end - start).days
 
 
+@lru_cache(maxsize=None)
+def date_ordinal(date_str: str) -> int:
+    """
+    Convert a date string into its proleptic Gregorian day ordinal.
+
+    Results are cached, so each distinct date string is parsed only once
+    per process and later comparisons are plain integer comparisons.
+
+    Args:
+        date_str (str): Date string in YYYY-MM-DD format
+
+    Returns:
+        int: Day ordinal (date.toordinal())
+
+    Raises:
+        ValueError: If date string is in wrong format
+
+    Example:
+        >>> date_ordinal("2023-10-15")
+        738808
+    """
+    return parse_date(date_str).toordinal()
+
+@lru_cache(maxsize=None)
+def month_key(date_str: str) -> int:
+    """
+    Convert a date string into an integer month key (year * 12 + month - 1).
+
+    Consecutive months have consecutive keys, so month keys sort and compare
+    as integers.
+
+    Example:
+        >>> month_key("2023-10-15")
+        24285
+    """
+    parsed = parse_date(date_str)
+    return parsed.year * 12 + parsed.month - 1
+
+def current_month_key() -> int:
+    """Return the month key of today's date."""
+    today = date.today()
+    return today.year * 12 + today.month - 1
+
+def format_month_key(key: int) -> str:
+    """
+    Convert a month key back into a 'YYYY-MM' string.
+
+    Example:
+        >>> format_month_key(24285)
+        '2023-10'
+    """
+    year, month = divmod(key, 12)
+    return f"{year:04d}-{month + 1:02d}"
+
+
 # if __name__ == "__main__":
 #     print(f"today : {get_today_str()}")
 #     parsed_date = parse_date("2023-10-01")
@@ -21,3 +21,7 @@ class InvalidDateError(Exception):
 class UserAlreadyExistsError(Exception):
     """Raised when attempting to create a user that already exists."""
     pass
+
+class ConcurrentModificationError(DataPersistenceError):
+    """Raised when a file was changed by another writer since it was read."""
+    pass
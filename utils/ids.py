@@ -1,17 +1,71 @@
-import uuid
+"""
+ids.py
+Unique ID generation.
+
+IDs are ULID-style: a 48-bit millisecond timestamp followed by 80 random
+bits, written as 26 Crockford base32 characters. IDs made later sort after
+earlier ones, so sorting by ID gives creation order. Inside one
+millisecond (or if the clock steps back) the random part of the previous
+ID is incremented instead of redrawn, so IDs from one process are strictly
+increasing.
+"""
+
+import os
 import time
+import threading
+
+ENCODING = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"  # Crockford base32
+TIME_LENGTH, RANDOM_LENGTH = 10, 16
+RANDOM_BITS = 80
+
+_lock = threading.Lock()
+_last_ms = -1
+_last_random = 0
+
+
+def _encode(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, 32)
+        chars.append(ENCODING[digit])
+    return "".join(reversed(chars))
+
+
+def new_ulid() -> str:
+    """Return a 26-character, monotonically increasing ULID string."""
+    global _last_ms, _last_random
+    with _lock:
+        now = time.time_ns() // 1_000_000
+        if now <= _last_ms:
+            now = _last_ms
+            _last_random += 1
+            if _last_random >> RANDOM_BITS:  # sequence exhausted: borrow the next ms
+                now += 1
+                _last_random = int.from_bytes(os.urandom(10), "big") >> 1
+        else:
+            # Leave the top bit clear so the sequence has room to count up
+            _last_random = int.from_bytes(os.urandom(10), "big") >> 1
+        _last_ms = now
+        return _encode(now, TIME_LENGTH) + _encode(_last_random, RANDOM_LENGTH)
+
+
+def id_timestamp(generated_id: str) -> float:
+    """Return the creation time (epoch seconds) encoded in a generated ID."""
+    ulid = generated_id.rsplit("-", 1)[-1]
+    ms = 0
+    for char in ulid[:TIME_LENGTH].upper():
+        ms = ms * 32 + ENCODING.index(char)
+    return ms / 1000
+
 
 def generate_user_id() -> str:
     """ Generate a unique ID for users. """
-    short_uuid = uuid.uuid4().hex[:6]
-    return f"USR-{short_uuid}"
+    return f"USR-{new_ulid()}"
 
 def generate_transaction_id() -> str:
-    """Generate a unique ID for transactions (TXN-<timestamp>-<short-uuid>)."""
-    timestamp = int(time.time())
-    short_uuid = (uuid.uuid4().hex[:6])
-    return f"TXN-{short_uuid}-{timestamp}"
+    """Generate a unique, time-ordered ID for transactions (TXN-<ulid>)."""
+    return f"TXN-{new_ulid()}"
 
 # if __name__ == "__main__":
     # print("Unique User ID:", generate_user_id())
-    # print("Unique Transaction ID:", generate_transaction_id())
\ No newline at end of file
+    # print("Unique Transaction ID:", generate_transaction_id())